@@ -0,0 +1,150 @@
+import os
+import numpy as np
+
+# -------------------------------
+# IVF approximate nearest-neighbour index
+# -------------------------------
+# Gallery rows are partitioned into `nlist` k-means cells. A query only
+# scans the rows of its `nprobe` closest cells, so cost drops from N to
+# roughly N * nprobe / nlist. nprobe = nlist gives the exact answer; lower
+# values trade recall for speed. Each probed cell is gathered from the
+# gallery's matrix and scanned with one matrix product for all the faces
+# that probe it. The index only keeps row numbers, never the encodings, so
+# a gallery over the shared roster segment (shared_roster.py) stays shared.
+
+def _sq_dist(a, b, b_sq=None):
+    if b_sq is None:
+        b_sq = (b * b).sum(axis=1)
+    d = (a * a).sum(axis=1)[:, None] + b_sq[None, :] - 2.0 * (a @ b.T)
+    np.maximum(d, 0.0, out=d)
+    return d
+
+def kmeans(data, k, iters=10, sample=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    if len(data) > sample:
+        data = data[rng.choice(len(data), sample, replace=False)]
+    data = np.asarray(data, dtype=np.float32)
+    # k-means++ seeding
+    centroids = np.empty((k, data.shape[1]), dtype=np.float32)
+    centroids[0] = data[rng.integers(len(data))]
+    closest = _sq_dist(data, centroids[:1])[:, 0]
+    for i in range(1, k):
+        total = closest.sum()
+        idx = rng.choice(len(data), p=closest / total) if total > 0 else rng.integers(len(data))
+        centroids[i] = data[idx]
+        closest = np.minimum(closest, _sq_dist(data, centroids[i:i + 1])[:, 0])
+    for _ in range(iters):
+        assign = _sq_dist(data, centroids).argmin(axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, nlist=None, nprobe=8):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self._order = np.zeros(0, dtype=np.int64)    # rows grouped by cell
+        self._offsets = np.zeros(1, dtype=np.int64)  # cell c is _order[_offsets[c]:_offsets[c+1]]
+        self._extra = []                             # rows added since the last assign()
+        self.trained_size = 0
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, matrix):
+        n = len(matrix)
+        k = self.nlist or max(1, int(np.sqrt(n)))
+        k = min(k, n)
+        self.centroids = kmeans(matrix, k)
+        self.trained_size = n
+
+    # (Re)build the inverted lists for rows 0..len(matrix)-1.
+    def assign(self, matrix):
+        k = len(self.centroids)
+        cells = self._nearest_cells(matrix, 1)[:, 0] if len(matrix) else np.zeros(0, dtype=np.int64)
+        self._order = np.argsort(cells, kind="stable").astype(np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(cells, minlength=k))]).astype(np.int64)
+        self._extra = [[] for _ in range(k)]
+
+    def add(self, row, encoding):
+        cell = self._nearest_cells(np.asarray(encoding, dtype=np.float32)[None, :], 1)[0, 0]
+        self._extra[cell].append(row)
+
+    def _nearest_cells(self, queries, nprobe):
+        d = _sq_dist(np.asarray(queries, dtype=np.float32), self.centroids)
+        nprobe = min(nprobe, len(self.centroids))
+        if nprobe == len(self.centroids):
+            return np.argsort(d, axis=1)
+        return np.argpartition(d, nprobe - 1, axis=1)[:, :nprobe]
+
+    # Distances from the queries to the rows of every probed cell: yields
+    # (query indices, rows, (len(who), len(rows)) squared distances), inf for
+    # removed rows. `matrix`, `sq_norms` and `alive` are the gallery's arrays.
+    def _probe(self, queries, matrix, sq_norms, alive):
+        q_sq = (queries * queries).sum(axis=1)
+        cells = self._nearest_cells(queries, self.nprobe)
+        for c in np.unique(cells):
+            who = np.flatnonzero((cells == c).any(axis=1))
+            rows = self._order[self._offsets[c]:self._offsets[c + 1]]
+            if self._extra[c]:
+                rows = np.concatenate([rows, np.asarray(self._extra[c], dtype=np.int64)])
+            if len(rows) == 0:
+                continue
+            q = queries[who]
+            d = q_sq[who, None] + sq_norms[rows][None, :] - 2.0 * (q @ matrix[rows].T)
+            d[:, ~alive[rows]] = np.inf
+            yield who, rows, np.maximum(d, 0.0)
+
+    # Nearest live row among the probed cells for every query. Returns
+    # (rows, sq_dists).
+    def search(self, queries, matrix, sq_norms, alive):
+        queries = np.asarray(queries, dtype=np.float32)
+        best = np.zeros(len(queries), dtype=np.int64)
+        best_sq = np.full(len(queries), np.inf, dtype=np.float32)
+        for who, rows, d in self._probe(queries, matrix, sq_norms, alive):
+            j = d.argmin(axis=1)
+            dj = d[np.arange(len(who)), j]
+            better = dj < best_sq[who]
+            best_sq[who[better]] = dj[better]
+            best[who[better]] = rows[j[better]]
+        return best, best_sq
+
+    # Every live row in each query's probed cells, for callers that need
+    # more than the nearest one (one-to-one assignment, voting). Returns one
+    # (rows, sq_dists) pair per query.
+    def candidates(self, queries, matrix, sq_norms, alive):
+        queries = np.asarray(queries, dtype=np.float32)
+        found = [([], []) for _ in range(len(queries))]
+        for who, rows, d in self._probe(queries, matrix, sq_norms, alive):
+            live = np.isfinite(d)
+            for i, f in enumerate(who):
+                found[f][0].append(rows[live[i]])
+                found[f][1].append(d[i, live[i]])
+        return [(np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64),
+                 np.concatenate(sq) if sq else np.zeros(0, dtype=np.float32)) for rows, sq in found]
+
+    def save(self, index_path):
+        tmp = index_path + ".tmp.npz"
+        np.savez(tmp, centroids=self.centroids, trained_size=self.trained_size)
+        os.replace(tmp, index_path)
+
+    def load(self, index_path, dim=128):
+        if not os.path.exists(index_path):
+            return False
+        try:
+            data = np.load(index_path)
+            centroids = data["centroids"]
+        except Exception as e:
+            print(f"ANN index unreadable, retraining: {e}")
+            return False
+        if centroids.ndim != 2 or centroids.shape[1] != dim:
+            return False
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = int(data["trained_size"])
+        return True
@@ -1,46 +1,76 @@
-from flask import Flask, render_template, request, send_file, redirect, url_for, session, flash
-import os, json, shutil, csv
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort, Response, stream_with_context, send_from_directory, g
+import os, json, shutil, threading, time, uuid, zipfile
 from datetime import datetime
-import face_recognition
-import numpy as np
 from PIL import Image
 from functools import wraps
-from twilio.rest import Client
+from werkzeug.utils import secure_filename
+from encoding_store import EncodingStore
+from shared_roster import SharedRoster, roster_students
+from gallery import Gallery, ASSIGNMENTS
+from ann_index import IVFIndex
+from recognition import load_image_for_face_recognition, detect_and_encode, make_pool, face_api, warm_models
+from jobs import JobQueue
+from notifications import SmsDispatcher, FakeSmsClient
+import storage
+from export import EXPORT_FORMATS, export_chunks
+import enrollment
+import metrics
+from video import VIDEO_EXTENSIONS, iter_video_frames, iter_burst_frames, video_attendance
+from live import LiveSession
+from thumbnails import ThumbnailCache, THUMB_MAX_AGE
+import quality
+from quality import QualityGate
+from storage import DEFAULT_SECTION
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 
+# Importing this module only defines the app; create_app() (see "Startup" at
+# the bottom) opens the databases and starts the warm-up. The first request
+# calls it too, so `flask run` / `gunicorn app:app` need nothing extra.
+@app.before_request
+def ensure_started():
+    create_app()
+
+# -------------------------------
+# Database (instance/*.db)
+# -------------------------------
+# Created by create_app(), which also runs the one-shot import of the old
+# JSON/CSV files.
+
 # -------------------------------
 # Twilio setup
 # -------------------------------
 TWILIO_SID = "YOUR_TWILIO_ACCOUNT_SID"
 TWILIO_AUTH = "YOUR_TWILIO_AUTH_TOKEN"
 TWILIO_NUMBER = "+1234567890"
-client = Client(TWILIO_SID, TWILIO_AUTH)
+# Made during warm-up: importing twilio is slow and nothing is sent before.
+def make_sms_client():
+    if os.environ.get("SMS_FAKE"):
+        return FakeSmsClient()
+    from twilio.rest import Client
+    return Client(TWILIO_SID, TWILIO_AUTH)
 
-def send_sms(to_number, message):
-    try:
-        client.messages.create(body=message, from_=TWILIO_NUMBER, to=to_number)
-        print(f"SMS sent to {to_number}")
-    except Exception as e:
-        print(f"Failed to send SMS to {to_number}: {e}")
+# Absence texts go through a persistent outbox (sms_outbox table) that a
+# background dispatcher drains at most SMS_RATE_PER_SEC, with retries.
+# Each student is texted at most once per date. Texts can be queued as soon
+# as the app is created; the dispatcher starts once it has a client.
+SMS_RATE_PER_SEC = float(os.environ.get("SMS_RATE_PER_SEC", "5"))
+SMS_CONCURRENCY = int(os.environ.get("SMS_CONCURRENCY", "4"))
+sms_dispatcher = None
+
+def notify_absent_parents(attendance, today):
+    messages = []
+    for student, status in attendance.items():
+        if status == "Absent" and student in student_parents:
+            msg = f"Dear parent, your child {student.title()} was absent on {today}."
+            messages.append((student, today, student_parents[student], msg))
+    queued = sms_dispatcher.enqueue_many(messages)
+    return [m[0].title() for m, ok in zip(messages, queued) if ok]
 
 # -------------------------------
-# Teacher accounts storage
+# Login required decorator
 # -------------------------------
-accounts_file = "teachers.json"
-if not os.path.exists(accounts_file):
-    with open(accounts_file, "w") as f:
-        json.dump({}, f)
-
-def load_teachers():
-    with open(accounts_file, "r") as f:
-        return json.load(f)
-
-def save_teachers(teachers):
-    with open(accounts_file, "w") as f:
-        json.dump(teachers, f)
-
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -51,20 +81,63 @@ def login_required(f):
     return decorated_function
 
 # -------------------------------
-# SMS Log
+# Metrics & profiling
 # -------------------------------
-sms_log_file = "sms_log.json"
-if not os.path.exists(sms_log_file):
-    with open(sms_log_file, "w") as f:
-        json.dump({}, f)
+# Prometheus text at /metrics (see metrics.py): request latency by endpoint,
+# pipeline stage spans, job durations, faces and SMS counters. Set
+# METRICS_TOKEN to require "Authorization: Bearer <token>" for scrapes.
+# With PROFILE_REQUESTS=1, adding ?profile=1 to a request dumps a cProfile
+# of it to profiles/ (for uploads: of the background job that does the work).
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "") == "1"
+PROFILED_JOB_ENDPOINTS = ("upload", "upload_video", "bulk_add_students")
+
+REQUEST_SECONDS = metrics.histogram("http_request_seconds", "Request latency",
+                                    ("endpoint", "method", "status"))
+JOB_SECONDS = metrics.histogram("job_seconds", "Background job run time", ("kind", "status"))
+FACES_DETECTED = metrics.counter("faces_detected_total", "Faces found in uploads", ("source",))
+FACE_RESULTS = metrics.counter("face_results_total", "Detected faces by match result",
+                               ("source", "status"))
+metrics.gauge("roster_students", "Students in this worker's roster", lambda: len(gallery.student_names()))
+metrics.gauge("live_sessions", "Open live attendance sessions", lambda: len(live_sessions))
+metrics.gauge("sms_outbox_pending", "Texts queued or being sent",
+              lambda: sms_dispatcher.pending_count() if sms_dispatcher else 0)
+
+def profile_requested():
+    return PROFILE_REQUESTS and request.args.get("profile") == "1"
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    if profile_requested() and request.endpoint not in PROFILED_JOB_ENDPOINTS:
+        g.profile = metrics.profiled(request.endpoint or "request")
+        g.profile_info = g.profile.__enter__()
+
+def finish_profile():
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.__exit__(None, None, None)
+        return g.profile_info.get("path")
 
-def load_sms_log():
-    with open(sms_log_file, "r") as f:
-        return json.load(f)
+@app.after_request
+def record_request_metrics(response):
+    path = finish_profile()
+    if path:
+        response.headers["X-Profile"] = path
+    if "request_start" in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=request.endpoint or "unmatched",
+                                method=request.method, status=response.status_code)
+    return response
 
-def save_sms_log(log):
-    with open(sms_log_file, "w") as f:
-        json.dump(log, f)
+@app.teardown_request
+def close_profile(exc):
+    finish_profile()
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        abort(401)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 # -------------------------------
 # Helper: Convert image to RGB
@@ -79,73 +152,141 @@ def convert_to_rgb(img_path):
     except Exception as e:
         print(f"Failed to convert {os.path.basename(img_path)}: {e}")
 
-# -------------------------------
-# Robust image loader for face_recognition
-# -------------------------------
-def load_image_for_face_recognition(img_path, resize_max=1600):
-    with Image.open(img_path) as img:
-        if img.mode not in ["RGB", "L"]:
-            img = img.convert("RGB")
-        elif img.mode == "L":
-            img = img.convert("RGB")
-        w, h = img.size
-        if max(w, h) > resize_max:
-            scale = resize_max / float(max(w, h))
-            img = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
-        arr = np.array(img)
-        if arr.dtype != np.uint8:
-            arr = arr.astype(np.uint8)
-        return arr
-
 # -------------------------------
 # Student database setup
 # -------------------------------
 path = "students_db"
-if not os.path.exists(path):
-    os.makedirs(path)
 
 image_extensions = ('.jpg', '.jpeg', '.png')
 
-# -------------------------------
-# Convert existing images to RGB at startup
-# -------------------------------
-for file in os.listdir(path):
-    if file.lower().endswith(image_extensions):
-        convert_to_rgb(os.path.join(path, file))
+# Encodings are cached on disk so only new or changed photos get encoded at boot
+encoding_store = None  # EncodingStore("encodings_cache"), made by create_app()
+# Small content-hashed roster thumbnails (thumbnails.py), served from /thumbs
+thumbnails = None  # ThumbnailCache("thumbs_cache")
+
+# Matching mode: "exact" scans every student, "ivf" uses the approximate
+# k-means index (only worth it for tens of thousands of students).
+# Raising IVF_NPROBE brings results closer to the exact scan.
+MATCH_INDEX = os.environ.get("MATCH_INDEX", "exact")
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "8"))
+IVF_MIN_ROWS = int(os.environ.get("IVF_MIN_ROWS", "5000"))
+ivf_index_path = os.path.join("encodings_cache", "ivf_index.npz")
+# Students can have several reference photos (students_db/<name>.jpg plus
+# students_db/<name>/*.jpg). MATCH_AGGREGATION picks how they're combined:
+# "min" (closest photo), "centroid" (mean of the photos) or "vote" (most of
+# the MATCH_TOP_K nearest photos).
+MATCH_AGGREGATION = os.environ.get("MATCH_AGGREGATION", "min")
+MATCH_TOP_K = int(os.environ.get("MATCH_TOP_K", "3"))
+# Group photos are matched one-to-one so two faces can't both claim the same
+# student: "greedy" (closest pair first), "hungarian" (needs scipy) or
+# "none" (every face independently, as before).
+MATCH_ASSIGNMENT = os.environ.get("MATCH_ASSIGNMENT", "greedy")
 
 # -------------------------------
 # Load students
 # -------------------------------
-images = []
-student_names = []
-
-student_parents = {
-    "ali": "+7060293337",
-    "bob": "+919876543210",
-    "charlie": "+918888777666"
-}
-
-def load_students():
-    global images, student_names
-    images.clear()
-    student_names.clear()
-    for file in os.listdir(path):
-        if file.lower().endswith(image_extensions):
-            img_path = os.path.join(path, file)
-            try:
-                convert_to_rgb(img_path)  # ensure RGB
-                img_array = load_image_for_face_recognition(img_path)
-                encodings = face_recognition.face_encodings(img_array)
-                if len(encodings) > 0:
-                    images.append(encodings[0])
-                    student_names.append(os.path.splitext(file)[0].lower())
-                else:
-                    print(f"No face found in {file}, skipping.")
-            except Exception as e:
-                print(f"Error loading {file}: {e}")
-    print("Loaded students:", student_names)
-
-load_students()
+# The encodings live in a memory-mapped roster segment shared by every
+# worker on the host (shared_roster.py); each worker wraps it in galleries
+# without copying it. Before every request and background job a worker
+# compares the roster's version with the one it loaded and reloads when it
+# moved, so a student enrolled through one worker is matched by all of them
+# from their next request.
+shared_roster = None  # SharedRoster("encodings_cache"), made by create_app()
+roster_version = None
+roster_lock = threading.Lock()
+gallery = Gallery()          # every student, used when no section is chosen
+section_galleries = {}       # section -> Gallery of just that section
+student_sections = {}        # student -> section
+student_parents = {}         # student -> parent phone
+
+def encode_student_photo(img_path):
+    convert_to_rgb(img_path)  # ensure RGB
+    img_array = load_image_for_face_recognition(img_path)
+    encodings = face_api().face_encodings(img_array)
+    return encodings[0] if len(encodings) > 0 else None
+
+def get_gallery(section=None):
+    if not section:
+        return gallery
+    return section_galleries.get(section, Gallery())
+
+def all_sections():
+    return sorted(section_galleries)
+
+def students_for_roster(names=None):
+    return roster_students(encoding_store, storage.student_sections(), names, DEFAULT_SECTION)
+
+# Call once the encoding store and student table are updated: `names` were
+# enrolled or re-enrolled; without names (e.g. after a delete) the whole
+# roster is rewritten.
+def publish_roster(names=None):
+    if names:
+        shared_roster.update(list(names), students_for_roster)
+    else:
+        shared_roster.publish(students_for_roster)
+    refresh_roster()
+
+# Version 0 means nothing has been published yet (the warm-up is still
+# encoding): keep the empty roster rather than wait on the encoding store.
+def refresh_roster():
+    global gallery, section_galleries, student_sections, student_parents, roster_version
+    if shared_roster.version() in (roster_version, 0):
+        return
+    with roster_lock:
+        version, names, sections, matrix, sq_norms = shared_roster.load()
+        if version == roster_version:
+            return
+        new_gallery = Gallery.from_shared(matrix, sq_norms, names)
+        # rows are grouped by section, so each section gallery is a slice of
+        # the same map (rows of other sections inside it count as dead)
+        bounds = {}
+        for row, section in enumerate(sections):
+            bounds[section] = (bounds.get(section, (row,))[0], row + 1)
+        new_sections = {}
+        for section, (lo, hi) in bounds.items():
+            owners = [name if s == section else None for name, s in zip(names[lo:hi], sections[lo:hi])]
+            new_sections[section] = Gallery.from_shared(matrix[lo:hi], sq_norms[lo:hi], owners)
+        if MATCH_INDEX == "ivf":
+            index = IVFIndex(nprobe=IVF_NPROBE)
+            index.load(ivf_index_path)
+            if new_gallery.attach_index(index, min_rows=IVF_MIN_ROWS):
+                index.save(ivf_index_path)
+        student_sections = storage.student_sections()
+        student_parents = storage.student_parents()
+        gallery, section_galleries = new_gallery, new_sections
+        roster_version = version
+        print(f"Roster version {version}: {len(new_gallery)} encoding(s) of "
+              f"{len(new_gallery.student_names())} student(s).")
+    photos_stale.set()
+
+# The photo index (roster page) and thumbnails follow the roster from a
+# background thread: re-reading the encoding store waits on its file lock,
+# which a sync or an enrollment can hold for a long time, so requests keep
+# serving the previous index meanwhile.
+photos_stale = threading.Event()
+photos_lock = threading.Lock()
+
+def refresh_photos():
+    with photos_lock:
+        encoding_store.refresh()
+        thumbnails.build(encoding_store.roster_photos(), path)
+
+def refresh_photos_loop():
+    while True:
+        photos_stale.wait()
+        photos_stale.clear()
+        try:
+            refresh_photos()
+        except Exception as e:
+            print(f"Photo index refresh failed: {e}")
+
+# Health checks never wait on a roster reload (or the warm-up holding it).
+PROBE_ENDPOINTS = ("health", "ready")
+
+@app.before_request
+def check_roster():
+    if request.endpoint not in PROBE_ENDPOINTS:
+        refresh_roster()
 
 # -------------------------------
 # Routes: Signup & Login
@@ -159,13 +300,10 @@ def signup():
             flash("Username and password required!", "warning")
             return redirect(url_for("signup"))
 
-        teachers = load_teachers()
-        if username in teachers:
+        if not storage.create_teacher(username, password):
             flash("Username already registered!", "danger")
             return redirect(url_for("signup"))
 
-        teachers[username] = password
-        save_teachers(teachers)
         flash("Account created! Please login.", "success")
         return redirect(url_for("login"))
     return render_template("signup.html")
@@ -175,8 +313,7 @@ def login():
     if request.method == "POST":
         username = request.form.get("username").strip().lower()
         password = request.form.get("password").strip()
-        teachers = load_teachers()
-        if username in teachers and teachers[username] == password:
+        if storage.check_teacher(username, password):
             session['teacher'] = username
             flash("Login successful!", "success")
             return redirect(url_for("index"))
@@ -207,51 +344,390 @@ def attendance_page():
 @app.route('/take_attendance')
 @login_required
 def take_attendance():
-    return render_template("take_attendance.html")
+    return render_template("take_attendance.html", sections=all_sections())
 
 # -------------------------------
 # Upload & Automatic SMS
 # -------------------------------
+# Uploads are processed by a background job queue: detection and encoding
+# run in a process pool, so a big photo never ties up a web worker and
+# throughput scales with cores.
+#
+# Every web worker process runs its own job consumer and pool, and every
+# pool process loads the dlib models. So the pool is sized per host: the
+# CPU count split between WEB_WORKERS processes (defaulting to gunicorn's
+# WEB_CONCURRENCY), which keeps `gunicorn -w N` at one model-loaded pool
+# process per core instead of N per core. Set JOB_PROCESSES to override.
+WEB_WORKERS = max(1, int(os.environ.get("WEB_WORKERS", os.environ.get("WEB_CONCURRENCY", "1"))))
+JOB_PROCESSES = int(os.environ.get("JOB_PROCESSES", max(1, (os.cpu_count() or 2) // WEB_WORKERS)))
+JOB_THREADS = int(os.environ.get("JOB_THREADS", JOB_PROCESSES))
+# DETECTION_MODE is "single" (default: the whole frame in one pass, at
+# most 1600 px), "tiled" (overlapping tiles across the pool plus a coarse
+# whole-frame pass, so far more resolution (GROUP_RESIZE_MAX, 3200 px) can
+# be kept and back-row faces aren't downscaled away) or "cascade" (cheap
+# detection on a CASCADE_MAX copy, full resolution only around the faces).
+# Tiled mode does several times the HOG work of a single pass; turn it on
+# once benchmarks/bench_detection.py shows the latency is acceptable on
+# the host's cores.
+DETECTION_MODE = os.environ.get("DETECTION_MODE", "single")
+GROUP_RESIZE_MAX = int(os.environ.get("GROUP_RESIZE_MAX", "1600" if DETECTION_MODE == "single" else "3200"))
+TILE_SIZE = int(os.environ.get("TILE_SIZE", "800"))
+TILE_OVERLAP = int(os.environ.get("TILE_OVERLAP", "200"))
+CASCADE_MAX = int(os.environ.get("CASCADE_MAX", "800"))
+# Quality gate (quality.py): faces in a group photo smaller than
+# QUALITY_MIN_FACE px, blurrier than QUALITY_MIN_SHARPNESS or turned further
+# than QUALITY_MAX_YAW are reported as low quality instead of encoded.
+# Student photos must pass the stricter ENROLL_* thresholds.
+# QUALITY_GATE=0 turns both off.
+QUALITY_GATE = os.environ.get("QUALITY_GATE", "1") == "1"
+UPLOAD_GATE = QualityGate(int(os.environ.get("QUALITY_MIN_FACE", quality.MIN_FACE_SIZE)),
+                          float(os.environ.get("QUALITY_MIN_SHARPNESS", quality.MIN_SHARPNESS)),
+                          float(os.environ.get("QUALITY_MAX_YAW", quality.MAX_YAW))) \
+    if QUALITY_GATE else quality.NO_GATE
+ENROLL_GATE = QualityGate(int(os.environ.get("ENROLL_MIN_FACE", quality.ENROLL_MIN_FACE_SIZE)),
+                          float(os.environ.get("ENROLL_MIN_SHARPNESS", quality.ENROLL_MIN_SHARPNESS)),
+                          float(os.environ.get("ENROLL_MAX_YAW", quality.ENROLL_MAX_YAW))) \
+    if QUALITY_GATE else quality.NO_GATE
+upload_dir = "uploads"
+
+recognition_pool = None
+pool_lock = threading.Lock()
+
+def get_recognition_pool():
+    global recognition_pool
+    with pool_lock:
+        if recognition_pool is None:
+            recognition_pool = make_pool(JOB_PROCESSES)
+    return recognition_pool
+
+def process_upload_job(params):
+    refresh_roster()
+    filepath = params["photo"]
+    section = params["section"]
+    try:
+        with metrics.span("decode"):
+            group_photo = load_image_for_face_recognition(filepath, resize_max=GROUP_RESIZE_MAX)
+    except Exception as e:
+        raise ValueError(f"Cannot process this image. Error: {e}")
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+    locations, encodings, reports = detect_and_encode(
+        group_photo, pool=get_recognition_pool(), mode=DETECTION_MODE,
+        tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP, cascade_max=CASCADE_MAX, gate=UPLOAD_GATE)
+    group_face_locations = [box for box, r in zip(locations, reports) if r["reason"] is None]
+    group_face_encodings = [e for e, r in zip(encodings, reports) if r["reason"] is None]
+
+    roster = get_gallery(section)
+    attendance = {student: "Absent" for student in roster.student_names()}
+    with metrics.span("match"):
+        if MATCH_ASSIGNMENT == "none":
+            faces = [{"name": name, "distance": round(distance, 4),
+                      "status": "matched" if name is not None else "no_match"}
+                     for name, distance in roster.match(group_face_encodings, tolerance=0.6,
+                                                        aggregate=MATCH_AGGREGATION, k=MATCH_TOP_K)]
+        else:
+            faces = roster.assign(group_face_encodings, tolerance=0.6,
+                                  aggregate=MATCH_AGGREGATION, method=MATCH_ASSIGNMENT, k=MATCH_TOP_K)
+    confidence = {}
+    for face, location in zip(faces, group_face_locations):
+        face["box"] = [int(v) for v in location]
+        FACE_RESULTS.inc(source="photo", status=face["status"])
+        if face["name"] is not None:
+            attendance[face["name"]] = "Present"
+            confidence[face["name"]] = face.get("confidence")
+    # faces the gate skipped are listed too, with why
+    for box, report in zip(locations, reports):
+        if report["reason"] is not None:
+            faces.append({"name": None, "distance": None, "status": "low_quality",
+                          "reason": report["reason"], "box": [int(v) for v in box]})
+            FACE_RESULTS.inc(source="photo", status="low_quality")
+    FACES_DETECTED.inc(len(faces), source="photo")
+
+    # Automatic SMS to absent students
+    today = datetime.now().strftime("%Y-%m-%d")
+    with metrics.span("sms_enqueue"):
+        sms_sent = notify_absent_parents(attendance, today)
+
+    return {"attendance": attendance, "today": today, "sms_sent": sms_sent, "section": section,
+            "faces": faces, "confidence": confidence}
+
+# Bulk enrollment: the ZIP is processed on the recognition pool and the whole
+# batch is enrolled at the end (see enrollment.py).
+def process_enroll_job(params):
+    try:
+        accepted, failures, seconds = enrollment.enroll(params["archive"], path, encoding_store,
+                                                        pool=get_recognition_pool(),
+                                                        default_section=params["section"], gate=ENROLL_GATE)
+    except zipfile.BadZipFile:
+        raise ValueError("The uploaded file is not a valid ZIP archive.")
+    finally:
+        if os.path.exists(params["archive"]):
+            os.remove(params["archive"])
+    enrolled = {entry["name"]: entry for entry in accepted}
+    thumbnails.update(encoding_store.roster_photos(enrolled), path, pool=get_recognition_pool())
+    if enrolled:
+        publish_roster(enrolled)
+    print(f"Bulk enrollment: {len(accepted)} photo(s) added, {len(failures)} failed in {seconds:.1f}s")
+    return {"enrolled": list(enrolled), "failures": failures,
+            "seconds": round(seconds, 2)}
+
+# -------------------------------
+# Video / burst of photos
+# -------------------------------
+# Catches students a single photo misses (looking down, hidden behind
+# someone). Frames are sampled, de-duplicated and detected on the
+# recognition pool, and presence is accumulated across frames (video.py).
+VIDEO_SAMPLE_FPS = float(os.environ.get("VIDEO_SAMPLE_FPS", "2"))
+VIDEO_RESIZE_MAX = int(os.environ.get("VIDEO_RESIZE_MAX", "1280"))
+VIDEO_MIN_EVIDENCE = float(os.environ.get("VIDEO_MIN_EVIDENCE", "0.6"))
+
+def process_video_job(params):
+    refresh_roster()
+    section = params["section"]
+    files = params.get("frames") or [params["video"]]
+    stats = {}
+    try:
+        if "video" in params:
+            frames = iter_video_frames(params["video"], stats, VIDEO_SAMPLE_FPS, VIDEO_RESIZE_MAX)
+        else:
+            frames = iter_burst_frames(params["frames"], stats, VIDEO_RESIZE_MAX)
+        roster = get_gallery(section)
+        present, seen, stats = video_attendance(
+            frames, roster, stats, pool=get_recognition_pool(), tolerance=0.6,
+            aggregate=MATCH_AGGREGATION, k=MATCH_TOP_K,
+            method=MATCH_ASSIGNMENT if MATCH_ASSIGNMENT in ASSIGNMENTS else "greedy",
+            min_evidence=VIDEO_MIN_EVIDENCE)
+    finally:
+        for f in files:
+            if os.path.exists(f):
+                os.remove(f)
+    if not stats.get("processed"):
+        raise ValueError("No readable frames in the upload.")
+
+    attendance = {student: "Present" if student in present else "Absent"
+                  for student in roster.student_names()}
+    confidence = {name: seen[name]["confidence"] for name in present}
+    FACES_DETECTED.inc(stats["faces"], source="video")
+    print(f"Video attendance: {stats['processed']} of {stats['sampled']} sampled frame(s) processed "
+          f"at {stats['fps']} frames/sec, {len(present)} present")
+    today = datetime.now().strftime("%Y-%m-%d")
+    with metrics.span("sms_enqueue"):
+        sms_sent = notify_absent_parents(attendance, today)
+    return {"attendance": attendance, "today": today, "sms_sent": sms_sent, "section": section,
+            "faces": [], "confidence": confidence, "frames": stats}
+
+JOB_HANDLERS = {"attendance": process_upload_job, "enroll": process_enroll_job, "video": process_video_job}
+
+# Every job reports its stage timings (ms) in the result, plus the path of
+# its cProfile dump when it was submitted with profile=1.
+def run_job(params):
+    kind = params.get("kind", "attendance")
+    start = time.perf_counter()
+    status = "failed"
+    try:
+        with metrics.profiled(f"job-{kind}", params.get("profile", False)) as profile, \
+                metrics.trace() as timings:
+            wait_until_ready()
+            result = JOB_HANDLERS[kind](params)
+        result["timings"] = {stage: round(seconds * 1000.0, 1) for stage, seconds in timings.items()}
+        if profile.get("path"):
+            result["profile"] = profile["path"]
+        status = "done"
+        return result
+    finally:
+        JOB_SECONDS.observe(time.perf_counter() - start, kind=kind, status=status)
+
+job_queue = None  # JobQueue(instance/jobs.db), made by create_app()
+
 @app.route('/upload', methods=['POST'])
 @login_required
 def upload():
     file = request.files['photo']
-    filepath = "uploaded_group.jpg"
+    section = request.form.get("section", "").strip()
+    ext = os.path.splitext(file.filename or "")[1].lower() or ".jpg"
+    filepath = os.path.join(upload_dir, f"{uuid.uuid4().hex}{ext}")
     file.save(filepath)
 
-    try:
-        group_photo = load_image_for_face_recognition(filepath)
-    except Exception as e:
-        flash(f"Cannot process this image. Error: {e}", "danger")
-        return redirect(url_for("take_attendance"))
+    job_id = job_queue.submit({"photo": filepath, "section": section, "profile": profile_requested()})
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"job_id": job_id, "status_url": url_for("job_status", job_id=job_id)}), 202
+    return redirect(url_for("job_result", job_id=job_id))
 
-    group_face_locations = face_recognition.face_locations(group_photo)
-    group_face_encodings = face_recognition.face_encodings(group_photo, group_face_locations)
+# -------------------------------
+# Live session
+# -------------------------------
+# The page posts webcam frames to /live/<id>/frame and listens on
+# /live/<id>/events (server-sent events) for the students seen so far; see
+# live.py for the pipeline. Sessions live in this process's memory, so with
+# several web processes a session needs sticky routing. Sessions nobody has
+# posted to for LIVE_IDLE_SECONDS are stopped.
+LIVE_QUEUE_SIZE = int(os.environ.get("LIVE_QUEUE_SIZE", "4"))
+LIVE_IN_FLIGHT = int(os.environ.get("LIVE_IN_FLIGHT", JOB_PROCESSES))
+LIVE_IDLE_SECONDS = int(os.environ.get("LIVE_IDLE_SECONDS", "300"))
+live_sessions = {}
+live_lock = threading.Lock()
 
-    attendance = {student: "Absent" for student in student_names}
-    for face_encoding in group_face_encodings:
-        matches = face_recognition.compare_faces(images, face_encoding, tolerance=0.6)
-        face_distances = face_recognition.face_distance(images, face_encoding)
-        best_match_index = np.argmin(face_distances)
-        if matches[best_match_index]:
-            name = student_names[best_match_index]
-            attendance[name] = "Present"
+def reap_live_sessions():
+    with live_lock:
+        idle = [sid for sid, s in live_sessions.items() if time.time() - s.last_active > LIVE_IDLE_SECONDS]
+        stopped = [live_sessions.pop(sid) for sid in idle]
+    for live in stopped:
+        live.stop()
 
-    # Automatic SMS to absent students
-    sms_log = load_sms_log()
+def get_live_session(session_id):
+    live = live_sessions.get(session_id)
+    if live is None:
+        abort(404)
+    return live
+
+@app.route('/live')
+@login_required
+def live_page():
+    return render_template("live.html", sections=all_sections())
+
+@app.route('/live/start', methods=['POST'])
+@login_required
+def live_start():
+    reap_live_sessions()
+    section = (request.form.get("section") or (request.get_json(silent=True) or {}).get("section") or "").strip()
+    live = LiveSession(get_gallery(section), section, pool=get_recognition_pool(),
+                       queue_size=LIVE_QUEUE_SIZE, in_flight=LIVE_IN_FLIGHT, tolerance=0.6,
+                       aggregate=MATCH_AGGREGATION, k=MATCH_TOP_K,
+                       method=MATCH_ASSIGNMENT if MATCH_ASSIGNMENT in ASSIGNMENTS else "greedy",
+                       min_evidence=VIDEO_MIN_EVIDENCE)
+    with live_lock:
+        live_sessions[live.id] = live
+    return jsonify({"id": live.id,
+                    "frame_url": url_for("live_frame", session_id=live.id),
+                    "events_url": url_for("live_events", session_id=live.id),
+                    "state_url": url_for("live_state", session_id=live.id),
+                    "stop_url": url_for("live_stop", session_id=live.id)}), 201
+
+# Body is one JPEG/PNG frame. Never waits on recognition: a busy session
+# drops its oldest queued frame instead.
+@app.route('/live/<session_id>/frame', methods=['POST'])
+@login_required
+def live_frame(session_id):
+    live = get_live_session(session_id)
+    data = request.files["frame"].read() if "frame" in request.files else request.get_data()
+    if not data:
+        return jsonify({"error": "empty frame"}), 400
+    if not live.push(data):
+        return jsonify({"error": "session stopped"}), 409
+    return jsonify({"received": live.counts["received"], "dropped": live.counts["dropped"]}), 202
+
+@app.route('/live/<session_id>')
+@login_required
+def live_state(session_id):
+    return jsonify(get_live_session(session_id).state())
+
+@app.route('/live/<session_id>/events')
+@login_required
+def live_events(session_id):
+    live = get_live_session(session_id)
+
+    def events():
+        version = None
+        while True:
+            state = live.wait_for_update(version)
+            if state["version"] != version:
+                version = state["version"]
+                yield f"data: {json.dumps(state)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if not state["running"]:
+                return
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Ends the session and hands its attendance to the usual result page, where
+# it can be corrected and saved. Absent parents are texted as for uploads.
+@app.route('/live/<session_id>/stop', methods=['POST'])
+@login_required
+def live_stop(session_id):
+    with live_lock:
+        live = live_sessions.pop(session_id, None)
+    if live is None:
+        abort(404)
+    live.stop()
+    state = live.state()
+    attendance = live.attendance()
     today = datetime.now().strftime("%Y-%m-%d")
-    sms_log[today] = []
+    sms_sent = notify_absent_parents(attendance, today)
+    print(f"Live session {live.id[:8]}: {state['counts']['processed']} frame(s) processed, "
+          f"{state['counts']['dropped']} dropped, {len(state['present'])} present")
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(dict(state, attendance=attendance, sms_sent=sms_sent))
+    return render_template("result.html", attendance=attendance, today=today, sms_sent=sms_sent,
+                           section=live.section, confidence=state["present"], frames=None,
+                           unknown_faces=0, conflict_faces=0)
 
-    for student, status in attendance.items():
-        if status == "Absent" and student in student_parents:
-            msg = f"Dear parent, your child {student.title()} was absent on {today}."
-            send_sms(student_parents[student], msg)
-            sms_log[today].append(student.title())
+# One video file, or several photos taken in a burst.
+@app.route('/upload_video', methods=['POST'])
+@login_required
+def upload_video():
+    section = request.form.get("section", "").strip()
+    uploads = [f for f in request.files.getlist("frames") if f and f.filename]
+    if not uploads:
+        flash("Choose a video or some photos first.", "warning")
+        return redirect(url_for("take_attendance"))
+    saved = []
+    for file in uploads:
+        ext = os.path.splitext(file.filename)[1].lower() or ".jpg"
+        saved.append(os.path.join(upload_dir, f"{uuid.uuid4().hex}{ext}"))
+        file.save(saved[-1])
+
+    params = {"kind": "video", "section": section, "profile": profile_requested()}
+    if len(saved) == 1 and saved[0].endswith(VIDEO_EXTENSIONS):
+        params["video"] = saved[0]
+    else:
+        params["frames"] = saved
+    job_id = job_queue.submit(params)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"job_id": job_id, "status_url": url_for("job_status", job_id=job_id)}), 202
+    return redirect(url_for("job_result", job_id=job_id))
 
-    save_sms_log(sms_log)
-    flash(f"Attendance marked! SMS sent to absent students' parents: {', '.join(sms_log[today])}", "success")
+@app.route('/jobs/<job_id>/status')
+@login_required
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify({"id": job["id"], "status": job["status"], "error": job["error"]})
 
-    return render_template("result.html", attendance=attendance, today=today, sms_sent=sms_log[today])
+@app.route('/jobs/<job_id>')
+@login_required
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        flash("Unknown attendance job.", "danger")
+        return redirect(url_for("take_attendance"))
+    enrolling = job["params"].get("kind") == "enroll"
+    if job["status"] == "failed":
+        flash(job["error"], "danger")
+        return redirect(url_for("students" if enrolling else "take_attendance"))
+    if job["status"] != "done":
+        return render_template("job_status.html", job=job,
+                               title="Importing students" if enrolling else None)
+
+    result = job["result"]
+    if result.get("profile"):
+        flash(f"Profile written to {result['profile']}", "info")
+    if enrolling:
+        flash(f"Imported {len(result['enrolled'])} student(s), {len(result['failures'])} failed.",
+              "success" if result["enrolled"] else "warning")
+        return render_template("enroll_result.html", result=result)
+    flash(f"Attendance marked! SMS queued for absent students' parents: {', '.join(result['sms_sent'])}", "success")
+    faces = result.get("faces", [])
+    return render_template("result.html", attendance=result["attendance"], today=result["today"],
+                           sms_sent=result["sms_sent"], section=result["section"],
+                           confidence=result.get("confidence", {}), frames=result.get("frames"),
+                           timings=result.get("timings"),
+                           unknown_faces=sum(1 for f in faces if f["status"] == "no_match"),
+                           conflict_faces=sum(1 for f in faces if f["status"] == "conflict"),
+                           low_quality_faces=sum(1 for f in faces if f["status"] == "low_quality"))
 
 # -------------------------------
 # Save Attendance as CSV
@@ -260,36 +736,93 @@ def upload():
 @login_required
 def save_attendance():
     today = datetime.now().strftime("%Y-%m-%d")
+    section = request.form.get("section", "").strip()
     attendance = {}
-    sms_sent = []
-
-    sms_log = load_sms_log()
-    sms_log[today] = []
 
-    for student in student_names:
+    for student in get_gallery(section).student_names():
         status = request.form.get(student, "Absent")
         attendance[student] = status
-        if status == "Absent" and student in student_parents:
-            msg = f"Dear parent, your child {student.title()} was absent on {today}."
-            send_sms(student_parents[student], msg)
-            sms_sent.append(student.title())
-            sms_log[today].append(student.title())
-
-    filename = f"attendance_{today}.csv"
-    with open(filename, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["Name", "Date", "Status"])
-        for student, status in attendance.items():
-            writer.writerow([student, today, status])
-
-    save_sms_log(sms_log)
-    flash(f"Attendance saved! SMS sent to absent students' parents: {', '.join(sms_log[today])}", "success")
-    return render_template("download.html", filename=filename)
-
-@app.route('/download/<filename>')
+    sms_sent = notify_absent_parents(attendance, today)
+    storage.record_attendance(today, attendance, section or student_sections)
+
+    flash(f"Attendance saved! SMS queued for absent students' parents: {', '.join(sms_sent)}", "success")
+    return render_template("download.html", date=today, section=section)
+
+# -------------------------------
+# Attendance history
+# -------------------------------
+def date_arg(name, default=None):
+    value = request.args.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        abort(400, f"{name} must be YYYY-MM-DD")
+
+# Records between ?start= and ?end= (or one ?date=), optionally for one
+# ?section=, streamed from the database cursor. ?format=csv (default) or
+# csv.gz; the body is sent chunked, so memory stays flat for any range.
+@app.route('/attendance.csv')
+@app.route('/attendance/export')
 @login_required
-def download(filename):
-    return send_file(filename, as_attachment=True)
+def export_attendance():
+    day = date_arg("date")
+    start = date_arg("start", day)
+    if start is None:
+        return "Give ?date=YYYY-MM-DD or ?start=YYYY-MM-DD[&end=YYYY-MM-DD]", 400
+    end = date_arg("end", day or datetime.now().strftime("%Y-%m-%d"))
+    section = request.args.get("section", "").strip() or None
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return f"format must be one of {', '.join(EXPORT_FORMATS)}", 400
+    mimetype, extension = EXPORT_FORMATS[fmt]
+
+    rows = storage.iter_attendance(start, end, section)
+    chunks = export_chunks(fmt, rows, ["Name", "Date", "Section", "Status"])
+
+    filename = f"attendance_{start}" + (f"_{end}" if end != start else "")
+    if section:
+        filename += f"_{secure_filename(section)}"
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}{extension}"'})
+
+# Per-student present/absent days over a range, e.g.
+# /attendance/summary?start=2026-01-01&end=2026-01-31&min_absent=4
+@app.route('/attendance/summary')
+@login_required
+def attendance_summary():
+    start, end = date_arg("start"), date_arg("end")
+    section = request.args.get("section", "").strip() or None
+    min_absent = request.args.get("min_absent", 0, type=int)
+    rows = storage.attendance_summary(start, end, section, min_absent)
+    days = storage.attendance_trend("day", start, end, section)
+    return jsonify({
+        "students": [{"name": name, "present": present, "absent": absent} for name, present, absent in rows],
+        "days": [{"date": date, "present": present, "absent": absent} for date, present, absent in days],
+    })
+
+# Weekly (default), monthly or daily present/absent series from the
+# precomputed counters: /attendance/trends?period=month&section=7A
+@app.route('/attendance/trends')
+@login_required
+def attendance_trends():
+    period = request.args.get("period", "week")
+    if period not in storage.COUNT_PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(storage.COUNT_PERIODS)}"}), 400
+    section = request.args.get("section", "").strip() or None
+    rows = storage.attendance_trend(period, date_arg("start"), date_arg("end"), section)
+    return jsonify({"period": period, "section": section, "series": [
+        {"start": start, "present": present, "absent": absent,
+         "rate": round(present / (present + absent), 4)} for start, present, absent in rows]})
+
+@app.route('/attendance/student/<student_name>')
+@login_required
+def student_attendance(student_name):
+    rows = storage.student_history(student_name.lower(), date_arg("start"), date_arg("end"))
+    return jsonify({"name": student_name.lower(),
+                    "records": [{"date": date, "section": section, "status": status}
+                                for date, section, status in rows]})
 
 # -------------------------------
 # Student Management
@@ -297,80 +830,117 @@ def download(filename):
 @app.route('/students')
 @login_required
 def students():
+    photos = encoding_store.files_by_name()
     student_data = []
-    for student in student_names:
-        for ext in ['.jpg', '.jpeg', '.png']:
-            img_path = os.path.join(path, f"{student}{ext}")
-            if os.path.exists(img_path):
-                static_path = os.path.join("static", f"{student}{ext}")
-                if not os.path.exists(static_path):
-                    shutil.copy(img_path, static_path)
-                student_data.append({"name": student.title(), "image": f"/static/{student}{ext}"})
-                break
-    return render_template("students.html", students=student_data)
+    for student in gallery.student_names():
+        thumb = thumbnails.index.get(student)
+        student_data.append({"name": student.title(),
+                             "image": url_for("thumbnail", name=thumb) if thumb else None,
+                             "section": student_sections.get(student, DEFAULT_SECTION),
+                             "photos": len(photos.get(student, []))})
+    return render_template("students.html", students=student_data, sections=all_sections())
+
+# Thumbnail names are content hashes, so a response never goes stale.
+@app.route('/thumbs/<name>')
+@login_required
+def thumbnail(name):
+    response = send_from_directory(thumbnails.root, name, max_age=THUMB_MAX_AGE)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/add_student', methods=['POST'])
 @login_required
 def add_student():
-    name = request.form.get("name").strip().lower()
+    name = (request.form.get("name") or "").strip().lower()
+    section = request.form.get("section", "").strip() or DEFAULT_SECTION
+    parent_phone = request.form.get("parent_phone", "").strip()
+    extra = request.form.get("extra") == "1"  # add a reference photo instead of replacing
     photo = request.files['photo']
 
     if not name or not photo:
         return "Name and Photo required!", 400
+    if enrollment.name_problem(name):
+        return "Invalid student name!", 400
 
     ext = os.path.splitext(photo.filename)[1].lower()
     if ext not in ['.jpg', '.jpeg', '.png']:
         return "Only JPG, JPEG, PNG allowed!", 400
 
-    save_path = os.path.join(path, f"{name}{ext}")
+    # Checked and encoded from a staging folder, then moved into place the
+    # way a bulk batch is (enrollment.commit_batch), so a rejected upload
+    # never touches the student's current reference photo.
+    file = f"{name}/{uuid.uuid4().hex[:8]}{ext}" if extra else f"{name}{ext}"
+    staging = enrollment.staging_folder(path)
+    staged = os.path.join(staging, file)
+    os.makedirs(os.path.dirname(staged), exist_ok=True)
 
     try:
-        # Convert uploaded image to RGB
-        photo_img = Image.open(photo)
-        photo_img = photo_img.convert("RGB")
-        photo_img.save(save_path)
-
-        # Load and encode face
-        img_array = load_image_for_face_recognition(save_path, resize_max=1200)
-        encodings = face_recognition.face_encodings(img_array)
-        if len(encodings) > 0:
-            images.append(encodings[0])
-            student_names.append(name)
-            print(f"Added new student: {name}")
-        else:
-            os.remove(save_path)
+        problem, encoding = enrollment.encode_photo(photo.read(), staged, gate=ENROLL_GATE)
+        if problem == "no face detected":
             return "No face detected in uploaded image!", 400
+        if problem:
+            return f"Photo rejected: {problem}. Please upload a clear, front-facing photo.", 400
+        entry = {"name": name, "section": section, "parent_phone": parent_phone, "extra": extra,
+                 "file": file, "staged": staged, "encoding": encoding}
+        enrollment.commit_batch([entry], path, encoding_store)
+        thumbnails.update(encoding_store.roster_photos([name]), path)
+        publish_roster([name])
+        print(f"Added new student: {name}")
     except Exception as e:
-        if os.path.exists(save_path):
-            os.remove(save_path)
         return f"Error processing image: {e}", 400
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
 
     return redirect(url_for('students'))
 
 
 
+@app.route('/students/bulk', methods=['POST'])
+@login_required
+def bulk_add_students():
+    archive = request.files.get("archive")
+    if not archive or not archive.filename:
+        return "ZIP archive required!", 400
+    section = request.form.get("section", "").strip() or DEFAULT_SECTION
+    filepath = os.path.join(upload_dir, f"{uuid.uuid4().hex}.zip")
+    archive.save(filepath)
+
+    job_id = job_queue.submit({"kind": "enroll", "archive": filepath, "section": section,
+                               "profile": profile_requested()})
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"job_id": job_id, "status_url": url_for("job_status", job_id=job_id)}), 202
+    return redirect(url_for("job_result", job_id=job_id))
+
 @app.route('/delete_student/<student_name>', methods=['POST'])
 @login_required
 def delete_student(student_name):
-    global student_names, images
     student_name = student_name.lower()
+    if enrollment.name_problem(student_name):
+        abort(400)
+
+    storage.delete_student(student_name)
     
-    # Remove student from lists
-    if student_name in student_names:
-        index = student_names.index(student_name)
-        student_names.pop(index)
-        images.pop(index)
-    
-    # Delete student images from students_db
-    for ext in ['.jpg', '.jpeg', '.png']:
-        img_path = os.path.join(path, f"{student_name}{ext}")
+    # Delete student images (main and extra photos) from students_db
+    files = set(encoding_store.files_for(student_name)) | {f"{student_name}{ext}" for ext in image_extensions}
+    for file in files:
+        img_path = os.path.join(path, file)
         if os.path.exists(img_path):
             os.remove(img_path)
+    encoding_store.remove_many(sorted(files))
+    folder = os.path.realpath(os.path.join(path, student_name))
+    if os.path.dirname(folder) == os.path.realpath(path):
+        shutil.rmtree(folder, ignore_errors=True)
     
-    # Also remove from static folder if copied
-    static_img_path = os.path.join("static", f"{student_name}.jpg")
-    if os.path.exists(static_img_path):
-        os.remove(static_img_path)
+    thumbnails.remove(student_name)
+    # drop them from every worker's galleries
+    publish_roster()
+    # full-size copies the roster page used to make in static/
+    for ext in image_extensions:
+        static_img_path = os.path.join("static", f"{student_name}{ext}")
+        if os.path.exists(static_img_path):
+            os.remove(static_img_path)
     
     flash(f"Student '{student_name.title()}' deleted successfully.", "success")
     return redirect(url_for('students'))
@@ -380,23 +950,12 @@ def delete_student(student_name):
 @app.route("/dashboard")
 @login_required
 def dashboard():
-    total_students = len(student_names)
+    total_students = len(gallery.student_names())
     today = datetime.now().strftime("%Y-%m-%d")
-    today_csv = f"attendance_{today}.csv"
-    present_count = 0
-    absent_count = 0
-
-    sms_log = load_sms_log()
-    sms_sent = sms_log.get(today, [])
-
-    if os.path.exists(today_csv):
-        with open(today_csv, "r") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row["Status"] == "Present":
-                    present_count += 1
-                else:
-                    absent_count += 1
+
+    sms_sent = [student.title() for student in sms_dispatcher.students_for_date(today)]
+
+    present_count, absent_count = storage.day_counts(today)
 
     now = datetime.now()
     return render_template("dashboard.html",
@@ -406,5 +965,118 @@ def dashboard():
                            sms_sent=sms_sent,
                            now=now)
 
+# -------------------------------
+# Startup & readiness
+# -------------------------------
+# create_app() does the quick part of startup (databases, folders, job
+# queue) and hands the slow part to a warm-up thread, in stages:
+#   sms        make the SMS client and start draining the outbox
+#   models     import face_recognition, which loads the dlib models
+#   encodings  encode new or changed photos in students_db
+#   roster     publish the roster and load it into the galleries
+#   workers    load the models in the recognition pool processes
+# /health answers as soon as the process serves requests; /ready answers
+# 503 with the warm-up progress until it's done, so rollouts only send
+# traffic to warm workers. A roster already published by a previous run or
+# another worker is served from the first request. Jobs that arrive during
+# the warm-up wait for it, for at most WARMUP_WAIT seconds.
+WARM_POOL = os.environ.get("WARM_POOL", "1") == "1"
+WARMUP_WAIT = float(os.environ.get("WARMUP_WAIT", "600"))
+
+startup_lock = threading.Lock()
+started = False
+warmed_up = threading.Event()
+warmup = {"stage": "starting", "done": 0, "total": 0, "seconds": 0.0, "error": None}
+warmup_start = None
+metrics.gauge("warmup_ready", "1 once the warm-up has finished", lambda: int(warmed_up.is_set()))
+
+def warmup_stage(stage, total=0):
+    warmup.update(stage=stage, done=0, total=total)
+    print(f"Warm-up: {stage}")
+
+def warmup_progress(done, total):
+    warmup.update(done=done, total=total)
+
+def warm_up():
+    try:
+        warmup_stage("sms")
+        sms_dispatcher.client = make_sms_client()
+        sms_dispatcher.start()  # pick up anything left queued by a previous run
+
+        warmup_stage("models")
+        with metrics.span("warmup_models"):
+            face_api()
+
+        warmup_stage("encodings")
+        with metrics.span("warmup_encodings"):
+            encoding_store.sync(path, image_extensions, encode_student_photo, progress=warmup_progress)
+
+        warmup_stage("roster")
+        with metrics.span("warmup_roster"):
+            shared_roster.publish(students_for_roster)
+            refresh_roster()
+            refresh_photos()
+        print("Loaded students:", gallery.student_names())
+
+        if WARM_POOL:
+            warmup_stage("workers", JOB_PROCESSES)
+            with metrics.span("warmup_workers"):
+                pool = get_recognition_pool()
+                futures = [pool.submit(warm_models) for _ in range(JOB_PROCESSES)]
+                for done, future in enumerate(futures, 1):
+                    future.result()
+                    warmup_progress(done, JOB_PROCESSES)
+        warmup_stage("ready")
+    except Exception as e:
+        warmup["error"] = f"{warmup['stage']}: {e}"
+        print(f"Warm-up failed during {warmup['stage']}: {e}")
+    finally:
+        warmup["seconds"] = round(time.perf_counter() - warmup_start, 2)
+        warmed_up.set()
+        print(f"Warm-up finished in {warmup['seconds']}s")
+
+# Called by background jobs before they touch the models or the roster.
+def wait_until_ready():
+    if warmed_up.is_set():
+        return
+    with metrics.span("warmup_wait"):
+        if not warmed_up.wait(WARMUP_WAIT):
+            raise RuntimeError("The server is still warming up, try again shortly.")
+
+def create_app():
+    global started, warmup_start, encoding_store, thumbnails, shared_roster, sms_dispatcher, job_queue
+    if started:
+        return app
+    with startup_lock:
+        if started:
+            return app
+        storage.init_db()
+        storage.migrate_legacy_files()  # one-shot import of the old JSON/CSV files
+        os.makedirs(path, exist_ok=True)
+        os.makedirs(upload_dir, exist_ok=True)
+        encoding_store = EncodingStore("encodings_cache")
+        thumbnails = ThumbnailCache("thumbs_cache")
+        shared_roster = SharedRoster("encodings_cache")
+        sms_dispatcher = SmsDispatcher(storage.ATTENDANCE_DB, None, TWILIO_NUMBER,
+                                       rate_per_sec=SMS_RATE_PER_SEC, concurrency=SMS_CONCURRENCY)
+        job_queue = JobQueue(os.path.join("instance", "jobs.db"), run_job, threads=JOB_THREADS)
+        job_queue.start()  # resume jobs left queued or orphaned by a previous run
+        warmup_start = time.perf_counter()
+        threading.Thread(target=refresh_photos_loop, name="photo-refresh", daemon=True).start()
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+        started = True
+    return app
+
+@app.route('/health')
+def health():
+    return jsonify({"status": "ok"})
+
+@app.route('/ready')
+def ready():
+    state = dict(warmup, ready=warmed_up.is_set() and not warmup["error"])
+    if not warmed_up.is_set():
+        state["seconds"] = round(time.perf_counter() - warmup_start, 2)
+    return jsonify(state), 200 if state["ready"] else 503
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,56 @@
+import os, sys, time, argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gallery import Gallery, AGGREGATIONS
+
+# -------------------------------
+# Several reference photos per student: min vs centroid vs vote
+# -------------------------------
+# Every student has a true identity vector; each reference photo and each
+# face in a group photo is that identity plus independent "lighting/pose"
+# noise. Strangers are identities that were never enrolled. Reports the
+# share of enrolled faces matched to the right student, the share of
+# strangers wrongly accepted and the matching time per group photo.
+
+def identities(n, rng):
+    return rng.normal(0, 0.06, (n, 128)).astype(np.float32)
+
+def photos_of(ids, per_id, noise, rng):
+    return (np.repeat(ids, per_id, axis=0) + rng.normal(0, noise, (len(ids) * per_id, 128))).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-photo aggregation benchmark")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--refs", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--faces", type=int, default=60, help="faces per group photo")
+    parser.add_argument("--noise", type=float, default=0.038)
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    ids = identities(args.students, rng)
+    names = [f"student{i}" for i in range(args.students)]
+    who = rng.integers(args.students, size=args.queries)
+    faces = (ids[who] + rng.normal(0, args.noise, (args.queries, 128))).astype(np.float32)
+    strangers = photos_of(identities(args.queries // 4, rng), 1, args.noise, rng)
+
+    print(f"{'refs':>5} {'aggregate':>10} {'correct':>8} {'false acc':>10} {'ms/photo':>9}")
+    for refs in args.refs:
+        gallery = Gallery.from_encodings(np.repeat(names, refs).tolist(), photos_of(ids, refs, args.noise, rng))
+        for aggregate in AGGREGATIONS:
+            gallery.match(faces[:1], aggregate=aggregate)  # build blocks/centroids outside the timing
+            start = time.perf_counter()
+            results = []
+            for i in range(0, len(faces), args.faces):
+                results.extend(gallery.match(faces[i:i + args.faces], args.tolerance, aggregate, args.k))
+            ms = (time.perf_counter() - start) / -(-len(faces) // args.faces) * 1000.0
+            correct = np.mean([name == names[w] for (name, _), w in zip(results, who)])
+            false_accept = np.mean([name is not None for name, _ in
+                                    gallery.match(strangers, args.tolerance, aggregate, args.k)])
+            print(f"{refs:>5} {aggregate:>10} {correct:>8.3f} {false_accept:>10.3f} {ms:>9.2f}")
+
+if __name__ == "__main__":
+    main()
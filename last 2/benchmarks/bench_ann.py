@@ -0,0 +1,71 @@
+import os, sys, time, argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gallery import Gallery
+from ann_index import IVFIndex
+
+# -------------------------------
+# IVF vs brute force on synthetic 128-d encodings
+# -------------------------------
+# Students are drawn around a few hundred cluster centres (so the data has
+# structure like real face embeddings); queries are enrolled students plus
+# noise (~0.35 away, i.e. a genuine match under tolerance=0.6) mixed with
+# strangers that should not match anybody.
+
+def synthetic_encodings(n, rng, clusters=256):
+    centres = rng.normal(0, 0.06, (clusters, 128))
+    labels = rng.integers(clusters, size=n)
+    return (centres[labels] + rng.normal(0, 0.055, (n, 128))).astype(np.float32)
+
+def make_queries(students, n_queries, rng, strangers=0.2):
+    n_known = int(n_queries * (1 - strangers))
+    picked = rng.integers(len(students), size=n_known)
+    known = students[picked] + rng.normal(0, 0.03, (n_known, 128))
+    unknown = synthetic_encodings(n_queries - n_known, rng)
+    return np.vstack([known, unknown]).astype(np.float32)
+
+def timed_match(gallery, queries, faces_per_photo, tolerance):
+    results = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), faces_per_photo):
+        results.extend(gallery.match(queries[i:i + faces_per_photo], tolerance=tolerance))
+    elapsed = time.perf_counter() - start
+    photos = -(-len(queries) // faces_per_photo)
+    return results, elapsed / photos * 1000.0
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF vs brute-force matching benchmark")
+    parser.add_argument("--students", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--queries", type=int, default=600)
+    parser.add_argument("--faces", type=int, default=60, help="faces per group photo")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'students':>9} {'mode':>10} {'ms/photo':>9} {'recall@1':>9} {'speedup':>8}")
+    for n in args.students:
+        students = synthetic_encodings(n, rng)
+        names = [f"student{i}" for i in range(n)]
+        queries = make_queries(students, args.queries, rng)
+
+        exact = Gallery.from_encodings(names, students)
+        truth, exact_ms = timed_match(exact, queries, args.faces, args.tolerance)
+        print(f"{n:>9} {'exact':>10} {exact_ms:>9.2f} {1.0:>9.3f} {1.0:>7.1f}x")
+
+        ann = Gallery.from_encodings(names, students)
+        index = IVFIndex()
+        start = time.perf_counter()
+        ann.attach_index(index)
+        build_s = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            index.nprobe = nprobe
+            found, ann_ms = timed_match(ann, queries, args.faces, args.tolerance)
+            # recall@1: same decision (same student, or both "no match") as exact
+            recall = np.mean([a[0] == b[0] for a, b in zip(found, truth)])
+            print(f"{n:>9} {'ivf/' + str(nprobe):>10} {ann_ms:>9.2f} {recall:>9.3f} {exact_ms / ann_ms:>7.1f}x")
+        print(f"{'':>9} ivf build: {len(index.centroids)} cells in {build_s:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os, sys, time, argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gallery import Gallery, ASSIGNMENTS, linear_sum_assignment
+
+# -------------------------------
+# Independent matching vs one-to-one assignment
+# -------------------------------
+# A class photo holds `--faces` enrolled students plus a few people who are
+# not enrolled but look like one of them (a sibling, a visitor). Matched
+# independently, both faces can claim the same student; assigned one-to-one,
+# the closer face keeps the student and the other is reported as a conflict.
+# Reports duplicated students, wrong names and ms per photo.
+
+def main():
+    parser = argparse.ArgumentParser(description="Face assignment benchmark")
+    parser.add_argument("--students", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--faces", type=int, default=100)
+    parser.add_argument("--lookalikes", type=float, default=0.1, help="unenrolled lookalikes per enrolled face")
+    parser.add_argument("--noise", type=float, default=0.038)
+    parser.add_argument("--photos", type=int, default=20)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'students':>9} {'method':>11} {'duplicates':>11} {'wrong':>7} {'ms/photo':>9}")
+    for students in args.students:
+        ids = rng.normal(0, 0.06, (students, 128)).astype(np.float32)
+        gallery = Gallery.from_encodings([f"student{i}" for i in range(students)], ids)
+        twins = int(args.faces * args.lookalikes)
+        photos = []
+        for _ in range(args.photos):
+            who = rng.choice(students, args.faces, replace=False)
+            faces = ids[who] + rng.normal(0, args.noise, (len(who), 128))
+            lookalikes = ids[who[:twins]] + rng.normal(0, 0.02, (twins, 128)) + rng.normal(0, args.noise, (twins, 128))
+            photos.append((np.concatenate([who, np.full(twins, -1)]),
+                           np.vstack([faces, lookalikes]).astype(np.float32)))
+
+        for method in ("independent",) + ASSIGNMENTS:
+            if method == "hungarian" and linear_sum_assignment is None:
+                continue  # scipy not installed
+            duplicates = wrong = 0
+            start = time.perf_counter()
+            for who, faces in photos:
+                if method == "independent":
+                    names = [name for name, _ in gallery.match(faces)]
+                else:
+                    names = [report["name"] for report in gallery.assign(faces, method=method)]
+                found = [n for n in names if n is not None]
+                duplicates += len(found) - len(set(found))
+                wrong += sum(1 for n, w in zip(names, who) if n is not None and n != f"student{w}")
+            ms = (time.perf_counter() - start) / len(photos) * 1000.0
+            print(f"{students:>9} {method:>11} {duplicates:>11} {wrong:>7} {ms:>9.2f}")
+
+if __name__ == "__main__":
+    main()
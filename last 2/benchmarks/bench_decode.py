@@ -0,0 +1,92 @@
+import os, sys, json, time, resource, argparse, subprocess, tempfile
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# -------------------------------
+# Upload decoding: time and peak memory
+# -------------------------------
+# Decodes a large JPEG the way an upload job does, up to the copy into the
+# workers' shared memory, with the old loader (full-size decode, LANCZOS
+# over the whole image, np.array copy) and with recognition.decode_image().
+# Each variant runs in its own process so its peak RSS can be read from
+# /proc; the number reported is the growth over the process's RSS after
+# imports, for the first decode. Time is the median over --repeat runs.
+
+def legacy_load(img_path, resize_max):
+    with Image.open(img_path) as img:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        w, h = img.size
+        if max(w, h) > resize_max:
+            scale = resize_max / float(max(w, h))
+            img = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+        arr = np.array(img)
+        if arr.dtype != np.uint8:
+            arr = arr.astype(np.uint8)
+        return arr
+
+# VmHWM resets on exec; ru_maxrss is inherited from the parent on Linux,
+# which would hide everything below the parent's own peak.
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KB on Linux
+
+def run_variant(variant, photo, resize_max, repeat):
+    from recognition import decode_image, SharedImage
+    load = legacy_load if variant == "before" else decode_image
+    baseline = peak_rss_mb()
+    times, rss = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = load(photo, resize_max)
+        with SharedImage(image):
+            pass
+        times.append(time.perf_counter() - start)
+        del image
+        # peak of one upload; later repeats mostly measure how malloc reuses the heap
+        rss = peak_rss_mb() - baseline if rss is None else rss
+    print(json.dumps({"ms": 1000.0 * float(np.median(times)), "rss_mb": rss}))
+
+def make_photo(path, width, height):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) * 127 // (width + height))], axis=-1)
+    noise = rng.integers(0, 40, (height, width, 3))
+    Image.fromarray((base + noise).clip(0, 255).astype(np.uint8)).save(path, quality=90)
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload decode benchmark")
+    parser.add_argument("--photo", help="JPEG to decode (default: a synthetic 12 MP photo)")
+    parser.add_argument("--resize-max", type=int, nargs="+", default=[1600, 3200])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        return run_variant(args.variant, args.photo, args.resize_max[0], args.repeat)
+
+    photo = args.photo
+    if photo is None:
+        photo = os.path.join(tempfile.mkdtemp(), "group.jpg")
+        make_photo(photo, 4032, 3024)
+    with Image.open(photo) as img:
+        print(f"{photo}: {img.size[0]}x{img.size[1]}, {os.path.getsize(photo) / 1e6:.1f} MB")
+    print(f"{'resize_max':>10} {'variant':>8} {'ms':>8} {'peak RSS MB':>12}")
+    for resize_max in args.resize_max:
+        for variant in ("before", "after"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--variant", variant, "--photo", photo,
+                                  "--resize-max", str(resize_max), "--repeat", str(args.repeat)],
+                                 capture_output=True, text=True, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{resize_max:>10} {variant:>8} {result['ms']:>8.1f} {result['rss_mb']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
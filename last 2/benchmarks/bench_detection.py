@@ -0,0 +1,70 @@
+import os, sys, time, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import face_recognition
+from recognition import load_image_for_face_recognition, detect_and_encode, make_pool, DETECTION_MODES
+from gallery import Gallery
+
+# -------------------------------
+# Group photo detection: single vs tiled vs cascade
+# -------------------------------
+# Reports wall time, faces found and students matched for each detection
+# mode and worker count. "reference" is the original path (whole frame,
+# no pool) and is what the match column is compared against.
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PHOTO = os.path.join(HERE, "..", "uploaded_group.jpg")
+DEFAULT_STUDENTS = os.path.join(HERE, "..", "students_db")
+
+def load_gallery(folder):
+    names, encodings = [], []
+    for file in sorted(os.listdir(folder)):
+        if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+            found = face_recognition.face_encodings(
+                load_image_for_face_recognition(os.path.join(folder, file)))
+            if found:
+                names.append(os.path.splitext(file)[0].lower())
+                encodings.append(found[0])
+    return Gallery.from_encodings(names, encodings)
+
+def run(image, gallery, repeat, **kwargs):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        locations, encodings = detect_and_encode(image, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    matched = {name for name, _ in gallery.match(encodings) if name is not None}
+    return best, len(locations), matched
+
+def main():
+    parser = argparse.ArgumentParser(description="Group photo detection benchmark")
+    parser.add_argument("photo", nargs="?", default=DEFAULT_PHOTO)
+    parser.add_argument("--students", default=DEFAULT_STUDENTS)
+    parser.add_argument("--resize-max", type=int, default=3200)
+    parser.add_argument("--modes", nargs="+", default=list(DETECTION_MODES), choices=DETECTION_MODES)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--tile-size", type=int, default=800)
+    parser.add_argument("--tile-overlap", type=int, default=200)
+    parser.add_argument("--cascade-max", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    gallery = load_gallery(args.students)
+    image = load_image_for_face_recognition(args.photo, resize_max=args.resize_max)
+    print(f"{args.photo}: {image.shape[1]}x{image.shape[0]}, {len(gallery)} enrolled photos")
+
+    ref_s, ref_faces, ref_matched = run(image, gallery, args.repeat, mode="single")
+    print(f"{'mode':>14} {'seconds':>8} {'faces':>6} {'matched':>8} {'same':>5} {'speedup':>8}")
+    print(f"{'reference':>14} {ref_s:>8.2f} {ref_faces:>6} {len(ref_matched):>8} {'yes':>5} {1.0:>7.1f}x")
+    for workers in args.workers:
+        with make_pool(workers) as pool:
+            pool.submit(int).result()  # fork workers before timing
+            for mode in args.modes:
+                secs, faces, matched = run(image, gallery, args.repeat, pool=pool, mode=mode,
+                                           tile_size=args.tile_size, tile_overlap=args.tile_overlap,
+                                           cascade_max=args.cascade_max)
+                same = "yes" if matched == ref_matched else "no"
+                label = f"{mode}/{workers}"
+                print(f"{label:>14} {secs:>8.2f} {faces:>6} {len(matched):>8} {same:>5} {ref_s / secs:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
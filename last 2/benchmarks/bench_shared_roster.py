@@ -0,0 +1,121 @@
+import os, sys, json, time, argparse, subprocess, tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gallery import Gallery
+from shared_roster import SharedRoster
+
+# -------------------------------
+# Shared roster: memory per worker and cost of picking up changes
+# -------------------------------
+# Publishes a synthetic roster, then starts --workers processes that each
+# build the galleries a web worker holds (everyone + one per section),
+# either as private copies (the old load_students) or over the shared map,
+# and match a batch of faces so the pages are actually touched. Reported per
+# worker: private memory (Private_Clean + Private_Dirty from smaps_rollup)
+# and proportional set size. What stays private with the shared map is the
+# row names / per-student bookkeeping and heap malloc keeps after matching
+# (the same in both modes). Then times the per-request version check, an
+# in-place append of one student, the initial publish and a worker's reload.
+
+def roster(students, refs, sections, rng):
+    return {f"student{i}": (f"S{i % sections}", rng.normal(0, 0.1, (refs, 128)).astype(np.float32))
+            for i in range(students)}
+
+def smaps_mb(pid="self"):
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Pss:", "Private_Clean:", "Private_Dirty:"):
+                out[parts[0][:-1]] = int(parts[1]) / 1024.0
+    return out["Private_Clean"] + out["Private_Dirty"], out["Pss"]
+
+def build(root, mode):
+    names, sections, matrix, sq_norms = SharedRoster(root).load()[1:]
+    bounds = {}
+    for row, section in enumerate(sections):
+        bounds[section] = (bounds.get(section, (row,))[0], row + 1)
+    if mode == "private":
+        galleries = [Gallery.from_encodings(names, np.asarray(matrix))]
+        for section, (lo, hi) in bounds.items():
+            galleries.append(Gallery.from_encodings(names[lo:hi], np.asarray(matrix[lo:hi])))
+    else:
+        galleries = [Gallery.from_shared(matrix, sq_norms, names)]
+        for section, (lo, hi) in bounds.items():
+            galleries.append(Gallery.from_shared(matrix[lo:hi], sq_norms[lo:hi], names[lo:hi]))
+    return galleries
+
+def worker(root, mode, ready_path):
+    base = smaps_mb()[0]
+    galleries = build(root, mode)
+    faces = np.random.default_rng(1).normal(0, 0.1, (40, 128)).astype(np.float32)
+    for gallery in galleries:
+        gallery.match(faces)
+    with open(ready_path, "w") as f:
+        json.dump({"base": base}, f)
+    time.sleep(3600)
+
+def measure(root, mode, workers):
+    procs, stats = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        readies = [os.path.join(tmp, f"{i}.json") for i in range(workers)]
+        for ready in readies:
+            procs.append(subprocess.Popen([sys.executable, __file__, "--worker", root, mode, ready]))
+        while not all(os.path.exists(r) for r in readies):
+            time.sleep(0.05)
+        time.sleep(0.2)
+        for proc, ready in zip(procs, readies):
+            with open(ready) as f:
+                base = json.load(f)["base"]
+            private, pss = smaps_mb(proc.pid)
+            stats.append((private - base, pss))
+    for proc in procs:
+        proc.kill()
+        proc.wait()
+    return np.mean([s[0] for s in stats]), np.mean([s[1] for s in stats])
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared roster benchmark")
+    parser.add_argument("--students", type=int, default=50000)
+    parser.add_argument("--refs", type=int, default=2)
+    parser.add_argument("--sections", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    students = roster(args.students, args.refs, args.sections, rng)
+    mb = args.students * args.refs * 128 * 4 / 2 ** 20
+
+    with tempfile.TemporaryDirectory() as root:
+        shared = SharedRoster(root)
+        start = time.perf_counter()
+        shared.publish(lambda: students)
+        publish_s = time.perf_counter() - start
+        print(f"{args.students} students x {args.refs} photos = {mb:.1f} MB of encodings, "
+              f"{args.workers} workers")
+        print(f"{'galleries':>10} {'private MB/worker':>18} {'PSS MB/worker':>14}")
+        for mode in ("private", "shared"):
+            private, pss = measure(root, mode, args.workers)
+            print(f"{mode:>10} {private:>18.1f} {pss:>14.1f}")
+
+        n = 100000
+        start = time.perf_counter()
+        for _ in range(n):
+            shared.version()
+        check_us = (time.perf_counter() - start) / n * 1e6
+        new = {"newcomer": ("S0", rng.normal(0, 0.1, (1, 128)).astype(np.float32))}
+        everyone = dict(students, **new)
+        start = time.perf_counter()
+        shared.update(["newcomer"], lambda names=None: new if names else everyone)
+        append_s = time.perf_counter() - start
+        start = time.perf_counter()
+        build(root, "shared")
+        reload_s = time.perf_counter() - start
+        print(f"version check {check_us:.2f} us, publish {publish_s * 1000:.0f} ms, "
+              f"append one student {append_s * 1000:.0f} ms, worker reload {reload_s * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(*sys.argv[2:5])
+    else:
+        main()
@@ -0,0 +1,49 @@
+import os, sys, time, argparse, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from notifications import SmsDispatcher, FakeSmsClient
+
+# -------------------------------
+# SMS dispatcher throughput against a fake Twilio client
+# -------------------------------
+# The fake client sleeps `--latency` per message (a Twilio round trip) and
+# fails `--failure-rate` of calls, so retries and backoff are exercised.
+
+def drain(dispatcher, timeout):
+    deadline = time.time() + timeout
+    while dispatcher.pending_count() and time.time() < deadline:
+        time.sleep(0.05)
+
+def main():
+    parser = argparse.ArgumentParser(description="SMS dispatcher benchmark")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rate", type=float, default=1000.0, help="messages/sec cap")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    serial_estimate = args.messages * args.latency
+    print(f"serial sends (old send_sms loop): ~{serial_estimate:.1f}s for {args.messages} messages")
+    print(f"{'concurrency':>11} {'enqueue ms':>10} {'drain s':>8} {'msg/s':>8} {'sent':>6} {'dupes':>6}")
+    for concurrency in args.concurrency:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = FakeSmsClient(latency=args.latency, failure_rate=args.failure_rate)
+            dispatcher = SmsDispatcher(os.path.join(tmp, "sms.db"), client, "+10000000000",
+                                       rate_per_sec=args.rate, concurrency=concurrency,
+                                       backoff_base=0.05, verbose=False)
+            messages = [(f"student{i}", "2026-01-01", f"+91{i:010d}", "absent") for i in range(args.messages)]
+            start = time.perf_counter()
+            dispatcher.enqueue_many(messages)
+            enqueue_ms = (time.perf_counter() - start) * 1000.0
+            drain(dispatcher, args.timeout)
+            drain_s = time.perf_counter() - start
+            # saving the same attendance again must not text anyone twice
+            dupes = sum(dispatcher.enqueue_many(messages))
+            dispatcher.stop()
+            print(f"{concurrency:>11} {enqueue_ms:>10.1f} {drain_s:>8.2f} "
+                  f"{len(client.sent) / drain_s:>8.1f} {len(client.sent):>6} {dupes:>6}")
+
+if __name__ == "__main__":
+    main()
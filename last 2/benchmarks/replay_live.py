@@ -0,0 +1,81 @@
+import os, sys, json, time, argparse
+import urllib.request, urllib.parse, http.cookiejar
+
+# -------------------------------
+# Replay a recorded frame sequence into a live session
+# -------------------------------
+# Stand-in for a webcam: logs in to a running app, starts a live session and
+# posts the frames of a folder (sorted by name) or a video (needs OpenCV)
+# at --fps, then waits for the pipeline to drain and prints what it saw:
+# frames processed/dropped, per-stage latencies and the students present.
+#
+#   python benchmarks/replay_live.py frames_dir --user teacher --password secret --fps 10
+
+def read_frames(source):
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                with open(os.path.join(source, name), "rb") as f:
+                    yield f.read()
+        return
+    import cv2
+    capture = cv2.VideoCapture(source)
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        yield cv2.imencode(".jpg", frame)[1].tobytes()
+    capture.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay frames into a live attendance session")
+    parser.add_argument("source", help="folder of frames or a video file")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--section", default="")
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--drain", type=float, default=30.0, help="seconds to wait for queued frames")
+    args = parser.parse_args()
+
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    def post(path, data, headers=None):
+        request = urllib.request.Request(args.url + path, data=data, headers=headers or {})
+        with opener.open(request) as response:
+            return response.read()
+    def get_json(path):
+        with opener.open(urllib.request.Request(args.url + path, headers={"Accept": "application/json"})) as r:
+            return json.loads(r.read())
+
+    post("/login", urllib.parse.urlencode({"username": args.user, "password": args.password}).encode())
+    live = json.loads(post("/live/start", urllib.parse.urlencode({"section": args.section}).encode()))
+
+    interval = 1.0 / args.fps
+    start = time.perf_counter()
+    sent = 0
+    for sent, frame in enumerate(read_frames(args.source), 1):
+        post(live["frame_url"], frame, {"Content-Type": "image/jpeg"})
+        delay = start + sent * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    pushed = time.perf_counter() - start
+
+    deadline = time.time() + args.drain
+    while True:
+        state = get_json(live["state_url"])
+        c = state["counts"]
+        if c["processed"] + c["dropped"] + c["unreadable"] >= c["received"] or time.time() > deadline:
+            break
+        time.sleep(0.2)
+    result = json.loads(post(live["stop_url"], b"", {"Accept": "application/json"}))
+
+    c = result["counts"]
+    print(f"sent {sent} frame(s) in {pushed:.1f}s ({sent / pushed if pushed else 0:.1f} fps)")
+    print(f"processed {c['processed']}, dropped {c['dropped']}, unreadable {c['unreadable']}, faces {c['faces']}")
+    print(f"{'stage':>8} {'mean ms':>8} {'p95 ms':>8} {'n':>6}")
+    for stage, t in result["stages"].items():
+        print(f"{stage:>8} {t['mean_ms']:>8} {t['p95_ms']:>8} {t['n']:>6}")
+    print("present:", ", ".join(result["present"]) or "nobody")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+import os, sys, json, time, shutil, platform, argparse, subprocess, tempfile
+from datetime import date, timedelta
+import numpy as np
+import PIL
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from gallery import Gallery
+from shared_roster import SharedRoster
+
+# -------------------------------
+# Benchmark suite
+# -------------------------------
+# python benchmarks/suite.py [--only matching,reporting] [--quick]
+#                            [--out results.json] [--baseline baseline.json]
+#                            [--save-baseline baseline.json] [--threshold 0.2]
+#
+# Runs offline in a scratch directory holding copies of students_db/ and
+# uploaded_group.jpg, so instance/ and encodings_cache/ are never touched:
+#   startup     cold (empty encoding cache) and warm gallery load of the
+#               bundled photos, then publish + worker reload of a synthetic
+#               10k / 100k-row roster
+#   enrollment  bulk enrollment throughput (enrollment.enroll on the pool)
+#   upload      decode -> detect -> encode -> match of uploaded_group.jpg,
+#               per stage (the spans from metrics.py), then again through
+#               the upload quality gate: encode time saved per photo and
+#               faces matched with and without it
+#   matching    Gallery.assign / match on 100 .. 100k synthetic rows against
+#               1 .. 100 faces
+#   reporting   dashboard queries and CSV / csv.gz export over a synthetic
+#               attendance history
+# Every timing is the median of --repeat runs after one warm-up. Results are
+# written as JSON ({"meta", "results", "skipped"}); with a baseline each
+# shared metric is compared and the run exits 1 if any got worse by more
+# than --threshold. The bundled-photo part of startup, enrollment and upload
+# need face_recognition and are skipped (and listed as such) without it.
+SUITES = ("startup", "enrollment", "upload", "matching", "reporting")
+
+def median_time(fn, repeat):
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+class Results:
+    def __init__(self):
+        self.results = {}
+        self.skipped = {}
+
+    def add(self, name, value, unit, better="lower"):
+        self.results[name] = {"value": round(float(value), 4), "unit": unit, "better": better}
+        print(f"  {name:<48} {value:>12.3f} {unit}")
+
+    def ms(self, name, seconds):
+        self.add(name, seconds * 1000.0, "ms")
+
+def recognition_available():
+    try:
+        import face_recognition
+        return True
+    except ImportError as e:
+        return f"face_recognition not installed ({e})"
+
+def photo_files_in(folder):
+    from encoding_store import photo_files
+    return photo_files(folder, (".jpg", ".jpeg", ".png"))
+
+# -------------------------------
+# Suites
+# -------------------------------
+def bench_startup(args, out, ctx):
+    import bench_shared_roster
+
+    if ctx["recognition"] is True:
+        from encoding_store import EncodingStore
+        from reprocess import _encode_reference, PHOTO_EXTENSIONS
+
+        def load(cache):
+            store = EncodingStore(cache)
+            names, matrix = store.sync("students_db", PHOTO_EXTENSIONS, _encode_reference)
+            return Gallery.from_encodings(names, matrix)
+
+        def cold():
+            shutil.rmtree("cold_cache", ignore_errors=True)
+            ctx["gallery"] = load("cold_cache")
+
+        out.ms("startup.cold_load", median_time(cold, max(1, args.repeat // 2)))
+        out.ms("startup.warm_load", median_time(lambda: load("cold_cache"), args.repeat))
+        out.add("startup.photos", len(photo_files_in("students_db")), "photos", "higher")
+    else:
+        out.skipped["startup.photos"] = ctx["recognition"]
+        print(f"  bundled photo load skipped, {ctx['recognition']}")
+
+    rng = np.random.default_rng(0)
+    for n in args.roster_sizes:
+        students = bench_shared_roster.roster(n // 2, 2, 20, rng)
+        root = f"roster_{n}"
+        shared = SharedRoster(root)
+        start = time.perf_counter()
+        shared.publish(lambda: students)
+        out.ms(f"startup.roster_publish.rows={n}", time.perf_counter() - start)
+        out.ms(f"startup.roster_reload.rows={n}",
+               median_time(lambda: bench_shared_roster.build(root, "shared"), args.repeat))
+
+def bench_enrollment(args, out, ctx):
+    import storage, enrollment
+    from encoding_store import EncodingStore
+    from recognition import make_pool
+
+    storage.init_db()
+    sources = photo_files_in("students_db")
+    os.makedirs("batch", exist_ok=True)
+    for i in range(args.enroll_photos):
+        src = sources[i % len(sources)]
+        shutil.copy(os.path.join("students_db", src),
+                    os.path.join("batch", f"student{i:04d}{os.path.splitext(src)[1]}"))
+
+    def run():
+        shutil.rmtree("enrolled", ignore_errors=True)
+        shutil.rmtree("enroll_cache", ignore_errors=True)
+        os.makedirs("enrolled")
+        with make_pool(args.workers) as pool:
+            return enrollment.enroll("batch", "enrolled", EncodingStore("enroll_cache"), pool)
+
+    accepted, failures, seconds = run()
+    out.add(f"enrollment.photos={args.enroll_photos}.photos_per_sec", args.enroll_photos / seconds,
+            "photos/s", "higher")
+    out.add(f"enrollment.photos={args.enroll_photos}.accepted", len(accepted), "photos", "higher")
+
+def bench_upload(args, out, ctx):
+    import metrics
+    from recognition import load_image_for_face_recognition, detect_and_encode, make_pool
+    from quality import UPLOAD_GATE
+
+    roster = ctx.get("gallery")
+    if roster is None:
+        from encoding_store import EncodingStore
+        from reprocess import _encode_reference, PHOTO_EXTENSIONS
+        names, matrix = EncodingStore("upload_cache").sync("students_db", PHOTO_EXTENSIONS, _encode_reference)
+        roster = Gallery.from_encodings(names, matrix)
+
+    with make_pool(args.workers) as pool:
+        def run(gate=None):
+            with metrics.trace() as timings:
+                with metrics.span("decode"):
+                    image = load_image_for_face_recognition("uploaded_group.jpg", resize_max=args.group_resize_max)
+                found = detect_and_encode(image, pool=pool, mode=args.detection_mode, gate=gate)
+                with metrics.span("match"):
+                    faces = roster.assign([e for e in found[1] if e is not None])
+            return timings, len(found[0]), sum(1 for face in faces if face["name"] is not None)
+
+        run()
+        run(UPLOAD_GATE)
+        samples = [run() for _ in range(args.repeat)]
+        gated = [run(UPLOAD_GATE) for _ in range(args.repeat)]
+    for stage in ("decode", "detect", "encode", "match"):
+        out.ms(f"upload.{stage}", np.median([timings.get(stage, 0.0) for timings, _, _ in samples]))
+    out.ms("upload.total", np.median([sum(timings.values()) for timings, _, _ in samples]))
+    out.add("upload.faces", samples[0][1], "faces", "higher")
+    out.add("upload.matched", samples[0][2], "faces", "higher")
+    encode = np.median([timings.get("encode", 0.0) for timings, _, _ in samples])
+    gated_encode = np.median([timings.get("encode", 0.0) for timings, _, _ in gated])
+    out.ms("upload.gated.encode", gated_encode)
+    out.ms("upload.gated.total", np.median([sum(timings.values()) for timings, _, _ in gated]))
+    out.add("upload.gated.encode_saved", (encode - gated_encode) * 1000.0, "ms", "higher")
+    out.add("upload.gated.matched", gated[0][2], "faces", "higher")
+
+def bench_matching(args, out, ctx):
+    rng = np.random.default_rng(0)
+    for n in args.gallery_sizes:
+        students = max(1, n // 2)
+        ids = rng.normal(0, 0.06, (students, 128)).astype(np.float32)
+        rows = (np.repeat(ids, 2, axis=0)[:n] + rng.normal(0, 0.03, (n, 128))).astype(np.float32)
+        names = np.repeat([f"student{i}" for i in range(students)], 2)[:n].tolist()
+        start = time.perf_counter()
+        gallery = Gallery.from_encodings(names, rows)
+        out.ms(f"matching.build.rows={n}", time.perf_counter() - start)
+        for faces_n in args.face_counts:
+            who = rng.integers(students, size=faces_n)
+            faces = (ids[who] + rng.normal(0, 0.03, (faces_n, 128))).astype(np.float32)
+            out.ms(f"matching.assign.rows={n}.faces={faces_n}",
+                   median_time(lambda: gallery.assign(faces), args.repeat))
+            out.ms(f"matching.match.rows={n}.faces={faces_n}",
+                   median_time(lambda: gallery.match(faces), args.repeat))
+
+def bench_reporting(args, out, ctx):
+    import storage
+    from export import export_chunks
+
+    storage.init_db()
+    rng = np.random.default_rng(0)
+    students = [f"student{i:05d}" for i in range(args.history_students)]
+    sections = {name: f"S{i % 10}" for i, name in enumerate(students)}
+    first = date(2025, 1, 1)
+    dates = [(first + timedelta(days=d)).isoformat() for d in range(args.history_days)]
+    days = []
+    for day in dates:
+        present = rng.random(len(students)) < 0.9
+        days.append((day, {name: "Present" if p else "Absent" for name, p in zip(students, present)}, sections))
+    start = time.perf_counter()
+    for i in range(0, len(days), 30):
+        storage.record_attendance_many(days[i:i + 30])
+    seconds = time.perf_counter() - start
+    rows = len(students) * len(dates)
+    prefix = f"reporting.{len(students)}x{len(dates)}"
+    out.add(f"{prefix}.record_rows_per_sec", rows / seconds, "rows/s", "higher")
+
+    last, month = dates[-1], dates[max(0, len(dates) - 30)]
+    out.ms(f"{prefix}.day_counts", median_time(lambda: storage.day_counts(last), args.repeat))
+    out.ms(f"{prefix}.attendance_for_day", median_time(lambda: storage.attendance_for_day(last), args.repeat))
+    out.ms(f"{prefix}.summary_month", median_time(lambda: storage.attendance_summary(month, last), args.repeat))
+    out.ms(f"{prefix}.trend_week", median_time(lambda: storage.attendance_trend("week"), args.repeat))
+    out.ms(f"{prefix}.student_history", median_time(lambda: storage.student_history(students[0]), args.repeat))
+    for fmt in ("csv", "csv.gz"):
+        def export():
+            return sum(len(chunk) for chunk in export_chunks(fmt, storage.iter_attendance(dates[0], last),
+                                                             ["Name", "Date", "Section", "Status"]))
+        out.add(f"{prefix}.export_{fmt}_rows_per_sec", rows / median_time(export, max(1, args.repeat // 2)),
+                "rows/s", "higher")
+
+BENCHES = {"startup": bench_startup, "enrollment": bench_enrollment, "upload": bench_upload,
+           "matching": bench_matching, "reporting": bench_reporting}
+NEEDS_RECOGNITION = ("enrollment", "upload")
+
+# -------------------------------
+# Baseline comparison
+# -------------------------------
+# Returns the metrics that got worse by more than `threshold` (a fraction).
+# Timings that moved by less than `noise_ms` are never flagged: sub-0.1 ms
+# medians jitter by more than 20% from run to run.
+def compare(results, baseline, threshold, noise_ms=0.05):
+    regressions = []
+    print(f"\n{'metric':<48} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, now in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            continue
+        change = now["value"] / base["value"] - 1.0
+        worse = change if now["better"] == "lower" else -change
+        if now["unit"] == "ms" and abs(now["value"] - base["value"]) < noise_ms:
+            worse = 0.0
+        flag = "  REGRESSION" if worse > threshold else ""
+        print(f"{name:<48} {base['value']:>12.3f} {now['value']:>12.3f} {change:>+7.1%}{flag}")
+        if worse > threshold:
+            regressions.append(name)
+    return regressions
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "pillow": PIL.__version__, "platform": platform.platform(),
+            "cpus": os.cpu_count(), "args": vars(args)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite")
+    parser.add_argument("--only", help="comma-separated subset of " + ",".join(SUITES))
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, fewer repeats")
+    parser.add_argument("--repeat", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    parser.add_argument("--noise-ms", type=float, default=0.05, help="ignore timing changes below this")
+    parser.add_argument("--detection-mode", default="single")
+    parser.add_argument("--group-resize-max", type=int, default=None,
+                        help="default: 1600 in single mode, 3200 otherwise (as the app)")
+    args = parser.parse_args(argv)
+
+    if args.group_resize_max is None:
+        args.group_resize_max = 1600 if args.detection_mode == "single" else 3200
+    if args.quick:
+        args.repeat = args.repeat or 3
+        args.gallery_sizes, args.face_counts = [100, 1000, 10000], [1, 10, 100]
+        args.roster_sizes, args.enroll_photos = [10000], 16
+        args.history_students, args.history_days = 200, 60
+    else:
+        args.repeat = args.repeat or 7
+        args.gallery_sizes, args.face_counts = [100, 1000, 10000, 100000], [1, 10, 100]
+        args.roster_sizes, args.enroll_photos = [10000, 100000], 64
+        args.history_students, args.history_days = 1000, 365
+    suites = args.only.split(",") if args.only else list(SUITES)
+    for name in suites:
+        if name not in BENCHES:
+            parser.error(f"unknown suite {name}; choose from {', '.join(SUITES)}")
+    out_path = os.path.abspath(args.out) if args.out else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+
+    recognition = recognition_available()
+    out, ctx = Results(), {"recognition": recognition}
+    home = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench-") as scratch:
+        shutil.copytree(os.path.join(REPO, "students_db"), os.path.join(scratch, "students_db"))
+        shutil.copy(os.path.join(REPO, "uploaded_group.jpg"), scratch)
+        os.chdir(scratch)
+        try:
+            for name in suites:
+                if name in NEEDS_RECOGNITION and recognition is not True:
+                    out.skipped[name] = recognition
+                    print(f"{name}: skipped, {recognition}")
+                    continue
+                print(f"{name}:")
+                BENCHES[name](args, out, ctx)
+        finally:
+            os.chdir(home)
+
+    report = {"meta": metadata(args), "results": out.results, "skipped": out.skipped}
+    for path in (out_path, save_path):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            print(f"Results written to {path}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(out.results, baseline, args.threshold, args.noise_ms)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+import pytest
+
+import storage
+
+# storage keeps one connection per thread and database path; the paths are
+# relative to instance/, so each test gets fresh databases in its own cwd.
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage._local.conns = None
+    storage.init_db()
+    yield storage
+    for conn in storage._local.conns.values():
+        conn.close()
+    storage._local.conns = None
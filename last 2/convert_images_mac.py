@@ -1,19 +1,8 @@
-import os
-from PIL import Image
+import sys
+import reprocess
 
-folder = "students_db"
-image_extensions = ('.jpg', '.jpeg', '.png')
-
-for file in os.listdir(folder):
-    if file.lower().endswith(image_extensions):
-        img_path = os.path.join(folder, file)
-        try:
-            with Image.open(img_path) as img:
-                original_mode = img.mode
-                img = img.convert("RGB")  # Force 8-bit RGB
-                img.save(img_path)
-            print(f"✅ Converted {file}: {original_mode} -> RGB")
-        except Exception as e:
-            print(f"❌ Failed to convert {file}: {e}")
-
-print("✅ All images processed successfully!")
+# Superseded by reprocess.py, which normalises students_db (RGB, EXIF
+# rotation, size) on a process pool and only touches photos that changed
+# since its last run: `python reprocess.py` with no archive does just that.
+if __name__ == "__main__":
+    sys.exit(reprocess.main([]))
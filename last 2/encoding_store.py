@@ -0,0 +1,274 @@
+import os, json, hashlib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, workers just race on first boot
+    fcntl = None
+
+ENCODING_DIM = 128
+
+# -------------------------------
+# Helpers
+# -------------------------------
+def file_hash(img_path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(img_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# A student's main photo sits directly in the photo folder ("ali.jpg");
+# further reference photos go in a folder named after them ("ali/2.jpg").
+def student_name(file):
+    folder, base = os.path.split(file)
+    return (folder or os.path.splitext(base)[0]).lower()
+
+# Photo files relative to `folder`, grouped by student so each student's
+# rows end up contiguous in encodings.npy.
+def photo_files(folder, extensions):
+    files = []
+    for entry in os.listdir(folder):
+        if entry.startswith("."):
+            continue
+        full = os.path.join(folder, entry)
+        if os.path.isdir(full):
+            files.extend(f"{entry}/{f}" for f in os.listdir(full)
+                         if f.lower().endswith(extensions) and not f.startswith("."))
+        elif entry.lower().endswith(extensions):
+            files.append(entry)
+    return sorted(files, key=lambda f: (student_name(f), "/" in f, f))
+
+def _atomic_write_json(dest, data):
+    tmp = dest + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, dest)
+
+def _atomic_write_npy(dest, matrix):
+    tmp = dest + ".tmp.npy"
+    np.save(tmp, matrix)
+    os.replace(tmp, dest)
+
+# -------------------------------
+# On-disk encoding store
+# -------------------------------
+# encodings.npy holds one float32 row per photo with a face; index.json maps
+# photo path (relative to the photo folder) -> {name, mtime, size, sha1, row}.
+# Photos without a face are kept in the index with row = -1 so they aren't
+# re-encoded on every boot.
+class EncodingStore:
+    def __init__(self, root="encodings_cache"):
+        self.root = root
+        self.matrix_path = os.path.join(root, "encodings.npy")
+        self.index_path = os.path.join(root, "index.json")
+        self.lock_path = os.path.join(root, ".lock")
+        self.entries = {}
+        self.matrix = np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        os.makedirs(root, exist_ok=True)
+
+    def load(self):
+        self.entries = {}
+        self.matrix = np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        if not (os.path.exists(self.index_path) and os.path.exists(self.matrix_path)):
+            return False
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+        except Exception as e:
+            print(f"Encoding store unreadable, rebuilding: {e}")
+            return False
+        if data.get("rows") != matrix.shape[0] or matrix.shape[1:] != (ENCODING_DIM,):
+            print("Encoding store out of sync, rebuilding.")
+            return False
+        self.entries = data["files"]
+        self.matrix = matrix
+        return True
+
+    def save(self):
+        _atomic_write_npy(self.matrix_path, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        _atomic_write_json(self.index_path, {"rows": int(self.matrix.shape[0]), "files": self.entries})
+
+    def _lock(self):
+        f = open(self.lock_path, "w")
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    def _unlock(self, f):
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+    # Re-read the store, e.g. after another process wrote to it.
+    def refresh(self):
+        lock = self._lock()
+        try:
+            return self.load()
+        finally:
+            self._unlock(lock)
+
+    # Bring the store in line with `folder`. encode_fn(img_path) returns a
+    # 128-d encoding or None and is only called for new or changed photos.
+    # Returns (names, matrix) with one entry per photo that has a face.
+    # progress(done, total), if given, is called as the photos are checked.
+    def sync(self, folder, extensions, encode_fn, progress=None):
+        lock = self._lock()
+        try:
+            self.load()
+            old_entries = self.entries
+            by_hash = {e["sha1"]: e for e in old_entries.values()}
+            new_entries = {}
+            rows = []
+            encoded = 0
+
+            files = photo_files(folder, extensions)
+            for done, file in enumerate(files):
+                if progress:
+                    progress(done, len(files))
+                img_path = os.path.join(folder, file)
+                st = os.stat(img_path)
+                entry = old_entries.get(file)
+
+                if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+                    sha1 = entry["sha1"]
+                    encoding = self.matrix[entry["row"]] if entry["row"] >= 0 else None
+                else:
+                    sha1 = file_hash(img_path)
+                    entry = by_hash.get(sha1)
+                    if entry:
+                        encoding = self.matrix[entry["row"]] if entry["row"] >= 0 else None
+                    else:
+                        try:
+                            encoding = encode_fn(img_path)
+                        except Exception as e:
+                            print(f"Error loading {file}: {e}")
+                            continue
+                        encoded += 1
+                        if encoding is None:
+                            print(f"No face found in {file}, skipping.")
+                        # encode_fn may rewrite the file (RGB conversion)
+                        st = os.stat(img_path)
+                        sha1 = file_hash(img_path)
+
+                row = -1
+                if encoding is not None:
+                    row = len(rows)
+                    rows.append(np.asarray(encoding, dtype=np.float32))
+                new_entries[file] = {
+                    "name": student_name(file),
+                    "mtime": st.st_mtime,
+                    "size": st.st_size,
+                    "sha1": sha1,
+                    "row": row,
+                }
+
+            if progress:
+                progress(len(files), len(files))
+            matrix = np.vstack(rows) if rows else np.zeros((0, ENCODING_DIM), dtype=np.float32)
+            changed = new_entries != old_entries
+            self.entries = new_entries
+            self.matrix = matrix
+            if changed or not os.path.exists(self.matrix_path):
+                self.save()
+                print(f"Encoding store updated: {encoded} photo(s) encoded, {matrix.shape[0]} cached.")
+            # reopen through mmap so every worker shares the page cache
+            self.load()
+        finally:
+            self._unlock(lock)
+        return self.names_and_matrix()
+
+    # Record a single photo encoded outside of sync (e.g. by add_student).
+    def put(self, folder, file, encoding):
+        self.put_many(folder, [(file, encoding)])
+
+    # Record several (file, encoding) pairs with one rewrite of the store.
+    def put_many(self, folder, items):
+        lock = self._lock()
+        try:
+            self.load()
+            matrix = np.asarray(self.matrix)
+            new_rows = []
+            for file, encoding in items:
+                img_path = os.path.join(folder, file)
+                st = os.stat(img_path)
+                row = -1
+                old = self.entries.get(file)
+                if encoding is not None:
+                    encoding = np.asarray(encoding, dtype=np.float32)
+                    if old and old["row"] >= 0:
+                        row = old["row"]
+                        if not matrix.flags.writeable:
+                            matrix = np.array(matrix)
+                        matrix[row] = encoding
+                    else:
+                        row = matrix.shape[0] + len(new_rows)
+                        new_rows.append(encoding)
+                self.entries[file] = {
+                    "name": student_name(file),
+                    "mtime": st.st_mtime,
+                    "size": st.st_size,
+                    "sha1": file_hash(img_path),
+                    "row": row,
+                }
+            if new_rows:
+                matrix = np.vstack([matrix, np.asarray(new_rows, dtype=np.float32)])
+            self.matrix = matrix
+            self.save()
+            self.load()
+        finally:
+            self._unlock(lock)
+
+    # Forget photos. Their matrix rows are left in place and reclaimed by the
+    # next sync() rather than shifting every later row here.
+    def remove(self, file):
+        self.remove_many([file])
+
+    def remove_many(self, files):
+        lock = self._lock()
+        try:
+            self.load()
+            removed = [f for f in files if self.entries.pop(f, None) is not None]
+            if removed:
+                self.save()
+                self.load()
+        finally:
+            self._unlock(lock)
+
+    def files_for(self, name):
+        return [file for file, entry in self.entries.items() if entry["name"] == name]
+
+    # {name: [photo files]} for every student in the store.
+    def files_by_name(self):
+        files = {}
+        for file, entry in self.entries.items():
+            files.setdefault(entry["name"], []).append(file)
+        return files
+
+    # {name: (file, sha1)} of the photo that stands for each student on the
+    # roster: their main photo, else their first extra photo.
+    def roster_photos(self, names=None):
+        names = None if names is None else set(names)
+        best = {}
+        for file, entry in self.entries.items():
+            name = entry["name"]
+            if names is not None and name not in names:
+                continue
+            key = ("/" in file, file)
+            if name not in best or key < best[name][0]:
+                best[name] = (key, file, entry["sha1"])
+        return {name: (file, sha1) for name, (_, file, sha1) in best.items()}
+
+    # {name: (k, 128) array of that student's encodings}
+    def encodings_for(self, names):
+        rows = {name: [] for name in names}
+        for entry in self.entries.values():
+            if entry["row"] >= 0 and entry["name"] in rows:
+                rows[entry["name"]].append(entry["row"])
+        return {name: np.asarray(self.matrix[sorted(r)], dtype=np.float32).reshape(-1, ENCODING_DIM)
+                for name, r in rows.items()}
+
+    def names_and_matrix(self):
+        with_faces = sorted((e["row"], e["name"]) for e in self.entries.values() if e["row"] >= 0)
+        return [name for _, name in with_faces], self.matrix
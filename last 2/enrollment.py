@@ -0,0 +1,256 @@
+import os, io, sys, csv, time, shutil, uuid, zipfile, argparse
+from collections import deque
+import numpy as np
+from PIL import Image
+
+import storage
+from storage import DEFAULT_SECTION
+from encoding_store import EncodingStore
+from shared_roster import SharedRoster, roster_students
+from recognition import face_api, face_landmarks
+from quality import ENROLL_GATE, REJECT_REASONS
+
+# -------------------------------
+# Bulk enrollment
+# -------------------------------
+# A batch is a ZIP (or a folder) of student photos, optionally with a
+# manifest.csv of name,photo,parent_phone,section. Without a manifest every
+# photo is enrolled under its file name; a name listed more than once gets
+# the later photos as extra reference photos (students_db/<name>/). Photos
+# are decoded and encoded on a process pool; each worker writes the RGB
+# photo to a staging folder next to students_db. Nothing is enrolled until
+# the whole batch has been processed, then the accepted photos are moved in
+# and the encoding store and student table are each updated in one write.
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+MANIFEST_NAME = "manifest.csv"
+ENROLL_RESIZE_MAX = 1200
+
+def _entry(name, photo, parent_phone="", section=""):
+    return {"name": (name or "").strip().lower(), "photo": (photo or "").strip(),
+            "parent_phone": (parent_phone or "").strip(), "section": (section or "").strip()}
+
+def read_manifest(f):
+    reader = csv.DictReader(f)
+    return [_entry(row.get("name"), row.get("photo"), row.get("parent_phone") or row.get("phone"),
+                   row.get("section")) for row in reader]
+
+def _entries_from_names(names):
+    return [_entry(os.path.splitext(os.path.basename(n))[0], n) for n in sorted(names)
+            if n.lower().endswith(PHOTO_EXTENSIONS) and not os.path.basename(n).startswith(".")]
+
+# Returns (entries, read_photo) where read_photo(entry) -> bytes.
+def open_batch(source, manifest_path=None):
+    if os.path.isdir(source):
+        if manifest_path is None and os.path.exists(os.path.join(source, MANIFEST_NAME)):
+            manifest_path = os.path.join(source, MANIFEST_NAME)
+        if manifest_path:
+            with open(manifest_path, "r", newline="", encoding="utf-8-sig") as f:
+                entries = read_manifest(f)
+        else:
+            entries = _entries_from_names(os.listdir(source))
+
+        def read_photo(entry):
+            with open(os.path.join(source, entry["photo"]), "rb") as f:
+                return f.read()
+        return entries, read_photo, lambda: None
+
+    archive = zipfile.ZipFile(source)
+    members = [m for m in archive.namelist() if not m.endswith("/") and "__MACOSX" not in m]
+    manifests = [m for m in members if os.path.basename(m).lower() == MANIFEST_NAME]
+    if manifests:
+        # photo paths in the manifest are relative to the manifest's folder
+        prefix = os.path.dirname(manifests[0])
+        with archive.open(manifests[0]) as f:
+            entries = read_manifest(io.TextIOWrapper(f, encoding="utf-8-sig", newline=""))
+        for entry in entries:
+            entry["photo"] = f"{prefix}/{entry['photo']}" if prefix else entry["photo"]
+    else:
+        entries = _entries_from_names(members)
+
+    def read_photo(entry):
+        return archive.read(entry["photo"])
+    return entries, read_photo, archive.close
+
+# Why the face at `box` can't serve as a reference photo under `gate`
+# (quality.py), or None when it can.
+def quality_problem(image, box, gate=ENROLL_GATE):
+    reason = gate.check(image, box, face_landmarks)["reason"]
+    return None if reason is None else f"face {REJECT_REASONS[reason]}"
+
+# Runs in a pool worker. Returns (reason, encoding); reason is None when the
+# photo was accepted and saved to `save_path`.
+def encode_photo(data, save_path, resize_max=ENROLL_RESIZE_MAX, gate=ENROLL_GATE):
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert("RGB")
+    except Exception as e:
+        return f"corrupt or unreadable image ({e.__class__.__name__})", None
+    small = img
+    w, h = img.size
+    if max(w, h) > resize_max:
+        scale = resize_max / float(max(w, h))
+        small = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+    arr = np.asarray(small, dtype=np.uint8)
+    locations = face_api().face_locations(arr)
+    if not locations:
+        return "no face detected", None
+    if len(locations) > 1:
+        return f"{len(locations)} faces detected", None
+    problem = quality_problem(arr, locations[0], gate)
+    if problem:
+        return problem, None
+    encoding = face_api().face_encodings(arr, locations)[0]
+    img.save(save_path)
+    return None, np.asarray(encoding, dtype=np.float32)
+
+# Student names double as file and folder names in students_db, so they
+# can't be empty, hidden or contain a path separator.
+def name_problem(name):
+    if not name:
+        return "missing name"
+    if name.startswith(".") or "/" in name or "\\" in name:
+        return "invalid name"
+    return None
+
+def _check_entry(entry):
+    name, photo = entry["name"], entry["photo"]
+    problem = name_problem(name)
+    if problem:
+        return problem
+    if not photo:
+        return "missing photo"
+    if not photo.lower().endswith(PHOTO_EXTENSIONS):
+        return "unsupported file type"
+    return None
+
+# Keeps at most `window` photos in flight so a large batch isn't read into
+# memory all at once. Yields (entry, reason, encoding) in batch order.
+def _encode_all(pool, jobs, window, gate=ENROLL_GATE):
+    pending = deque()
+    for entry, data, save_path in jobs:
+        if pool is None:
+            yield (entry,) + encode_photo(data, save_path, gate=gate)
+            continue
+        pending.append((entry, pool.submit(encode_photo, data, save_path, gate=gate)))
+        if len(pending) >= window:
+            entry, future = pending.popleft()
+            yield (entry,) + future.result()
+    while pending:
+        entry, future = pending.popleft()
+        yield (entry,) + future.result()
+
+# Processes a batch into the staging folder `staging`. Returns
+# (accepted, failures): accepted entries carry "file", "staged" and
+# "encoding"; failures are {"name", "photo", "reason"}.
+def process_batch(entries, read_photo, staging, pool=None, default_section=DEFAULT_SECTION, gate=ENROLL_GATE):
+    os.makedirs(staging, exist_ok=True)
+    failures, seen = [], {}  # name -> first accepted-for-processing entry
+
+    def fail(entry, reason):
+        failures.append({"name": entry["name"], "photo": entry["photo"], "reason": reason})
+
+    def generate_jobs():
+        for entry in entries:
+            reason = _check_entry(entry)
+            if reason is None:
+                try:
+                    data = read_photo(entry)
+                except (KeyError, OSError) as e:
+                    reason = "photo not found in batch" if isinstance(e, (KeyError, FileNotFoundError)) \
+                        else f"cannot read photo ({e})"
+            if reason:
+                fail(entry, reason)
+                continue
+            ext = os.path.splitext(entry["photo"])[1].lower()
+            first = seen.setdefault(entry["name"], entry)
+            entry["extra"] = first is not entry
+            if entry["extra"]:
+                # blank fields on a student's later rows mean "same as before"
+                entry["section"] = entry["section"] or first["section"]
+                entry["parent_phone"] = entry["parent_phone"] or first["parent_phone"]
+                entry["file"] = f"{entry['name']}/{uuid.uuid4().hex[:8]}{ext}"
+            else:
+                entry["section"] = entry["section"] or default_section
+                entry["file"] = entry["name"] + ext
+            entry["staged"] = os.path.join(staging, entry["file"])
+            os.makedirs(os.path.dirname(entry["staged"]), exist_ok=True)
+            yield entry, data, entry["staged"]
+
+    accepted = []
+    window = 4 * (getattr(pool, "_max_workers", 1) or 1)
+    for entry, reason, encoding in _encode_all(pool, generate_jobs(), window, gate):
+        if reason:
+            fail(entry, reason)
+        else:
+            entry["encoding"] = encoding
+            accepted.append(entry)
+    return accepted, failures
+
+# Moves accepted photos into `students_folder` (a main photo replaces the
+# student's main photo in another format; extra photos are added next to
+# the existing ones), then records them in the encoding store and the
+# student table with one write each.
+def commit_batch(accepted, students_folder, store):
+    replaced = []
+    for entry in accepted:
+        if not entry["extra"]:
+            for ext in PHOTO_EXTENSIONS:
+                old = os.path.join(students_folder, entry["name"] + ext)
+                if entry["name"] + ext != entry["file"] and os.path.exists(old):
+                    os.remove(old)
+                    replaced.append(entry["name"] + ext)
+        dest = os.path.join(students_folder, entry["file"])
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(entry["staged"], dest)
+    if replaced:
+        store.remove_many(replaced)
+    store.put_many(students_folder, [(e["file"], e["encoding"]) for e in accepted])
+    storage.upsert_students([(e["name"], e["section"], e["parent_phone"] or None,
+                              None if e["extra"] else e["file"]) for e in accepted])
+
+def staging_folder(students_folder):
+    return os.path.join(students_folder, f".staging-{uuid.uuid4().hex}")
+
+def enroll(source, students_folder, store, pool=None, manifest_path=None, default_section=DEFAULT_SECTION,
+           gate=ENROLL_GATE):
+    start = time.perf_counter()
+    entries, read_photo, close = open_batch(source, manifest_path)
+    staging = staging_folder(students_folder)
+    try:
+        accepted, failures = process_batch(entries, read_photo, staging, pool, default_section, gate)
+        commit_batch(accepted, students_folder, store)
+    finally:
+        close()
+        shutil.rmtree(staging, ignore_errors=True)
+    return accepted, failures, time.perf_counter() - start
+
+# python enrollment.py photos.zip|photos_dir [--manifest m.csv] [--section 7A] [--workers 8]
+# Enrolls straight into students_db and publishes the new students to the
+# shared roster, so a running app matches them from its next request.
+def main():
+    from recognition import make_pool
+
+    parser = argparse.ArgumentParser(description="Bulk student enrollment")
+    parser.add_argument("source", help="ZIP file or folder of photos")
+    parser.add_argument("--manifest", help="CSV of name,photo,parent_phone,section (folder only)")
+    parser.add_argument("--section", default=DEFAULT_SECTION)
+    parser.add_argument("--students", default="students_db")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    storage.init_db()
+    store = EncodingStore("encodings_cache")
+    with make_pool(args.workers) as pool:
+        accepted, failures, seconds = enroll(args.source, args.students, store,
+                                             pool, args.manifest, args.section)
+    if accepted:
+        SharedRoster(store.root).update(
+            sorted({e["name"] for e in accepted}),
+            lambda names=None: roster_students(store, storage.student_sections(), names, DEFAULT_SECTION))
+    for failure in failures:
+        print(f"FAILED {failure['photo'] or failure['name']}: {failure['reason']}")
+    print(f"Enrolled {len(accepted)} student(s), {len(failures)} failure(s) in {seconds:.1f}s.")
+    return 1 if failures and not accepted else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import io, csv, zlib
+
+# -------------------------------
+# Streaming export encoders
+# -------------------------------
+# Both take an iterator of rows and yield byte chunks of roughly `chunk_size`,
+# so an export holds one chunk in memory however long the date range is.
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "csv.gz": ("application/gzip", ".csv.gz"),
+}
+
+def csv_chunks(rows, header, chunk_size=64 * 1024):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+# gzip member (wbits=31) compressed incrementally; chunks the compressor holds
+# back are flushed at the end.
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_chunks(fmt, rows, header):
+    chunks = csv_chunks(rows, header)
+    if fmt == "csv.gz":
+        chunks = gzip_chunks(chunks)
+    return chunks
@@ -0,0 +1,397 @@
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # optional: assign(method="hungarian") falls back to greedy
+    linear_sum_assignment = None
+
+# -------------------------------
+# In-memory gallery of student encodings
+# -------------------------------
+# Encodings live in one contiguous float32 (capacity, 128) matrix with their
+# squared norms precomputed, so matching every detected face is a single
+# (F,128) x (128,N) product. Rows are appended into spare capacity (doubling
+# when full) and removed by tombstoning; the matrix is compacted once more
+# than half of it is dead, which keeps add/remove O(1) amortized.
+#
+# A student may have several rows (one per reference photo). Their rows are
+# kept in one contiguous block (compact() regroups them if an add breaks
+# that), so per-student reductions such as the centroid are a single
+# reduceat over the block starts.
+#
+# An optional IVFIndex (ann_index.py) can be attached for large rosters;
+# match() and assign() then only score the rows in each face's closest
+# k-means cells (students outside them count as out of reach).
+#
+# from_shared() wraps a matrix somebody else owns (the memory-mapped roster
+# segment every worker maps, see shared_roster.py) without copying it; only
+# the per-row flags and names are private. add() / compact() on such a
+# gallery take a private copy first.
+
+# How a face is scored against a student with several reference rows:
+#   min       distance to the student's closest row
+#   centroid  distance to the mean of the student's rows (F x students,
+#             so cost doesn't grow with photos per student)
+#   vote      the student owning most of the face's k nearest rows within
+#             tolerance, ties going to the closer one; in assign() only the
+#             students with the most votes are candidates for the face
+AGGREGATIONS = ("min", "centroid", "vote")
+
+# assign() pairs faces and students one-to-one: "greedy" takes the closest
+# remaining (face, student) pair first; "hungarian" minimises the total
+# distance (needs scipy).
+ASSIGNMENTS = ("greedy", "hungarian")
+
+class Gallery:
+    def __init__(self, dim=128, capacity=64):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._row_names = [None] * capacity
+        self._rows = {}  # name -> list of rows
+        self._size = 0   # rows handed out, alive or dead
+        self._dead = 0
+        self._grouped = True   # every student's rows are contiguous
+        self._blocks = None    # cached (names, owner, starts, centroids, centroid sq norms)
+        self.index = None
+        self.index_min_rows = 0
+        self.shared = False    # _matrix / _sq_norms are read-only views
+
+    @classmethod
+    def from_encodings(cls, names, encodings, dim=128):
+        gallery = cls(dim=dim, capacity=max(64, len(names)))
+        for name, encoding in zip(names, encodings):
+            gallery.add(name, encoding)
+        return gallery
+
+    # row_names[i] owns row i of `matrix` (None: not part of this gallery,
+    # treated as a dead row). Each student's rows must be contiguous.
+    @classmethod
+    def from_shared(cls, matrix, sq_norms, row_names, dim=128):
+        gallery = cls(dim=dim, capacity=0)
+        n = len(row_names)
+        gallery._matrix, gallery._sq_norms = matrix[:n], sq_norms[:n]
+        gallery._alive = np.fromiter((name is not None for name in row_names), dtype=bool, count=n)
+        gallery._row_names = list(row_names)
+        for row, name in enumerate(row_names):
+            if name is not None:
+                rows = gallery._rows.setdefault(name, [])
+                if rows and rows[-1] != row - 1:
+                    gallery._grouped = False
+                rows.append(row)
+        gallery._size = n
+        gallery._dead = n - int(gallery._alive.sum())
+        gallery.shared = True
+        return gallery
+
+    def _unshare(self):
+        if self.shared:
+            self._matrix = np.array(self._matrix)
+            self._sq_norms = np.array(self._sq_norms)
+            self.shared = False
+
+    def __len__(self):
+        return self._size - self._dead
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def student_names(self):
+        return list(self._rows)
+
+    def _grow(self):
+        capacity = max(64, self._matrix.shape[0] * 2)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._matrix, self._sq_norms, self._alive = matrix, sq_norms, alive
+        self.shared = False
+        self._row_names.extend([None] * (capacity - len(self._row_names)))
+
+    def add(self, name, encoding):
+        if self._size == self._matrix.shape[0]:
+            self._grow()
+        self._unshare()
+        row = self._size
+        encoding = np.asarray(encoding, dtype=np.float32)
+        self._matrix[row] = encoding
+        self._sq_norms[row] = np.dot(encoding, encoding)
+        self._alive[row] = True
+        self._row_names[row] = name
+        rows = self._rows.setdefault(name, [])
+        if rows and rows[-1] != row - 1:
+            self._grouped = False
+        rows.append(row)
+        self._size += 1
+        self._blocks = None
+        if self.index is not None:
+            if self._size > 2 * self.index.trained_size:
+                self._reindex(retrain=True)
+            else:
+                self.index.add(row, encoding)
+
+    def remove(self, name):
+        rows = self._rows.pop(name, [])
+        for row in rows:
+            self._alive[row] = False
+            self._row_names[row] = None
+        self._dead += len(rows)
+        self._blocks = None
+        if self._dead > 32 and self._dead * 2 > self._size:
+            self.compact()
+        return len(rows) > 0
+
+    # Drop dead rows and regroup each student's rows into one block.
+    def compact(self):
+        keep = np.asarray([row for rows in self._rows.values() for row in rows], dtype=np.int64)
+        n = len(keep)
+        self._unshare()
+        self._matrix[:n] = self._matrix[keep]
+        self._sq_norms[:n] = self._sq_norms[keep]
+        self._alive[:n] = True
+        self._alive[n:] = False
+        self._row_names = [self._row_names[i] for i in keep] + [None] * (len(self._row_names) - n)
+        self._rows = {}
+        for row in range(n):
+            self._rows.setdefault(self._row_names[row], []).append(row)
+        self._size, self._dead = n, 0
+        self._grouped = True
+        self._blocks = None
+        if self.index is not None:
+            self._reindex()
+
+    # Use `index` for match() once the gallery has at least `min_rows` rows.
+    # Returns True when the index had to be (re)trained, so the caller can
+    # persist it.
+    def attach_index(self, index, min_rows=0):
+        self.index = index
+        self.index_min_rows = min_rows
+        retrain = not index.is_trained or self._size > 2 * index.trained_size
+        self._reindex(retrain=retrain)
+        return retrain
+
+    def _reindex(self, retrain=False):
+        alive = self._matrix[:self._size][self._alive[:self._size]]
+        if retrain:
+            if len(alive) == 0:
+                return
+            self.index.train(alive)
+        self.index.assign(self._matrix[:self._size])
+
+    # (F, N) euclidean distances between faces and gallery rows, inf for
+    # removed rows. Same metric as face_recognition.face_distance.
+    def distances(self, face_encodings):
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.dim)
+        matrix = self._matrix[:self._size]
+        sq = (faces * faces).sum(axis=1)[:, None] + self._sq_norms[:self._size][None, :]
+        sq -= 2.0 * (faces @ matrix.T)
+        np.maximum(sq, 0.0, out=sq)
+        dist = np.sqrt(sq)
+        dist[:, ~self._alive[:self._size]] = np.inf
+        return dist
+
+    # Per-student view of the rows, students in row order: names, the owning
+    # student of every row (-1 for dead rows), each block's first row and the
+    # per-student centroids. Rebuilt only after the gallery changes.
+    def _student_blocks(self):
+        if self._blocks is None:
+            if not self._grouped:
+                self.compact()
+            names = sorted(self._rows, key=lambda name: self._rows[name][0])
+            counts = np.asarray([len(self._rows[name]) for name in names], dtype=np.int64)
+            starts = np.asarray([self._rows[name][0] for name in names], dtype=np.int64)
+            owner = np.full(self._size, -1, dtype=np.int64)
+            centroids = np.zeros((len(names), self.dim), dtype=np.float32)
+            for i, (start, count) in enumerate(zip(starts, counts)):
+                owner[start:start + count] = i
+                centroids[i] = self._matrix[start:start + count].mean(axis=0)
+            self._blocks = (names, owner, starts, centroids, (centroids * centroids).sum(axis=1))
+        return self._blocks
+
+    def _index_ready(self):
+        return self.index is not None and self.index.is_trained and len(self) >= self.index_min_rows
+
+    # (rows, (F, len(rows)) distances) over the rows in some face's probed
+    # index cells, inf where a face didn't probe that row's cell. Rows come
+    # back in increasing order.
+    def _candidate_distances(self, faces):
+        found = self.index.candidates(faces, self._matrix, self._sq_norms, self._alive)
+        rows = np.unique(np.concatenate([r for r, _ in found])) if found else np.zeros(0, dtype=np.int64)
+        dist = np.full((len(faces), len(rows)), np.inf, dtype=np.float32)
+        for f, (r, sq) in enumerate(found):
+            dist[f, np.searchsorted(rows, r)] = np.sqrt(sq)
+        return rows, dist
+
+    # Keeps, per face, only the rows of the students with the most votes
+    # among its k nearest rows within tolerance.
+    def _vote_winners(self, dist, who, tolerance, k):
+        k = max(1, min(k, dist.shape[1]))
+        nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        d = np.take_along_axis(dist, nearest, axis=1)
+        voters = np.where(d <= tolerance, who[nearest], -1)
+        kept = np.full_like(dist, np.inf)
+        for f in range(len(dist)):
+            students, votes = np.unique(voters[f][voters[f] >= 0], return_counts=True)
+            if len(students):
+                mask = np.isin(who, students[votes == votes.max()])
+                kept[f, mask] = dist[f, mask]
+        return kept
+
+    # (names, (F, students) distances) under `aggregate`, for the students
+    # within reach (everyone without an index). Blocks are contiguous and
+    # only dead rows lie between them, so the per-student minimum is one
+    # reduceat over the block starts. "centroid" always scans every
+    # centroid; the index only covers rows.
+    def student_distances(self, face_encodings, aggregate="min", tolerance=0.6, k=3):
+        names, owner, starts, centroids, centroid_sq = self._student_blocks()
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.dim)
+        if not names:
+            return names, np.zeros((len(faces), 0), dtype=np.float32)
+        if aggregate == "centroid":
+            sq = (faces * faces).sum(axis=1)[:, None] + centroid_sq[None, :] - 2.0 * (faces @ centroids.T)
+            np.maximum(sq, 0.0, out=sq)
+            return names, np.sqrt(sq)
+        if not self._index_ready():
+            dist = self.distances(faces)
+            if aggregate == "vote":
+                dist = self._vote_winners(dist, owner, tolerance, k)
+            return names, np.minimum.reduceat(dist, starts, axis=1)
+        rows, dist = self._candidate_distances(faces)
+        who = owner[rows]
+        live = who >= 0
+        dist, who = dist[:, live], who[live]
+        if len(who) == 0:
+            return [], np.zeros((len(faces), 0), dtype=np.float32)
+        if aggregate == "vote":
+            dist = self._vote_winners(dist, who, tolerance, k)
+        students = np.unique(who)
+        per_student = np.minimum.reduceat(dist, np.searchsorted(who, students), axis=1)
+        return [names[s] for s in students], per_student
+
+    # Best gallery match for every face: list of (name or None, distance).
+    # See AGGREGATIONS for `aggregate`; `k` is the number of nearest rows
+    # that vote.
+    def match(self, face_encodings, tolerance=0.6, aggregate="min", k=3):
+        if aggregate not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {aggregate}")
+        if len(face_encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [(None, float("inf"))] * len(face_encodings)
+        if aggregate == "centroid":
+            return self._match_centroid(face_encodings, tolerance)
+        if aggregate == "vote":
+            return self._match_vote(face_encodings, tolerance, k)
+        if self._index_ready():
+            best, best_dist = self._search_index(face_encodings)
+        else:
+            dist = self.distances(face_encodings)
+            best = dist.argmin(axis=1)
+            best_dist = dist[np.arange(len(best)), best]
+        return [(self._row_names[row] if d <= tolerance else None, float(d))
+                for row, d in zip(best, best_dist)]
+
+    def _match_centroid(self, face_encodings, tolerance):
+        names, _, _, centroids, centroid_sq = self._student_blocks()
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.dim)
+        sq = (faces * faces).sum(axis=1)[:, None] + centroid_sq[None, :] - 2.0 * (faces @ centroids.T)
+        np.maximum(sq, 0.0, out=sq)
+        best = sq.argmin(axis=1)
+        best_dist = np.sqrt(sq[np.arange(len(best)), best])
+        return [(names[i] if d <= tolerance else None, float(d)) for i, d in zip(best, best_dist)]
+
+    def _match_vote(self, face_encodings, tolerance, k):
+        names, owner, _, _, _ = self._student_blocks()
+        dist = self.distances(face_encodings)
+        k = max(1, min(k, len(self)))
+        nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        d = np.take_along_axis(dist, nearest, axis=1)
+        who = owner[nearest]
+        within = d <= tolerance
+        # votes[f, j]: rows among face f's k nearest (within tolerance) that
+        # belong to the same student as candidate j; ties go to the closer row
+        votes = ((who[:, :, None] == who[:, None, :]) & within[:, None, :]).sum(axis=2)
+        score = np.where(within, votes - d / (tolerance + 1.0), -np.inf)
+        pick = score.argmax(axis=1)
+        faces = np.arange(len(d))
+        best_dist = d[faces, pick]
+        return [(names[who[f, pick[f]]] if within[f, pick[f]] else None,
+                 float(best_dist[f] if within[f, pick[f]] else d[f].min())) for f in faces]
+
+    def _search_index(self, face_encodings):
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.dim)
+        best, best_sq = self.index.search(faces, self._matrix, self._sq_norms, self._alive)
+        return best, np.sqrt(best_sq)
+
+    # One-to-one matching: every student is given to at most one face. Returns
+    # one report per face: {"name", "distance", "confidence", "margin",
+    # "status"}; status is "matched", "no_match" (nobody within tolerance) or
+    # "conflict" (its candidates went to closer faces). confidence is
+    # 1 - distance / tolerance, margin the gap to the next-closest student.
+    # `k` is the number of nearest rows that vote (aggregate="vote").
+    def assign(self, face_encodings, tolerance=0.6, aggregate="min", method="greedy", k=3):
+        if method not in ASSIGNMENTS:
+            raise ValueError(f"Unknown assignment method: {method}")
+        if aggregate not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {aggregate}")
+        names, dist = self.student_distances(face_encodings, aggregate, tolerance, k)
+        n_faces, n_students = dist.shape
+        if n_faces == 0:
+            return []
+        if n_students == 0:
+            return [_face_report(None, None, None, tolerance, "no_match") for _ in range(n_faces)]
+
+        cand_faces, cand_students = np.nonzero(dist <= tolerance)
+        assigned = {}
+        if method == "hungarian" and linear_sum_assignment is not None and len(cand_faces):
+            rows, cols = np.unique(cand_faces), np.unique(cand_students)
+            sub = dist[np.ix_(rows, cols)]
+            cost = np.where(sub <= tolerance, sub, tolerance * 10 + 1.0)
+            r, c = linear_sum_assignment(cost)
+            for i, j in zip(r, c):
+                if sub[i, j] <= tolerance:
+                    assigned[rows[i]] = cols[j]
+        else:
+            taken = set()
+            for j in np.argsort(dist[cand_faces, cand_students], kind="stable"):
+                f, s = cand_faces[j], cand_students[j]
+                if f in assigned or s in taken:
+                    continue
+                assigned[f] = s
+                taken.add(s)
+                if len(assigned) == n_faces or len(taken) == n_students:
+                    break
+
+        # two closest students per face, for the margin
+        if n_students > 1:
+            two = np.argpartition(dist, 1, axis=1)[:, :2]
+        else:
+            two = np.zeros((n_faces, 1), dtype=np.int64)
+        reports = []
+        for f in range(n_faces):
+            close = sorted(two[f], key=lambda s: dist[f, s])
+            if f in assigned:
+                s = assigned[f]
+                others = [dist[f, o] for o in close if o != s]
+                runner_up = min(others) if others else None
+                reports.append(_face_report(names[s], dist[f, s], runner_up, tolerance, "matched"))
+            else:
+                nearest = dist[f, close[0]]
+                status = "conflict" if nearest <= tolerance else "no_match"
+                runner_up = dist[f, close[1]] if len(close) > 1 else None
+                reports.append(_face_report(None, nearest, runner_up, tolerance, status))
+        return reports
+
+
+def _face_report(name, distance, runner_up, tolerance, status):
+    confidence = margin = None
+    if distance is not None and name is not None:
+        confidence = round(max(0.0, 1.0 - float(distance) / tolerance), 4)
+    if distance is not None and runner_up is not None:
+        margin = round(float(runner_up) - float(distance), 4)
+    return {"name": name, "distance": None if distance is None else round(float(distance), 4),
+            "confidence": confidence, "margin": margin, "status": status}
@@ -0,0 +1,148 @@
+import os, json, sqlite3, threading, time, uuid, traceback
+from contextlib import closing
+
+# -------------------------------
+# SQLite-backed background job queue
+# -------------------------------
+# Jobs are rows in a `jobs` table, so any web worker can enqueue one and any
+# web worker can answer a status poll for it. Each process runs a few
+# dispatcher threads that claim queued rows and call `handler(params)`; the
+# handler's return value (JSON-serialisable) becomes the job result.
+#
+# A claimed job is leased for LEASE seconds and a heartbeat thread renews
+# the lease of every job this process is running. If the process dies the
+# lease runs out and any dispatcher claims the job again, up to
+# MAX_ATTEMPTS runs; after that it is marked failed.
+class JobQueue:
+    LEASE = 60
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, db_path, handler, threads=2, poll_interval=1.0):
+        self.db_path = db_path
+        self.handler = handler
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._running = set()  # ids of the jobs this process is running
+        self._running_lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created)")
+            # jobs.db files from before leases
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "lease_until" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+            if "attempts" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.threads):
+                threading.Thread(target=self._loop, name=f"job-dispatcher-{i}", daemon=True).start()
+            threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+    def submit(self, params):
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT INTO jobs (id, status, params, created) VALUES (?, 'queued', ?, ?)",
+                         (job_id, json.dumps(params), time.time()))
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT id, status, params, result, error, created, started, finished "
+                               "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "status", "params", "result", "error", "created", "started", "finished")
+        job = dict(zip(keys, row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # Queued jobs, or running ones whose lease ran out (rows from before
+    # leases count from their start). Jobs out of attempts are failed here.
+    def _claim(self):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = conn.execute("SELECT id, params, attempts FROM jobs WHERE status = 'queued' "
+                                   "OR (status = 'running' AND COALESCE(lease_until, started + ?) < ?) "
+                                   "ORDER BY created LIMIT 1", (self.LEASE, now)).fetchone()
+                if row is None or row[2] < self.MAX_ATTEMPTS:
+                    break
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                             (f"The worker running this job stopped ({row[2]} attempts).", now, row[0]))
+            if row is not None:
+                if row[2]:
+                    print(f"Job {row[0]} reclaimed after its worker stopped (attempt {row[2] + 1}).")
+                conn.execute("UPDATE jobs SET status = 'running', started = ?, lease_until = ?, "
+                             "attempts = attempts + 1 WHERE id = ?", (now, now + self.LEASE, row[0]))
+            conn.execute("COMMIT")
+            return row
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.LEASE / 3.0)
+            with self._running_lock:
+                running = list(self._running)
+            if not running:
+                continue
+            try:
+                with closing(self._connect()) as conn, conn:
+                    conn.executemany("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                                     [(time.time() + self.LEASE, job_id) for job_id in running])
+            except sqlite3.OperationalError as e:
+                print(f"Job lease renewal failed: {e}")
+
+    def _finish(self, job_id, result=None, error=None):
+        status = "failed" if error is not None else "done"
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                         (status, json.dumps(result) if result is not None else None, error,
+                          time.time(), job_id))
+
+    def _loop(self):
+        while True:
+            try:
+                row = self._claim()
+            except sqlite3.OperationalError as e:
+                print(f"Job queue busy: {e}")
+                row = None
+            if row is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            job_id, params = row[0], json.loads(row[1])
+            with self._running_lock:
+                self._running.add(job_id)
+            try:
+                self._finish(job_id, result=self.handler(params))
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job_id, error=str(e))
+            finally:
+                with self._running_lock:
+                    self._running.discard(job_id)
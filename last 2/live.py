@@ -0,0 +1,176 @@
+import time, uuid, threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+
+import metrics
+from recognition import decode_image, detect_frame
+from video import PresenceTally, MIN_EVIDENCE
+
+# -------------------------------
+# Live attendance sessions
+# -------------------------------
+# The page posts webcam frames one by one; each session runs a pipeline
+#   decode (session thread) -> detect + encode (recognition pool) -> match
+# with two bounds: at most `queue_size` frames waiting to be decoded and at
+# most `in_flight` frames on the pool. When the pool can't keep up the
+# queue fills and the oldest waiting frame is dropped, so a slow server
+# falls behind by a few frames instead of queueing without limit. Presence
+# accumulates across frames exactly like video uploads (PresenceTally), and
+# every change bumps `version` so the page can be pushed the new state.
+LIVE_QUEUE_SIZE = 4
+LIVE_RESIZE_MAX = 960
+STAGES = ("queue", "decode", "detect", "encode", "match", "total")
+
+def decode_frame(data, resize_max=LIVE_RESIZE_MAX):
+    return decode_image(data, resize_max)
+
+# Last `window` latencies of each stage, summarised as mean / p95 in ms.
+# Also recorded as live_<stage> in the stage_seconds metric.
+class StageTimes:
+    def __init__(self, window=200):
+        self.samples = {stage: deque(maxlen=window) for stage in STAGES}
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+        metrics.STAGE_SECONDS.observe(seconds, stage="live_" + stage)
+
+    def summary(self):
+        out = {}
+        for stage, values in self.samples.items():
+            if values:
+                ms = np.fromiter(values, dtype=np.float64) * 1000.0
+                out[stage] = {"mean_ms": round(float(ms.mean()), 1),
+                              "p95_ms": round(float(np.percentile(ms, 95)), 1), "n": len(ms)}
+        return out
+
+class LiveSession:
+    def __init__(self, roster, section="", pool=None, queue_size=LIVE_QUEUE_SIZE, in_flight=None,
+                 tolerance=0.6, aggregate="min", method="greedy", min_evidence=MIN_EVIDENCE,
+                 resize_max=LIVE_RESIZE_MAX, k=3):
+        self.id = uuid.uuid4().hex
+        self.section = section
+        self.roster = roster
+        self.pool = pool
+        self.in_flight = in_flight or (getattr(pool, "_max_workers", 1) or 1)
+        self.match_args = (tolerance, aggregate, method, k)
+        self.resize_max = resize_max
+        self.tally = PresenceTally(min_evidence)
+        self.timings = StageTimes()
+        self.counts = {"received": 0, "dropped": 0, "unreadable": 0, "processed": 0, "faces": 0}
+        self.version = 0
+        self.running = True
+        self.started = self.last_active = time.time()
+        self._frames = deque(maxlen=queue_size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)    # frame arrived / result ready / stop
+        self._updated = threading.Condition(self._lock)   # state changed
+        self._thread = threading.Thread(target=self._run, name=f"live-{self.id[:8]}", daemon=True)
+        self._thread.start()
+
+    # Never blocks: a full queue drops its oldest frame. Returns False once
+    # the session has been stopped.
+    def push(self, data):
+        with self._lock:
+            if not self.running:
+                return False
+            self.last_active = time.time()
+            self.counts["received"] += 1
+            if len(self._frames) == self._frames.maxlen:
+                self.counts["dropped"] += 1
+            self._frames.append((time.perf_counter(), data))
+            self._wakeup.notify()
+        return True
+
+    def stop(self, timeout=30):
+        with self._lock:
+            self.running = False
+            self.counts["dropped"] += len(self._frames)
+            self._frames.clear()
+            self._wakeup.notify()
+        self._thread.join(timeout)
+        with self._lock:
+            self.version += 1
+            self._updated.notify_all()
+
+    def _notify_done(self, future):
+        with self._lock:
+            self._wakeup.notify()
+
+    def _submit(self, image):
+        if self.pool is None:
+            future = Future()
+            future.set_result(detect_frame(image))
+        else:
+            future = self.pool.submit(detect_frame, image)
+        future.add_done_callback(self._notify_done)
+        return future
+
+    def _run(self):
+        in_flight = deque()
+        while True:
+            with self._lock:
+                while not (in_flight and in_flight[0][1].done()):
+                    if self.running and self._frames and len(in_flight) < self.in_flight:
+                        break
+                    if not self.running and not in_flight:
+                        return
+                    self._wakeup.wait()
+                item = None
+                if not (in_flight and in_flight[0][1].done()):
+                    item = self._frames.popleft()
+
+            if item is not None:
+                received, data = item
+                start = time.perf_counter()
+                self.timings.add("queue", start - received)
+                try:
+                    image = decode_frame(data, self.resize_max)
+                except Exception:
+                    with self._lock:
+                        self.counts["unreadable"] += 1
+                    continue
+                self.timings.add("decode", time.perf_counter() - start)
+                in_flight.append((received, self._submit(image)))
+                continue
+
+            received, future = in_flight.popleft()
+            try:
+                locations, encodings, (detect_s, encode_s) = future.result()
+            except Exception as e:
+                print(f"Live session {self.id[:8]}: frame failed: {e}")
+                continue
+            self.timings.add("detect", detect_s)
+            self.timings.add("encode", encode_s)
+            start = time.perf_counter()
+            reports = self.roster.assign(encodings, *self.match_args) if encodings else []
+            with self._lock:
+                self.tally.update(reports)
+                self.counts["processed"] += 1
+                self.counts["faces"] += len(locations)
+                self.version += 1
+                self._updated.notify_all()
+            now = time.perf_counter()
+            self.timings.add("match", now - start)
+            self.timings.add("total", now - received)
+
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        return {"id": self.id, "section": self.section, "running": self.running, "version": self.version,
+                "present": {name: self.tally.seen[name]["confidence"] for name in sorted(self.tally.present)},
+                "counts": dict(self.counts), "stages": self.timings.summary(),
+                "seconds": round(time.time() - self.started, 1)}
+
+    # Blocks until the state moves past `version` (or `timeout` passes).
+    def wait_for_update(self, version, timeout=15.0):
+        with self._lock:
+            self._updated.wait_for(lambda: self.version != version, timeout)
+            return self._state()
+
+    def attendance(self):
+        with self._lock:
+            return {student: "Present" if student in self.tally.present else "Absent"
+                    for student in self.roster.student_names()}
@@ -0,0 +1,186 @@
+import os, time, uuid, bisect, threading, cProfile
+from contextlib import contextmanager
+
+# -------------------------------
+# Metrics
+# -------------------------------
+# Counters and histograms kept in process memory and rendered in the
+# Prometheus text format at /metrics. Every web / job process keeps its own,
+# so scrape each worker (or sum them in the query) when running several.
+#
+# span("detect") times one stage of the pipeline into the stage_seconds
+# histogram; inside trace() the stage times of the current thread are also
+# collected into a dict, which is how a job reports where its time went.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROFILE_DIR = "profiles"
+
+_lock = threading.Lock()
+_registry = {}  # name -> metric, in registration order
+_local = threading.local()
+
+def _key(metric, labels):
+    return tuple(str(labels.get(label, "")) for label in metric.labels)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _key(self, labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with _lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_label_text(self.labels, key)} {_number(value)}" for key, value in items]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # key -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = _key(self, labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[i] += 1
+            counts[-1] += value
+
+    def render(self):
+        with _lock:
+            items = sorted((key, list(counts)) for key, counts in self.values.items())
+        lines = []
+        for key, counts in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                le = _label_text(self.labels, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {total}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {total}")
+        return lines
+
+# Read when /metrics is scraped, e.g. the length of a queue.
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.labels = name, help, ()
+        self.read = read
+
+    def render(self):
+        try:
+            return [f"{self.name} {_number(self.read())}"]
+        except Exception as e:
+            print(f"Metric {self.name} unavailable: {e}")
+            return []
+
+def _register(metric):
+    with _lock:
+        return _registry.setdefault(metric.name, metric)
+
+def counter(name, help, labels=()):
+    return _register(Counter(name, help, labels))
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, help, labels, buckets))
+
+def gauge(name, help, read):
+    return _register(Gauge(name, help, read))
+
+def render():
+    with _lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# -------------------------------
+# Stage spans
+# -------------------------------
+STAGE_SECONDS = histogram("stage_seconds", "Time spent in each stage of the recognition pipeline", ("stage",))
+
+def record(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = getattr(_local, "trace", None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+# Collects {stage: seconds} of every span in this thread until it exits.
+@contextmanager
+def trace():
+    outer = getattr(_local, "trace", None)
+    _local.trace = timings = {}
+    try:
+        yield timings
+    finally:
+        _local.trace = outer
+        if outer is not None:
+            for stage, seconds in timings.items():
+                outer[stage] = outer.get(stage, 0.0) + seconds
+
+# -------------------------------
+# Profiling
+# -------------------------------
+# cProfile of the calling thread, dumped to profiles/<label>-<time>.prof for
+# snakeviz / flameprof (`flameprof x.prof > x.svg`). Work done in pool
+# processes shows up as time waiting on futures. Yields a dict that gets the
+# dump's "path"; only one profile can run at a time per process, a second
+# one is skipped.
+_profiling = threading.Lock()
+
+@contextmanager
+def profiled(label, enabled=True):
+    info = {}
+    if not enabled or not _profiling.acquire(blocking=False):
+        yield info
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield info
+        finally:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)
+            info["path"] = os.path.join(PROFILE_DIR, f"{safe}-{time.strftime('%Y%m%d-%H%M%S')}-"
+                                                     f"{uuid.uuid4().hex[:6]}.prof")
+            profiler.dump_stats(info["path"])
+    finally:
+        _profiling.release()
@@ -0,0 +1,225 @@
+import os, sqlite3, threading, time, random, traceback
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+# -------------------------------
+# Outbound SMS queue
+# -------------------------------
+# Request handlers only enqueue(); a background dispatcher sends from the
+# persistent `sms_outbox` table with `concurrency` parallel sends, capped at
+# `rate_per_sec`, retrying failures with exponential backoff. The table is
+# UNIQUE on (student, date), so a parent is texted at most once per day no
+# matter how many times attendance is saved.
+
+OUTBOX_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS sms_outbox (
+        id INTEGER PRIMARY KEY,
+        student TEXT NOT NULL,
+        date TEXT NOT NULL,
+        to_number TEXT NOT NULL,
+        body TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        last_error TEXT,
+        created REAL NOT NULL,
+        sent_at REAL,
+        UNIQUE (student, date))""",
+    "CREATE INDEX IF NOT EXISTS idx_sms_outbox_due ON sms_outbox (status, next_attempt)",
+    "CREATE INDEX IF NOT EXISTS idx_sms_outbox_date ON sms_outbox (date)",
+]
+
+# result: queued, sent, retried (will be tried again) or failed (gave up)
+SMS_MESSAGES = metrics.counter("sms_messages_total", "Absence texts by outcome", ("result",))
+SMS_SEND_SECONDS = metrics.histogram("sms_send_seconds", "Latency of one SMS provider call")
+
+class RateLimiter:
+    def __init__(self, rate_per_sec, burst=1):
+        self.rate = float(rate_per_sec)
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Stand-in for twilio.rest.Client: records messages instead of sending them.
+# Used for local development and the SMS benchmark.
+class FakeSmsClient:
+    class _Messages:
+        def __init__(self, outer):
+            self.outer = outer
+
+        def create(self, body, from_, to):
+            if self.outer.latency:
+                time.sleep(self.outer.latency)
+            if random.random() < self.outer.failure_rate:
+                raise RuntimeError("simulated SMS failure")
+            with self.outer.lock:
+                self.outer.sent.append((to, body))
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent = []
+        self.lock = threading.Lock()
+        self.messages = self._Messages(self)
+
+
+class SmsDispatcher:
+    def __init__(self, db_path, client, from_number, rate_per_sec=5.0, concurrency=4,
+                 max_attempts=5, backoff_base=2.0, poll_interval=0.5, verbose=True):
+        self.db_path = db_path
+        self.client = client
+        self.from_number = from_number
+        self.limiter = RateLimiter(rate_per_sec, burst=concurrency)
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._slots = threading.Semaphore(concurrency)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in OUTBOX_SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    # Returns True if the message was queued, False if this student was
+    # already notified (or queued) for this date.
+    def enqueue(self, student, date, to_number, body):
+        return self.enqueue_many([(student, date, to_number, body)])[0]
+
+    # Queue a batch of (student, date, to_number, body) in one transaction.
+    def enqueue_many(self, messages):
+        now = time.time()
+        queued = []
+        with closing(self._connect()) as conn, conn:
+            for student, date, to_number, body in messages:
+                cur = conn.execute("INSERT OR IGNORE INTO sms_outbox "
+                                   "(student, date, to_number, body, next_attempt, created) "
+                                   "VALUES (?, ?, ?, ?, ?, ?)",
+                                   (student, date, to_number, body, now, now))
+                queued.append(cur.rowcount == 1)
+        SMS_MESSAGES.inc(sum(queued), result="queued")
+        if any(queued):
+            self.start()
+            self._wakeup.set()
+        return queued
+
+    def students_for_date(self, date, statuses=("queued", "sending", "sent")):
+        marks = ",".join("?" * len(statuses))
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT student FROM sms_outbox WHERE date = ? AND status IN ({marks}) "
+                                "ORDER BY id", (date, *statuses)).fetchall()
+        return [row[0] for row in rows]
+
+    def pending_count(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM sms_outbox "
+                                "WHERE status IN ('queued', 'sending')").fetchone()[0]
+
+    # Starts the send loop once there is a client to send with; until then
+    # messages just wait in the outbox. Safe to call from any thread.
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None or self.client is None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="sms-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    # Claimed rows are leased for SEND_LEASE seconds; if the process dies
+    # mid-send the lease runs out and another dispatcher picks them up.
+    SEND_LEASE = 300
+
+    def _claim(self, limit):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT id, to_number, body, attempts FROM sms_outbox "
+                                "WHERE status IN ('queued', 'sending') AND next_attempt <= ? "
+                                "ORDER BY next_attempt LIMIT ?", (now, limit)).fetchall()
+            if rows:
+                conn.executemany("UPDATE sms_outbox SET status = 'sending', next_attempt = ? WHERE id = ?",
+                                 [(now + self.SEND_LEASE, row[0]) for row in rows])
+            conn.execute("COMMIT")
+            return rows
+
+    def _send(self, row):
+        msg_id, to_number, body, attempts = row
+        start = time.perf_counter()
+        try:
+            self.client.messages.create(body=body, from_=self.from_number, to=to_number)
+        except Exception as e:
+            SMS_SEND_SECONDS.observe(time.perf_counter() - start)
+            attempts += 1
+            if attempts >= self.max_attempts:
+                status, next_attempt = "failed", time.time()
+                print(f"Failed to send SMS to {to_number} after {attempts} attempts: {e}")
+            else:
+                status = "queued"
+                delay = self.backoff_base ** attempts
+                next_attempt = time.time() + delay * random.uniform(0.8, 1.2)
+            SMS_MESSAGES.inc(result="failed" if status == "failed" else "retried")
+            with closing(self._connect()) as conn, conn:
+                conn.execute("UPDATE sms_outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? "
+                             "WHERE id = ?", (status, attempts, next_attempt, str(e), msg_id))
+            return False
+        finally:
+            self._slots.release()
+        SMS_SEND_SECONDS.observe(time.perf_counter() - start)
+        SMS_MESSAGES.inc(result="sent")
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE sms_outbox SET status = 'sent', attempts = ?, sent_at = ? WHERE id = ?",
+                         (attempts + 1, time.time(), msg_id))
+        if self.verbose:
+            print(f"SMS sent to {to_number}")
+        return True
+
+    def _loop(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sms-send") as pool:
+            while not self._stop.is_set():
+                try:
+                    rows = self._claim(self.concurrency * 2)
+                except sqlite3.OperationalError as e:
+                    print(f"SMS queue busy: {e}")
+                    rows = []
+                if not rows:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                for row in rows:
+                    self._slots.acquire()
+                    self.limiter.acquire()
+                    pool.submit(self._send_safely, row)
+
+    def _send_safely(self, row):
+        try:
+            self._send(row)
+        except Exception:
+            traceback.print_exc()
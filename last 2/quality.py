@@ -0,0 +1,86 @@
+import numpy as np
+from PIL import Image
+
+# -------------------------------
+# Face quality gate
+# -------------------------------
+# Encoding a face (a ResNet pass per face) costs far more than finding it,
+# yet tiny, blurred or turned-away faces never come within tolerance of a
+# reference photo. The gate looks at each detected box first, cheapest
+# check first, and only faces that pass are encoded:
+#   size       shorter side of the box, in pixels
+#   sharpness  variance of the Laplacian of the face, scaled to
+#              SHARPNESS_SIZE px so faces of any size compare alike
+#   yaw        0 for a frontal face, 1 once the nose lines up with an eye,
+#              from the 5-point landmarks (the encoder's own alignment
+#              model, so cheap next to the encoding)
+# Group photos use a lenient gate; enrollment uses a strict one so a poor
+# reference photo is turned away before it makes every match worse.
+MIN_FACE_SIZE = 24
+MIN_SHARPNESS = 10.0
+MAX_YAW = 0.6
+ENROLL_MIN_FACE_SIZE = 80
+ENROLL_MIN_SHARPNESS = 25.0
+ENROLL_MAX_YAW = 0.35
+SHARPNESS_SIZE = 96
+
+REJECT_REASONS = {"small": "too small", "blurry": "too blurry", "pose": "turned away"}
+
+def face_size(box):
+    top, right, bottom, left = box
+    return min(bottom - top, right - left)
+
+def sharpness(image, box):
+    top, right, bottom, left = box
+    h, w = image.shape[:2]
+    crop = image[max(top, 0):min(bottom, h), max(left, 0):min(right, w)]
+    if crop.size == 0:
+        return 0.0
+    face = Image.fromarray(np.ascontiguousarray(crop)).convert("L")
+    gray = np.asarray(face.resize((SHARPNESS_SIZE, SHARPNESS_SIZE), Image.BILINEAR), dtype=np.float32)
+    lap = gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4.0 * gray[1:-1, 1:-1]
+    return float(lap.var())
+
+# How far the nose sits from the midpoint between the eyes, relative to
+# half the eye distance. None when the landmarks aren't available.
+def yaw(landmarks):
+    try:
+        eyes = sorted(float(np.mean([p[0] for p in landmarks[key]])) for key in ("left_eye", "right_eye"))
+        nose = float(landmarks["nose_tip"][0][0])
+    except (KeyError, IndexError, TypeError):
+        return None
+    span = eyes[1] - eyes[0]
+    if span < 1.0:
+        return 1.0
+    return min(abs((nose - eyes[0]) / span - 0.5) * 2.0, 1.0)
+
+class QualityGate:
+    def __init__(self, min_size=MIN_FACE_SIZE, min_sharpness=MIN_SHARPNESS, max_yaw=MAX_YAW):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+
+    # {"size", "sharpness", "yaw", "reason"} for one box; reason is None
+    # ("small" / "blurry" / "pose" otherwise) when the face is worth
+    # encoding. landmarks_fn(image, box) is only called for faces that
+    # passed the cheaper checks; a threshold of None skips its check.
+    def check(self, image, box, landmarks_fn=None):
+        report = {"size": int(face_size(box)), "sharpness": None, "yaw": None, "reason": None}
+        if report["size"] < self.min_size:
+            report["reason"] = "small"
+            return report
+        if self.min_sharpness is not None:
+            report["sharpness"] = round(sharpness(image, box), 1)
+            if report["sharpness"] < self.min_sharpness:
+                report["reason"] = "blurry"
+                return report
+        if self.max_yaw is not None and landmarks_fn is not None:
+            angle = yaw(landmarks_fn(image, box))
+            report["yaw"] = None if angle is None else round(angle, 2)
+            if angle is not None and angle > self.max_yaw:
+                report["reason"] = "pose"
+        return report
+
+UPLOAD_GATE = QualityGate()
+ENROLL_GATE = QualityGate(ENROLL_MIN_FACE_SIZE, ENROLL_MIN_SHARPNESS, ENROLL_MAX_YAW)
+NO_GATE = QualityGate(0, None, None)
@@ -0,0 +1,302 @@
+import os, io, time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from PIL import Image
+
+import metrics
+
+# Kept free of app side effects so worker processes can import it cheaply.
+
+# -------------------------------
+# Models
+# -------------------------------
+# Importing face_recognition loads the dlib detector / encoder models, which
+# takes a second or two and ~100 MB per process, so it happens on first use
+# instead of at import. warm_models() does it ahead of time (the app's
+# warm-up thread runs it in the pool workers too).
+_face_recognition = None
+
+def face_api():
+    global _face_recognition
+    if _face_recognition is None:
+        import face_recognition
+        _face_recognition = face_recognition
+    return _face_recognition
+
+def warm_models(_=None):
+    face_api()
+    return os.getpid()
+
+# -------------------------------
+# Image decoding
+# -------------------------------
+# Decodes a path, bytes or file object straight to an RGB uint8 array no
+# larger than `resize_max`. When the target is smaller, JPEGs are decoded
+# at 1/2, 1/4 or 1/8 scale inside libjpeg (draft mode), so a 12 MP photo
+# headed for 1600px never exists at full size and the final LANCZOS resize
+# only covers what's left. np.asarray() copies the decoded pixels out of
+# PIL once (through tobytes()) into a read-only array, one copy fewer than
+# np.array(); detect_and_encode() copies that once more, into the shared
+# memory the workers read.
+def decode_image(source, resize_max=1600):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        w, h = img.size
+        scale = min(1.0, resize_max / float(max(w, h)))
+        target = (max(int(w * scale), 1), max(int(h * scale), 1))
+        if scale < 1.0:
+            img.draft("RGB", target)
+        out = img if img.mode == "RGB" else img.convert("RGB")
+        if out.size != target:
+            out = out.resize(target, Image.LANCZOS, reducing_gap=3.0)
+        if out is img:
+            return np.asarray(img)
+    # closing `img` freed the full-size decode before the pixels are copied out
+    return np.asarray(out)
+
+def load_image_for_face_recognition(img_path, resize_max=1600):
+    return decode_image(img_path, resize_max)
+
+# -------------------------------
+# Group photo: tiled detection + batched encoding
+# -------------------------------
+# Large classroom photos are split into overlapping tiles that are detected
+# in parallel on a process pool; the decoded image is shared with the
+# workers through shared memory instead of being pickled per tile. A face
+# narrower than the tile overlap lies wholly inside at least one tile; the
+# duplicates this produces at the seams are merged by merge_detections().
+# Faces wider than the overlap (front rows of a 3200px photo) can straddle
+# a seam without fitting in any tile, so one more task detects the whole
+# frame scaled down to COARSE_MAX, where such faces are still large enough
+# to find without upsampling; its boxes go through the same merge, which
+# drops the half-face boxes the tiles return for them. Encoding then runs
+# in chunks of faces on the same pool.
+TILE_SIZE = 800
+TILE_OVERLAP = 200
+COARSE_MAX = 1600
+HOG_MIN_FACE = 80  # smallest face HOG finds without upsampling
+
+# Start the resource tracker before forking so workers share it; otherwise
+# each worker gets its own tracker, which "cleans up" segments it attached to.
+def make_pool(workers):
+    resource_tracker.ensure_running()
+    return ProcessPoolExecutor(max_workers=workers)
+
+class SharedImage:
+    def __init__(self, image):
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        np.ndarray(image.shape, dtype=np.uint8, buffer=self.shm.buf)[:] = image
+        self.spec = (self.shm.name, image.shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shm.close()
+        self.shm.unlink()
+
+def _attach(spec):
+    shm = shared_memory.SharedMemory(name=spec[0])
+    return shm, np.ndarray(spec[1], dtype=np.uint8, buffer=shm.buf)
+
+def split_tiles(shape, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    h, w = shape[:2]
+    step = max(tile_size - overlap, 1)
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        points = list(range(0, length - tile_size, step))
+        return points + [length - tile_size]
+    return [(top, left, min(top + tile_size, h), min(left + tile_size, w))
+            for top in starts(h) for left in starts(w)]
+
+def _detect_tile(spec, tile, upsample):
+    shm, image = _attach(spec)
+    try:
+        top, left, bottom, right = tile
+        found = face_api().face_locations(image[top:bottom, left:right], upsample)
+        return [(t + top, r + left, b + top, l + left) for t, r, b, l in found]
+    finally:
+        del image
+        shm.close()
+
+# The 5-point landmarks (eyes and nose) of one face, None if not found.
+def face_landmarks(image, box):
+    found = face_api().face_landmarks(image, [box], model="small")
+    return found[0] if found else None
+
+# Coarse pass for tiled mode: detects on the whole frame resized to `size`
+# (w, h) and returns the boxes at full scale.
+def _detect_scaled(spec, size, upsample):
+    shm, image = _attach(spec)
+    try:
+        h, w = image.shape[:2]
+        small = np.asarray(Image.fromarray(image).resize(size, Image.BILINEAR))
+    finally:
+        del image
+        shm.close()
+    sy, sx = h / float(size[1]), w / float(size[0])
+    found = face_api().face_locations(small, upsample)
+    return [(int(t * sy), min(int(r * sx), w), min(int(b * sy), h), int(l * sx)) for t, r, b, l in found]
+
+# With a quality gate (quality.py) returns (encoding or None, report) per
+# face; faces the gate rejects are never encoded.
+def _encode_faces(spec, locations, gate=None):
+    shm, image = _attach(spec)
+    try:
+        if gate is None:
+            return face_api().face_encodings(image, locations)
+        reports = [gate.check(image, box, face_landmarks) for box in locations]
+        keep = [box for box, report in zip(locations, reports) if report["reason"] is None]
+        encodings = iter(face_api().face_encodings(image, keep) if keep else [])
+        return [(next(encodings) if report["reason"] is None else None, report) for report in reports]
+    finally:
+        del image
+        shm.close()
+
+# Drop boxes that mostly cover a larger box already kept (a face seen by two
+# tiles, or cut off at one tile's edge and whole in the next).
+def merge_detections(boxes, overlap_threshold=0.5):
+    kept = []
+    area = lambda b: max(b[2] - b[0], 0) * max(b[1] - b[3], 0)
+    for box in sorted(set(boxes), key=area, reverse=True):
+        t, r, b, l = box
+        duplicate = False
+        for kt, kr, kb, kl in kept:
+            ih = min(b, kb) - max(t, kt)
+            iw = min(r, kr) - max(l, kl)
+            if ih > 0 and iw > 0 and ih * iw > overlap_threshold * min(area(box), (kb - kt) * (kr - kl)):
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(box)
+    return sorted(kept)
+
+# -------------------------------
+# Cascade: cheap pass on a downscaled copy, full resolution only on faces
+# -------------------------------
+# The whole frame is only ever seen at CASCADE_MAX pixels. Each candidate
+# box is scaled back up, padded by CASCADE_MARGIN and re-detected inside
+# that full-resolution crop to tighten it; landmarks and encodings then run
+# at full resolution on those boxes only. Faces too small to survive the
+# downscale are missed, which is the trade-off against single/tiled mode.
+CASCADE_MAX = 800
+CASCADE_MARGIN = 0.3
+
+def _detect_array(image, upsample):
+    return face_api().face_locations(image, upsample)
+
+def _refine_faces(spec, boxes):
+    shm, image = _attach(spec)
+    try:
+        refined = []
+        for crop_box, fallback in boxes:
+            top, right, bottom, left = crop_box
+            found = face_api().face_locations(image[top:bottom, left:right], 0)
+            if found:
+                t, r, b, l = max(found, key=lambda f: (f[2] - f[0]) * (f[1] - f[3]))
+                refined.append((t + top, r + left, b + top, l + left))
+            else:
+                refined.append(fallback)
+        return refined
+    finally:
+        del image
+        shm.close()
+
+def _cascade_locations(image, shared, pool, cascade_max, upsample):
+    h, w = image.shape[:2]
+    scale = min(1.0, cascade_max / float(max(h, w)))
+    if scale < 1.0:
+        small = np.asarray(Image.fromarray(image).resize(
+            (max(int(w * scale), 1), max(int(h * scale), 1)), Image.BILINEAR))
+    else:
+        small = image
+    candidates = _gather(pool, _detect_array, [(small, upsample)])[0]
+    if not candidates or scale == 1.0:
+        return candidates
+
+    boxes = []
+    for t, r, b, l in candidates:
+        t, r, b, l = int(t / scale), int(r / scale), int(b / scale), int(l / scale)
+        pad_y, pad_x = int((b - t) * CASCADE_MARGIN), int((r - l) * CASCADE_MARGIN)
+        crop = (max(t - pad_y, 0), min(r + pad_x, w), min(b + pad_y, h), max(l - pad_x, 0))
+        boxes.append((crop, (t, min(r, w), min(b, h), l)))
+    chunk = _chunk_size(len(boxes))
+    refined = _gather(pool, _refine_faces, [(shared.spec, boxes[i:i + chunk])
+                                            for i in range(0, len(boxes), chunk)])
+    return merge_detections([box for part in refined for box in part])
+
+# -------------------------------
+# Detect + encode entry point
+# -------------------------------
+# mode: "single" (whole frame at once), "tiled" (overlapping tiles in
+# parallel) or "cascade" (downscaled pass + full-res refinement). With no
+# pool everything runs inline in the calling process. With a quality `gate`
+# it returns (locations, encodings, reports): one quality report per face
+# and None in place of the encoding of every face the gate rejected.
+DETECTION_MODES = ("single", "tiled", "cascade")
+
+def _gather(pool, fn, arg_list):
+    if pool is None:
+        return [fn(*args) for args in arg_list]
+    futures = [pool.submit(fn, *args) for args in arg_list]
+    return [f.result() for f in futures]
+
+def _chunk_size(n):
+    return max(4, -(-n // (os.cpu_count() or 1)))
+
+def detect_and_encode(image, pool=None, mode="single", tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP,
+                      upsample=1, cascade_max=CASCADE_MAX, gate=None, coarse_max=COARSE_MAX):
+    if mode not in DETECTION_MODES:
+        raise ValueError(f"Unknown detection mode: {mode}")
+    h, w = image.shape[:2]
+    with SharedImage(image) as shared:
+        with metrics.span("detect"):
+            if mode == "cascade":
+                locations = _cascade_locations(image, shared, pool, cascade_max, upsample)
+            elif mode == "tiled":
+                tiles = split_tiles(image.shape, tile_size, tile_overlap)
+                if len(tiles) == 1:
+                    locations = _gather(pool, _detect_tile, [(shared.spec, tiles[0], upsample)])[0]
+                else:
+                    scale = min(1.0, coarse_max / float(max(h, w)))
+                    size = (max(int(w * scale), 1), max(int(h * scale), 1))
+                    coarse_upsample = 0 if tile_overlap * scale >= HOG_MIN_FACE else upsample
+                    coarse = pool.submit(_detect_scaled, shared.spec, size, coarse_upsample) \
+                        if pool is not None else None
+                    found = _gather(pool, _detect_tile, [(shared.spec, tile, upsample) for tile in tiles])
+                    boxes = [box for part in found for box in part]
+                    boxes += coarse.result() if coarse is not None \
+                        else _detect_scaled(shared.spec, size, coarse_upsample)
+                    locations = merge_detections(boxes)
+            else:
+                locations = _gather(pool, _detect_tile, [(shared.spec, (0, 0, h, w), upsample)])[0]
+        if not locations:
+            return ([], [], []) if gate is not None else ([], [])
+        with metrics.span("encode"):
+            chunk = _chunk_size(len(locations))
+            encoded = _gather(pool, _encode_faces, [(shared.spec, locations[i:i + chunk], gate)
+                                                    for i in range(0, len(locations), chunk)])
+        encoded = [e for part in encoded for e in part]
+    if gate is not None:
+        return locations, [e for e, _ in encoded], [report for _, report in encoded]
+    return locations, encoded
+
+# -------------------------------
+# Whole-frame worker for video/burst attendance
+# -------------------------------
+# Video frames are small enough to detect in one pass, so frames (not
+# tiles) are spread across the pool, one frame per task. Also returns the
+# (detect, encode) seconds so callers can see where the time goes.
+def detect_frame(image, upsample=1):
+    start = time.perf_counter()
+    locations = face_api().face_locations(image, upsample)
+    detected = time.perf_counter()
+    if not locations:
+        return [], [], (detected - start, 0.0)
+    encodings = face_api().face_encodings(image, locations)
+    return locations, [np.asarray(e, dtype=np.float32) for e in encodings], \
+        (detected - start, time.perf_counter() - detected)
@@ -0,0 +1,287 @@
+import os, re, sys, json, time, hashlib, argparse
+from collections import deque
+from datetime import datetime
+import numpy as np
+from PIL import Image, ImageOps
+
+import storage
+from storage import DEFAULT_SECTION
+from encoding_store import EncodingStore, photo_files, file_hash, _atomic_write_json
+from gallery import Gallery, AGGREGATIONS, ASSIGNMENTS
+from recognition import decode_image, detect_frame, make_pool, face_api
+from shared_roster import SharedRoster, roster_students
+
+# -------------------------------
+# Offline re-processing
+# -------------------------------
+# python reprocess.py archive/ [--section 7A] [--workers 8]
+#
+# Re-runs attendance over a folder of past group photos, e.g. after the
+# roster changed. Each photo's date comes from its path (2025-09-14/...,
+# class_2025-09-14.jpg) or else its EXIF date; its section is the name of
+# the folder it's in when that is a known section, else --section. One
+# process pool does both jobs in the same pass:
+#   - reference photos in students_db are normalised (RGB, EXIF rotation
+#     applied, at most NORMALIZE_MAX px) and re-encoded, skipping any whose
+#     hash matches the one recorded after their last normalisation;
+#   - group photos are decoded and detected, a few at a time, while that
+#     runs; matching waits for the refreshed roster.
+# A student is present on a date if any photo of that date/section matched
+# them. Results are written to the attendance store every CHECKPOINT_EVERY
+# photos, in one transaction, together with a checkpoint file, so an
+# interrupted run picks up where it stopped. Without an archive only the
+# reference photos are normalised.
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+NORMALIZE_MAX = 1600  # what encode_student_photo() reads anyway
+CHECKPOINT_EVERY = 25
+DATE_IN_PATH = re.compile(r"(\d{4})[-_.]?(\d{2})[-_.]?(\d{2})")
+EXIF_DATETIME_ORIGINAL, EXIF_DATETIME, EXIF_IFD = 36867, 306, 0x8769
+
+# -------------------------------
+# Reference photos
+# -------------------------------
+# Same as the app's encode_student_photo(), minus the in-place RGB rewrite.
+def _encode_reference(img_path):
+    encodings = face_api().face_encodings(decode_image(img_path))
+    return np.asarray(encodings[0], dtype=np.float32) if encodings else None
+
+# Runs in a pool worker. Rewrites the photo only if something changes;
+# returns (file, encoding or None, sha1 of the file as left).
+def normalize_photo(folder, file, resize_max=NORMALIZE_MAX):
+    img_path = os.path.join(folder, file)
+    with Image.open(img_path) as img:
+        fmt = img.format
+        orientation = img.getexif().get(0x0112, 1)
+        fixed = ImageOps.exif_transpose(img).convert("RGB")
+        if resize_max and max(fixed.size) > resize_max:
+            scale = resize_max / float(max(fixed.size))
+            fixed = fixed.resize((int(fixed.size[0] * scale), int(fixed.size[1] * scale)), Image.LANCZOS)
+        changed = img.mode != "RGB" or orientation != 1 or fixed.size != img.size
+    if changed:
+        tmp = img_path + ".tmp"
+        fixed.save(tmp, "JPEG" if fmt in (None, "MPO") else fmt, quality=95)
+        os.replace(tmp, img_path)
+    return file, _encode_reference(img_path), file_hash(img_path)
+
+def _known_hash(store, folder, file):
+    entry = store.entries.get(file)
+    if entry is None:
+        return None
+    st = os.stat(os.path.join(folder, file))
+    if entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+        return entry["sha1"]
+    return None
+
+def submit_normalize(pool, store, folder, resize_max, record):
+    store.load()
+    todo = [f for f in photo_files(folder, PHOTO_EXTENSIONS)
+            if record.get(f) is None or record.get(f) != _known_hash(store, folder, f)]
+    return [pool.submit(normalize_photo, folder, f, resize_max) for f in todo]
+
+def finish_normalize(futures, store, folder, record, record_path):
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            print(f"Normalising failed: {e}")
+    if results:
+        store.put_many(folder, [(file, encoding) for file, encoding, _ in results])
+        record.update({file: sha1 for file, _, sha1 in results})
+        _atomic_write_json(record_path, record)
+    print(f"Reference photos: {len(results)} normalised and re-encoded, "
+          f"{len(futures) - len(results)} failed.")
+    # picks up deletions and anything the pool couldn't do
+    return store.sync(folder, PHOTO_EXTENSIONS, _encode_reference)
+
+# -------------------------------
+# Group photos
+# -------------------------------
+def photo_date(rel_path, full_path):
+    for match in DATE_IN_PATH.finditer(rel_path):
+        try:
+            return datetime(*map(int, match.groups())).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    try:
+        with Image.open(full_path) as img:
+            exif = img.getexif()
+            stamp = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+        if stamp:
+            return datetime.strptime(str(stamp)[:10], "%Y:%m:%d").strftime("%Y-%m-%d")
+    except Exception:
+        pass
+    return None
+
+def group_photos(archive):
+    photos = []
+    for root, dirs, files in os.walk(archive):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for f in sorted(files):
+            if f.lower().endswith(PHOTO_EXTENSIONS) and not f.startswith("."):
+                photos.append(os.path.relpath(os.path.join(root, f), archive))
+    return photos
+
+# Runs in a pool worker: (faces found, encodings).
+def detect_group_photo(img_path, resize_max, upsample=1):
+    locations, encodings, _ = detect_frame(decode_image(img_path, resize_max), upsample)
+    return len(locations), encodings
+
+def roster_fingerprint(store, tolerance, aggregate, method):
+    rows = sorted((file, e["sha1"]) for file, e in store.entries.items() if e["row"] >= 0)
+    return hashlib.sha1(json.dumps([rows, tolerance, aggregate, method]).encode()).hexdigest()[:16]
+
+# (roster fingerprint, {photo: result}) of an earlier run, if any.
+def load_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return None, {}
+    with open(checkpoint_path, "r") as f:
+        data = json.load(f)
+    return data.get("roster"), data.get("photos", {})
+
+def reprocess(archive, pool, store, folder, section=None, resize_max=3200, tolerance=0.6, aggregate="min",
+              method="greedy", checkpoint_path=None, normalize=True, normalize_max=NORMALIZE_MAX,
+              checkpoint_every=CHECKPOINT_EVERY):
+    start = time.perf_counter()
+    record_path = os.path.join(store.root, "normalized.json")
+    record = {}
+    if os.path.exists(record_path):
+        with open(record_path, "r") as f:
+            record = json.load(f)
+    norm_futures = submit_normalize(pool, store, folder, normalize_max, record) if normalize else []
+
+    # Group photos start detecting while the reference photos are redone.
+    # Photos in the checkpoint are skipped for now and re-queued below if the
+    # roster turns out to have changed since it was written.
+    sections = storage.student_sections()
+    known_sections = set(sections.values())
+    photos = group_photos(archive) if archive else []
+    checkpoint_path = checkpoint_path or os.path.join("instance", "reprocess_checkpoint.json")
+    old_fingerprint, done = load_checkpoint(checkpoint_path)
+    window = 2 * (getattr(pool, "_max_workers", 1) or 1)
+    pending, queue, resumed = deque(), deque(photos), []
+    stats = {"processed": 0, "resumed": 0, "failed": 0, "undated": 0}
+
+    def refill():
+        while queue and len(pending) < window:
+            rel = queue.popleft()
+            if rel in done:
+                resumed.append(rel)
+                continue
+            full = os.path.join(archive, rel)
+            pending.append((rel, full, pool.submit(detect_group_photo, full, resize_max)))
+
+    refill()
+    names, matrix = finish_normalize(norm_futures, store, folder, record, record_path) if normalize \
+        else store.sync(folder, PHOTO_EXTENSIONS, _encode_reference)
+    # running app workers reload from the shared roster (a no-op when
+    # nothing changed)
+    SharedRoster(store.root).publish(
+        lambda: roster_students(store, storage.student_sections(), default_section=DEFAULT_SECTION))
+    if not archive:
+        return stats
+    gallery = Gallery.from_encodings(names, matrix)
+    by_section = {}
+    for name, encoding in zip(names, matrix):
+        by_section.setdefault(sections.get(name, DEFAULT_SECTION), Gallery()).add(name, encoding)
+
+    fingerprint = roster_fingerprint(store, tolerance, aggregate, method)
+    if done and old_fingerprint != fingerprint:
+        print("Roster changed since the checkpoint was written; starting over.")
+        done = {}
+        queue.extendleft(reversed(resumed))
+        resumed.clear()
+    groups = {}  # (date, section) -> set of students seen in any of its photos
+    for entry in done.values():
+        if entry.get("date"):
+            groups.setdefault((entry["date"], entry["section"]), set()).update(entry["present"])
+    touched = set()
+
+    def flush():
+        days = []
+        for date, group_section in sorted(touched):
+            roster = by_section.get(group_section, Gallery()) if group_section else gallery
+            present = groups[(date, group_section)]
+            attendance = {s: "Present" if s in present else "Absent" for s in roster.student_names()}
+            days.append((date, attendance, group_section or sections))
+        storage.record_attendance_many(days)
+        os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+        _atomic_write_json(checkpoint_path, {"roster": fingerprint, "photos": done})
+        touched.clear()
+
+    refill()
+    since_flush = 0
+    while pending:
+        rel, full, future = pending.popleft()
+        refill()
+        st = os.stat(full)
+        entry = {"size": st.st_size, "mtime": st.st_mtime}
+        folder_name = os.path.basename(os.path.dirname(rel))
+        entry["section"] = folder_name if folder_name in known_sections else (section or "")
+        entry["date"] = photo_date(rel, full)
+        try:
+            faces, encodings = future.result()
+        except Exception as e:
+            print(f"FAILED {rel}: {e}")
+            entry["error"] = str(e)
+            stats["failed"] += 1
+            done[rel] = entry
+            continue
+        if entry["date"] is None:
+            print(f"SKIPPED {rel}: no date in its path or EXIF")
+            stats["undated"] += 1
+            entry["present"] = []
+            done[rel] = entry
+            continue
+        roster = by_section.get(entry["section"], Gallery()) if entry["section"] else gallery
+        reports = roster.assign(encodings, tolerance, aggregate, method) if encodings else []
+        entry["present"] = sorted({r["name"] for r in reports if r["name"] is not None})
+        entry["faces"] = faces
+        done[rel] = entry
+        groups.setdefault((entry["date"], entry["section"]), set()).update(entry["present"])
+        touched.add((entry["date"], entry["section"]))
+        stats["processed"] += 1
+        since_flush += 1
+        if since_flush >= checkpoint_every:
+            flush()
+            since_flush = 0
+    flush()
+    stats["resumed"] = len(resumed)
+    stats["days"] = len(groups)
+    stats["seconds"] = round(time.perf_counter() - start, 1)
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run attendance over an archive of group photos")
+    parser.add_argument("archive", nargs="?", help="folder of dated group photos (omit to only normalise)")
+    parser.add_argument("--section", default="", help="section for photos not in a section folder")
+    parser.add_argument("--students", default="students_db")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--checkpoint", help="default: instance/reprocess_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--resize-max", type=int, default=3200)
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--aggregate", choices=AGGREGATIONS, default="min")
+    parser.add_argument("--assignment", choices=ASSIGNMENTS, default="greedy")
+    parser.add_argument("--no-normalize", action="store_true", help="leave reference photos alone")
+    parser.add_argument("--normalize-max", type=int, default=NORMALIZE_MAX, help="0 keeps full size")
+    args = parser.parse_args(argv)
+
+    storage.init_db()
+    checkpoint = args.checkpoint or os.path.join("instance", "reprocess_checkpoint.json")
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    with make_pool(args.workers) as pool:
+        stats = reprocess(args.archive, pool, EncodingStore("encodings_cache"), args.students,
+                          section=args.section, resize_max=args.resize_max, tolerance=args.tolerance,
+                          aggregate=args.aggregate, method=args.assignment, checkpoint_path=checkpoint,
+                          normalize=not args.no_normalize, normalize_max=args.normalize_max)
+    if args.archive:
+        rate = stats["processed"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(f"{stats['processed']} photo(s) processed ({rate:.1f}/s), {stats['resumed']} already done, "
+              f"{stats['failed']} failed, {stats['undated']} undated; {stats['days']} day(s) written "
+              f"in {stats['seconds']}s.")
+    return 1 if stats["failed"] and not stats["processed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
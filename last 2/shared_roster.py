@@ -0,0 +1,211 @@
+import os, json, mmap, struct, hashlib
+from itertools import islice
+import numpy as np
+
+from encoding_store import ENCODING_DIM
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, workers just race
+    fcntl = None
+
+# -------------------------------
+# Roster shared by every worker on the host
+# -------------------------------
+# The enrolled encodings live in one memory-mapped segment per host instead
+# of a private copy per worker:
+#   roster-<segment>.f32   float32 (capacity, 128) encodings
+#   roster-<segment>.sq    float32 (capacity,) squared norms
+#   roster-<segment>.rows  one JSON [name, section] line per row
+# Rows are ordered by section then student, so every section is a short
+# contiguous slice of the same map. roster.gen is a 24-byte counter
+# (segment, rows, version) that every worker keeps mapped; reading the
+# version is one memory access, so it can be checked on every request and
+# the roster reloaded only when it moved.
+#
+# Writers hold an exclusive flock on .roster.lock. Brand-new students are
+# appended in place into the segment's spare rows; anything else (a student
+# removed, moved to another section or given another photo, or a full
+# segment) writes a new segment. Old segments are unlinked once two
+# generations behind; a worker still mapping one keeps it until it reloads.
+_COUNTER = struct.Struct("<QQQ")
+
+def _digest(students):
+    h = hashlib.sha1()
+    for name in sorted(students):
+        section, encodings = students[name]
+        h.update(json.dumps([name, section]).encode())
+        h.update(np.ascontiguousarray(encodings, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+class SharedRoster:
+    def __init__(self, root="encodings_cache", dim=ENCODING_DIM):
+        self.root = root
+        self.dim = dim
+        self.counter_path = os.path.join(root, "roster.gen")
+        self.digest_path = os.path.join(root, "roster.digest")
+        self.lock_path = os.path.join(root, ".roster.lock")
+        os.makedirs(root, exist_ok=True)
+        lock = self._lock()
+        try:
+            if not os.path.exists(self.counter_path) or os.path.getsize(self.counter_path) < _COUNTER.size:
+                with open(self.counter_path, "wb") as f:
+                    f.write(bytes(_COUNTER.size))
+        finally:
+            self._unlock(lock)
+        with open(self.counter_path, "r+b") as f:
+            self._counter = mmap.mmap(f.fileno(), _COUNTER.size)
+
+    def _lock(self, shared=False):
+        f = open(self.lock_path, "a")
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        return f
+
+    def _unlock(self, f):
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+    # Bumped on every change; cheap enough to poll per request.
+    def version(self):
+        return struct.unpack_from("<Q", self._counter, 16)[0]
+
+    def _state(self):
+        return _COUNTER.unpack(self._counter[:_COUNTER.size])
+
+    def _set_state(self, segment, rows, version):
+        self._counter[:_COUNTER.size] = _COUNTER.pack(segment, rows, version)
+
+    def _paths(self, segment):
+        base = os.path.join(self.root, f"roster-{segment}")
+        return base + ".f32", base + ".sq", base + ".rows"
+
+    def _capacity(self, segment):
+        return os.path.getsize(self._paths(segment)[1]) // 4
+
+    def _maps(self, segment, mode="r"):
+        matrix_path, sq_path, _ = self._paths(segment)
+        capacity = self._capacity(segment)
+        return (np.memmap(matrix_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim)),
+                np.memmap(sq_path, dtype=np.float32, mode=mode, shape=(capacity,)))
+
+    # A student's rows are identical lines; parse each distinct one once so
+    # every row shares the same name / section strings.
+    def _read_rows(self, segment, rows):
+        parsed = {}
+        with open(self._paths(segment)[2], "r", encoding="utf-8") as f:
+            return [parsed.get(line) or parsed.setdefault(line, tuple(json.loads(line)))
+                    for line in islice(f, rows)]
+
+    # (version, names, sections, matrix, sq_norms), one entry per row. The
+    # arrays are read-only maps of the segment, shared with every process.
+    def load(self):
+        lock = self._lock(shared=True)
+        try:
+            segment, rows, version = self._state()
+            if segment == 0 or rows == 0:
+                empty = np.zeros((0, self.dim), dtype=np.float32)
+                return version, [], [], empty, np.zeros(0, dtype=np.float32)
+            matrix, sq_norms = self._maps(segment)
+            names_sections = self._read_rows(segment, rows)
+        finally:
+            self._unlock(lock)
+        return (version, [n for n, _ in names_sections], [s for _, s in names_sections],
+                matrix[:rows], sq_norms[:rows])
+
+    # Replace the whole roster with everyone(): {name: (section, (k, 128)
+    # encodings)}. Skipped when nothing changed since the last publish, so
+    # every worker can call it at boot.
+    def publish(self, everyone):
+        lock = self._lock()
+        try:
+            self._publish(everyone())
+        finally:
+            self._unlock(lock)
+
+    def _publish(self, students):
+        digest = _digest(students)
+        segment, _, version = self._state()
+        if segment and os.path.exists(self.digest_path):
+            with open(self.digest_path, "r") as f:
+                if f.read() == digest:
+                    return False
+        order = sorted(students, key=lambda name: (students[name][0], name))
+        count = sum(len(students[name][1]) for name in order)
+        segment += 1
+        matrix_path, sq_path, rows_path = self._paths(segment)
+        capacity = max(64, count + count // 2)
+        matrix = np.memmap(matrix_path, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        sq_norms = np.memmap(sq_path, dtype=np.float32, mode="w+", shape=(capacity,))
+        row = 0
+        with open(rows_path, "w", encoding="utf-8") as f:
+            for name in order:
+                section, encodings = students[name]
+                encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+                matrix[row:row + len(encodings)] = encodings
+                sq_norms[row:row + len(encodings)] = (encodings * encodings).sum(axis=1)
+                f.write((json.dumps([name, section]) + "\n") * len(encodings))
+                row += len(encodings)
+        matrix.flush()
+        sq_norms.flush()
+        del matrix, sq_norms
+        with open(self.digest_path, "w") as f:
+            f.write(digest)
+        self._set_state(segment, count, version + 1)
+        self._drop_old(segment)
+        print(f"Shared roster: segment {segment}, {len(order)} student(s), {count} row(s).")
+        return True
+
+    # Enroll or re-enroll `names`. students(names) / students() return the
+    # same mapping as publish() for those students / everyone. Students new
+    # to the roster are appended in place when they fit.
+    def update(self, names, students):
+        lock = self._lock()
+        try:
+            segment, rows, version = self._state()
+            existing = {name for name, _ in self._read_rows(segment, rows)} if segment else set()
+            added = students(names)
+            count = sum(len(encodings) for _, encodings in added.values())
+            if not segment or existing & set(names) or rows + count > self._capacity(segment):
+                self._publish(students())
+                return
+            matrix, sq_norms = self._maps(segment, mode="r+")
+            row = rows
+            with open(self._paths(segment)[2], "a", encoding="utf-8") as f:
+                for name in sorted(added):
+                    section, encodings = added[name]
+                    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+                    matrix[row:row + len(encodings)] = encodings
+                    sq_norms[row:row + len(encodings)] = (encodings * encodings).sum(axis=1)
+                    f.write((json.dumps([name, section]) + "\n") * len(encodings))
+                    row += len(encodings)
+            matrix.flush()
+            sq_norms.flush()
+            del matrix, sq_norms
+            # appended rows are out of section order; the next publish() rewrites
+            if os.path.exists(self.digest_path):
+                os.remove(self.digest_path)
+            self._set_state(segment, row, version + 1)
+        finally:
+            self._unlock(lock)
+
+    def _drop_old(self, segment):
+        for entry in os.listdir(self.root):
+            base, ext = os.path.splitext(entry)
+            if not base.startswith("roster-") or ext not in (".f32", ".sq", ".rows"):
+                continue
+            try:
+                if int(base[len("roster-"):]) < segment - 1:
+                    os.remove(os.path.join(self.root, entry))
+            except (ValueError, OSError):
+                pass
+
+# {name: (section, encodings)} for `names` (everyone when None) from the
+# encoding store and the student table; students without a usable photo
+# are left out.
+def roster_students(store, sections, names=None, default_section=""):
+    store.refresh()
+    names = store.files_by_name() if names is None else names
+    return {name: (sections.get(name, default_section), encodings)
+            for name, encodings in store.encodings_for(names).items() if len(encodings)}
@@ -0,0 +1,405 @@
+import os, sys, re, json, csv, glob, time, sqlite3, threading
+from werkzeug.security import generate_password_hash, check_password_hash
+from notifications import OUTBOX_SCHEMA
+
+# -------------------------------
+# SQLite storage layer
+# -------------------------------
+# Teachers, students and attendance live in the databases under instance/:
+#   teachers.db    teacher(username, password hash)
+#   students.db    student(name, student_class = section, phone = parent phone, photo)
+#   attendance.db  student(name, parent_number),
+#                  attendance(student_id, date, section, status), one row per key
+#                  (plus sms_outbox, owned by notifications.py)
+# Every thread of every worker keeps one open connection per database (WAL,
+# busy timeout), reused across requests instead of reopening JSON files.
+INSTANCE_DIR = "instance"
+TEACHERS_DB = os.path.join(INSTANCE_DIR, "teachers.db")
+STUDENTS_DB = os.path.join(INSTANCE_DIR, "students.db")
+ATTENDANCE_DB = os.path.join(INSTANCE_DIR, "attendance.db")
+
+DEFAULT_SECTION = "General"
+
+_local = threading.local()
+
+def get_connection(db_path):
+    conns = getattr(_local, "conns", None)
+    # a forked worker must not reuse its parent's connections
+    if conns is None or _local.pid != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conns[db_path] = conn
+    return conn
+
+# attendance.db files created before sections were recorded: add the column,
+# fill it from the roster and keep only the latest row per key so the unique
+# index can be built.
+def _add_attendance_section(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(attendance)")]
+    if "section" in columns:
+        return
+    conn.execute(f"ALTER TABLE attendance ADD COLUMN section VARCHAR(50) NOT NULL DEFAULT '{DEFAULT_SECTION}'")
+    ids = dict(conn.execute("SELECT name, id FROM student").fetchall())
+    conn.executemany("UPDATE attendance SET section = ? WHERE student_id = ?",
+                     [(section, ids[name]) for name, section in student_sections().items() if name in ids])
+    conn.execute("DELETE FROM attendance WHERE id NOT IN "
+                 "(SELECT MAX(id) FROM attendance GROUP BY student_id, date, section)")
+
+# Present/absent counters per (period, start, section), period being "day",
+# "week" (start = Monday) or "month" (start = the 1st). Triggers on attendance
+# keep them current inside the writing transaction, so the dashboard and the
+# trend series read a handful of rows instead of aggregating attendance.
+COUNT_PERIODS = ("day", "week", "month")
+
+def _count_upsert(row, sign=""):
+    return f"""INSERT INTO attendance_counts (period, start, section, present, absent)
+            SELECT p.period, p.start, {row}.section, {sign}({row}.status = 'Present'), {sign}({row}.status != 'Present')
+            FROM (SELECT 'day' AS period, {row}.date AS start
+                  UNION ALL SELECT 'week', date({row}.date, '-6 days', 'weekday 1')
+                  UNION ALL SELECT 'month', substr({row}.date, 1, 7) || '-01') p WHERE 1
+            ON CONFLICT (period, start, section) DO UPDATE SET
+                present = present + excluded.present, absent = absent + excluded.absent;"""
+
+# Created (and filled from the existing rows) before the triggers exist.
+def _create_attendance_counts(conn):
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance_counts'").fetchone():
+        return
+    conn.execute("""CREATE TABLE attendance_counts (
+        period TEXT NOT NULL,
+        start TEXT NOT NULL,
+        section TEXT NOT NULL,
+        present INTEGER NOT NULL DEFAULT 0,
+        absent INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (period, start, section))""")
+    buckets = {"day": "date", "week": "date(date, '-6 days', 'weekday 1')", "month": "substr(date, 1, 7) || '-01'"}
+    for period, bucket in buckets.items():
+        conn.execute("INSERT INTO attendance_counts (period, start, section, present, absent) "
+                     f"SELECT '{period}', {bucket}, section, SUM(status = 'Present'), SUM(status != 'Present') "
+                     f"FROM attendance WHERE date IS NOT NULL GROUP BY {bucket}, section")
+
+SCHEMA = {
+    TEACHERS_DB: [
+        """CREATE TABLE IF NOT EXISTS teacher (
+            id INTEGER NOT NULL,
+            username VARCHAR(100) NOT NULL,
+            password VARCHAR(200) NOT NULL,
+            PRIMARY KEY (id),
+            UNIQUE (username))""",
+    ],
+    STUDENTS_DB: [
+        """CREATE TABLE IF NOT EXISTS student (
+            id INTEGER NOT NULL,
+            roll_no VARCHAR(50) NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            student_class VARCHAR(50) NOT NULL,
+            phone VARCHAR(20) NOT NULL,
+            email VARCHAR(100),
+            address VARCHAR(200),
+            photo VARCHAR(200) NOT NULL,
+            PRIMARY KEY (id),
+            UNIQUE (roll_no))""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_student_name ON student (name)",
+        "CREATE INDEX IF NOT EXISTS idx_student_class ON student (student_class)",
+    ],
+    ATTENDANCE_DB: [
+        """CREATE TABLE IF NOT EXISTS student (
+            id INTEGER NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            parent_number VARCHAR(20),
+            address VARCHAR(200),
+            PRIMARY KEY (id),
+            UNIQUE (name))""",
+        """CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER NOT NULL,
+            student_id INTEGER,
+            date VARCHAR(20),
+            status VARCHAR(20),
+            section VARCHAR(50) NOT NULL DEFAULT 'General',
+            PRIMARY KEY (id),
+            FOREIGN KEY(student_id) REFERENCES student (id))""",
+        _add_attendance_section,
+        # (student, date, section) is the record key; per-student history is a
+        # prefix scan of it. Day/range aggregates and export walk the covering
+        # date index in order.
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_key ON attendance (student_id, date, section)",
+        "CREATE INDEX IF NOT EXISTS idx_attendance_date_section ON attendance (date, section, student_id, status)",
+        "DROP INDEX IF EXISTS idx_attendance_date",
+        "DROP INDEX IF EXISTS idx_attendance_student_date",
+        _create_attendance_counts,
+        f"""CREATE TRIGGER IF NOT EXISTS trg_attendance_counts_insert AFTER INSERT ON attendance BEGIN
+            {_count_upsert("NEW")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_attendance_counts_update
+            AFTER UPDATE OF date, section, status ON attendance BEGIN
+            {_count_upsert("OLD", "-")}
+            {_count_upsert("NEW")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_attendance_counts_delete AFTER DELETE ON attendance BEGIN
+            {_count_upsert("OLD", "-")}
+        END""",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    ],
+}
+
+# Statements are SQL strings or callables taking the connection (upgrades
+# of existing databases).
+def init_db():
+    for db_path, statements in SCHEMA.items():
+        conn = get_connection(db_path)
+        with conn:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+
+# -------------------------------
+# Teachers
+# -------------------------------
+def create_teacher(username, password):
+    conn = get_connection(TEACHERS_DB)
+    with conn:
+        cur = conn.execute("INSERT OR IGNORE INTO teacher (username, password) VALUES (?, ?)",
+                           (username, generate_password_hash(password)))
+    return cur.rowcount == 1
+
+def check_teacher(username, password):
+    row = get_connection(TEACHERS_DB).execute(
+        "SELECT password FROM teacher WHERE username = ?", (username,)).fetchone()
+    return row is not None and check_password_hash(row[0], password)
+
+# -------------------------------
+# Students
+# -------------------------------
+def student_sections():
+    rows = get_connection(STUDENTS_DB).execute("SELECT name, student_class FROM student").fetchall()
+    return dict(rows)
+
+def student_parents():
+    rows = get_connection(STUDENTS_DB).execute(
+        "SELECT name, phone FROM student WHERE phone != ''").fetchall()
+    return dict(rows)
+
+def upsert_student(name, section=None, phone=None, photo=None):
+    upsert_students([(name, section, phone, photo)])
+
+# rows: (name, section, phone, photo) tuples, None leaving a field as is.
+# Written in one transaction.
+def upsert_students(rows):
+    conn = get_connection(STUDENTS_DB)
+    with conn:
+        for name, section, phone, photo in rows:
+            conn.execute("INSERT OR IGNORE INTO student (roll_no, name, student_class, phone, photo) "
+                         "VALUES (?, ?, ?, '', '')", (name, name, DEFAULT_SECTION))
+            if section is not None:
+                conn.execute("UPDATE student SET student_class = ? WHERE name = ?", (section, name))
+            if phone is not None:
+                conn.execute("UPDATE student SET phone = ? WHERE name = ?", (phone, name))
+            if photo is not None:
+                conn.execute("UPDATE student SET photo = ? WHERE name = ?", (photo, name))
+
+def delete_student(name):
+    conn = get_connection(STUDENTS_DB)
+    with conn:
+        conn.execute("DELETE FROM student WHERE name = ?", (name,))
+
+# -------------------------------
+# Attendance
+# -------------------------------
+def _attendance_student_ids(conn, names):
+    conn.executemany("INSERT OR IGNORE INTO student (name) VALUES (?)", [(n,) for n in names])
+    ids = {}
+    for i in range(0, len(names), 500):
+        chunk = names[i:i + 500]
+        marks = ",".join("?" * len(chunk))
+        ids.update(conn.execute(f"SELECT name, id FROM student WHERE name IN ({marks})", chunk).fetchall())
+    return ids
+
+# attendance: {student: "Present" | "Absent"} for one date. `sections` is
+# either one section for everybody or a {student: section} dict. Replaces any
+# earlier record with the same (student, date, section).
+def record_attendance(date, attendance, sections=None):
+    record_attendance_many([(date, attendance, sections)])
+
+# Several days in one transaction: [(date, attendance, sections)], each as
+# for record_attendance().
+def record_attendance_many(days):
+    days = [day for day in days if day[1]]
+    names = sorted({name for _, attendance, _ in days for name in attendance})
+    if not names:
+        return
+    rows = []
+    conn = get_connection(ATTENDANCE_DB)
+    with conn:
+        ids = _attendance_student_ids(conn, names)
+        for date, attendance, sections in days:
+            if isinstance(sections, str):
+                section_of = lambda name: sections
+            else:
+                section_of = lambda name: (sections or {}).get(name, DEFAULT_SECTION)
+            rows.extend((ids[n], date, section_of(n), status) for n, status in attendance.items())
+        conn.executemany("INSERT INTO attendance (student_id, date, section, status) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (student_id, date, section) DO UPDATE SET status = excluded.status",
+                         rows)
+
+# Dates are ISO strings, so ranges are plain string comparisons. start/end
+# are inclusive and either may be None.
+def _range_filter(start=None, end=None, section=None, date_col="a.date", section_col="a.section"):
+    clauses, params = [], []
+    if start:
+        clauses.append(f"{date_col} >= ?")
+        params.append(start)
+    if end:
+        clauses.append(f"{date_col} <= ?")
+        params.append(end)
+    if section:
+        clauses.append(f"{section_col} = ?")
+        params.append(section)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+# {student: status} for one day (latest record wins if a student was taken
+# in two sections).
+def attendance_for_day(date, section=None):
+    where, params = _range_filter(date, date, section)
+    rows = get_connection(ATTENDANCE_DB).execute(
+        "SELECT s.name, a.status FROM attendance a JOIN student s ON s.id = a.student_id"
+        f"{where} ORDER BY a.id", params).fetchall()
+    return dict(rows)
+
+# [(date, section, status)] for one student, oldest first.
+def student_history(name, start=None, end=None):
+    where, params = _range_filter(start, end)
+    where = (where + " AND" if where else " WHERE") + " s.name = ?"
+    return get_connection(ATTENDANCE_DB).execute(
+        "SELECT a.date, a.section, a.status FROM attendance a JOIN student s ON s.id = a.student_id"
+        f"{where} ORDER BY a.date, a.section", params + [name]).fetchall()
+
+# [(student, present_days, absent_days)] over a date range, e.g. everybody
+# absent on more than 3 days this month with min_absent=4.
+def attendance_summary(start=None, end=None, section=None, min_absent=0):
+    where, params = _range_filter(start, end, section)
+    return get_connection(ATTENDANCE_DB).execute(
+        "SELECT s.name, "
+        "COUNT(DISTINCT CASE WHEN a.status = 'Present' THEN a.date END) AS present, "
+        "COUNT(DISTINCT CASE WHEN a.status != 'Present' THEN a.date END) AS absent "
+        "FROM attendance a JOIN student s ON s.id = a.student_id"
+        f"{where} GROUP BY a.student_id HAVING absent >= ? ORDER BY absent DESC, s.name",
+        params + [min_absent]).fetchall()
+
+# (present, absent) for one day from the counters.
+def day_counts(date, section=None):
+    sql = "SELECT COALESCE(SUM(present), 0), COALESCE(SUM(absent), 0) FROM attendance_counts " \
+          "WHERE period = 'day' AND start = ?"
+    params = [date]
+    if section:
+        sql += " AND section = ?"
+        params.append(section)
+    return get_connection(ATTENDANCE_DB).execute(sql, params).fetchone()
+
+# [(period_start, present, absent)] for period "day", "week" or "month",
+# summed over sections unless one is given. start/end filter on the period
+# start date.
+def attendance_trend(period, start=None, end=None, section=None):
+    if period not in COUNT_PERIODS:
+        raise ValueError(f"period must be one of {COUNT_PERIODS}")
+    where, params = _range_filter(start, end, section, "c.start", "c.section")
+    where = (where + " AND" if where else " WHERE") + " c.period = ?"
+    return get_connection(ATTENDANCE_DB).execute(
+        "SELECT c.start, SUM(c.present), SUM(c.absent) FROM attendance_counts c"
+        f"{where} GROUP BY c.start HAVING SUM(c.present) + SUM(c.absent) > 0 ORDER BY c.start",
+        params + [period]).fetchall()
+
+# Yields (student, date, section, status) in index order without loading the
+# range into memory; used for CSV export.
+def iter_attendance(start=None, end=None, section=None, batch=1000):
+    where, params = _range_filter(start, end, section)
+    cur = get_connection(ATTENDANCE_DB).execute(
+        "SELECT s.name, a.date, a.section, a.status FROM attendance a JOIN student s ON s.id = a.student_id"
+        f"{where} ORDER BY a.date, a.section, a.student_id", params)
+    try:
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+# -------------------------------
+# One-shot migration from the JSON files and attendance_*.csv
+# -------------------------------
+LEGACY_MIGRATION = "legacy_json_csv"
+
+# parent numbers that used to be hard-coded in app.py
+LEGACY_PARENTS = {
+    "ali": "+7060293337",
+    "bob": "+919876543210",
+    "charlie": "+918888777666"
+}
+
+def migrate_legacy_files(base_dir=".", students_folder="students_db", parents=LEGACY_PARENTS):
+    conn = get_connection(ATTENDANCE_DB)
+    if conn.execute("SELECT 1 FROM meta WHERE key = ?", (LEGACY_MIGRATION,)).fetchone():
+        return False
+
+    def read_json(name):
+        file_path = os.path.join(base_dir, name)
+        if not os.path.exists(file_path):
+            return {}
+        with open(file_path, "r") as f:
+            return json.load(f)
+
+    teachers = read_json("teachers.json")
+    for username, password in teachers.items():
+        create_teacher(username, password)
+
+    photos = {}
+    folder = os.path.join(base_dir, students_folder)
+    if os.path.isdir(folder):
+        for file in sorted(os.listdir(folder)):
+            if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+                photos.setdefault(os.path.splitext(file)[0].lower(), file)
+    sections = read_json("student_sections.json")
+    for name in sorted(set(photos) | set(sections) | set(parents or {})):
+        upsert_student(name, section=sections.get(name), phone=(parents or {}).get(name),
+                       photo=photos.get(name))
+
+    roster_sections = student_sections()
+    csv_files = sorted(glob.glob(os.path.join(base_dir, "attendance_*.csv")))
+    for csv_path in csv_files:
+        match = re.match(r"attendance_(\d{4}-\d{2}-\d{2})", os.path.basename(csv_path))
+        if not match:
+            continue
+        with open(csv_path, "r", newline="") as f:
+            rows = {row["Name"]: row["Status"] for row in csv.DictReader(f)}
+        record_attendance(match.group(1), rows, roster_sections)
+
+    sms_log = read_json("sms_log.json")
+    with conn:
+        for statement in OUTBOX_SCHEMA:
+            conn.execute(statement)
+        now = time.time()
+        for date, students in sms_log.items():
+            conn.executemany("INSERT OR IGNORE INTO sms_outbox (student, date, to_number, body, status, "
+                             "attempts, next_attempt, created, sent_at) VALUES (?, ?, '', '', 'sent', 1, ?, ?, ?)",
+                             [(s.lower(), date, now, now, now) for s in students])
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (LEGACY_MIGRATION, str(now)))
+
+    print(f"Migrated {len(teachers)} teacher(s), {len(photos)} student photo(s), "
+          f"{len(csv_files)} attendance file(s) and {len(sms_log)} SMS log day(s) into SQLite.")
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        init_db()
+        if not migrate_legacy_files():
+            print("Legacy files were already migrated.")
+    else:
+        print("usage: python storage.py migrate")
@@ -0,0 +1,104 @@
+import numpy as np
+
+from ann_index import IVFIndex, kmeans
+from gallery import Gallery
+
+# Encodings around a few cluster centres, like real face embeddings, and
+# queries a small step away from enrolled rows.
+def clustered(n, clusters=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0, 0.06, (clusters, 128))
+    return (centres[rng.integers(clusters, size=n)] + rng.normal(0, 0.055, (n, 128))).astype(np.float32)
+
+def queries_near(matrix, n, seed=1):
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(matrix), n, replace=False)
+    return picked, (matrix[picked] + rng.normal(0, 0.01, (n, 128))).astype(np.float32)
+
+def exact_nearest(queries, matrix, alive):
+    d = ((queries[:, None, :] - matrix[None, :, :]) ** 2).sum(axis=2)
+    d[:, ~alive] = np.inf
+    return d.argmin(axis=1), d.min(axis=1)
+
+def built(matrix, nlist=8, nprobe=8):
+    index = IVFIndex(nlist=nlist, nprobe=nprobe)
+    index.train(matrix)
+    index.assign(matrix)
+    return index
+
+
+def test_kmeans_returns_k_distinct_centroids():
+    data = clustered(500)
+    centroids = kmeans(data, 8)
+    assert centroids.shape == (8, 128)
+    assert len(np.unique(centroids, axis=0)) == 8
+
+def test_probing_every_cell_matches_exact_search():
+    matrix = clustered(400)
+    sq = (matrix * matrix).sum(axis=1)
+    alive = np.ones(len(matrix), dtype=bool)
+    alive[::7] = False
+    index = built(matrix, nlist=8, nprobe=8)
+    queries = clustered(30, seed=5)
+    best, best_sq = index.search(queries, matrix, sq, alive)
+    truth, truth_sq = exact_nearest(queries, matrix, alive)
+    assert (best == truth).all()
+    np.testing.assert_allclose(best_sq, truth_sq, rtol=1e-4, atol=1e-5)
+
+def test_few_probes_still_find_enrolled_rows():
+    matrix = clustered(2000)
+    sq = (matrix * matrix).sum(axis=1)
+    alive = np.ones(len(matrix), dtype=bool)
+    index = built(matrix, nlist=32, nprobe=4)
+    picked, queries = queries_near(matrix, 100)
+    best, _ = index.search(queries, matrix, sq, alive)
+    assert (best == picked).mean() >= 0.95
+
+def test_rows_added_after_assign_are_searched():
+    matrix = clustered(300)
+    index = built(matrix[:200], nlist=4, nprobe=4)
+    for row in range(200, 300):
+        index.add(row, matrix[row])
+    sq = (matrix * matrix).sum(axis=1)
+    alive = np.ones(len(matrix), dtype=bool)
+    picked, queries = queries_near(matrix[200:], 20)
+    best, _ = index.search(queries, matrix, sq, alive)
+    assert (best == picked + 200).all()
+
+def test_candidates_cover_the_probed_cells_without_dead_rows():
+    matrix = clustered(400)
+    sq = (matrix * matrix).sum(axis=1)
+    alive = np.ones(len(matrix), dtype=bool)
+    alive[:50] = False
+    index = built(matrix, nlist=8, nprobe=8)
+    [(rows, d)] = index.candidates(matrix[60:61], matrix, sq, alive)
+    assert sorted(rows) == list(range(50, 400))
+    assert d[list(rows).index(60)] < 1e-4
+
+def test_index_keeps_row_numbers_not_encodings():
+    matrix = clustered(400)
+    index = built(matrix)
+    big = [name for name, value in vars(index).items()
+           if isinstance(value, np.ndarray) and value.ndim == 2 and value.shape[0] == len(matrix)]
+    assert big == []
+
+def test_gallery_with_index_agrees_with_exact_gallery():
+    matrix = clustered(600)
+    names = [f"s{i // 2}" for i in range(len(matrix))]
+    exact = Gallery.from_encodings(names, matrix)
+    ivf = Gallery.from_encodings(names, matrix)
+    ivf.attach_index(IVFIndex(nlist=8, nprobe=8))
+    _, faces = queries_near(matrix, 20, seed=3)
+    assert [r["name"] for r in ivf.assign(faces)] == [r["name"] for r in exact.assign(faces)]
+    assert [m[0] for m in ivf.match(faces)] == [m[0] for m in exact.match(faces)]
+
+def test_save_and_load_round_trip(tmp_path):
+    matrix = clustered(200)
+    index = built(matrix, nlist=4)
+    path = str(tmp_path / "ivf.npz")
+    index.save(path)
+    loaded = IVFIndex()
+    assert loaded.load(path)
+    np.testing.assert_array_equal(loaded.centroids, index.centroids)
+    assert loaded.trained_size == 200
+    assert not IVFIndex().load(str(tmp_path / "missing.npz"))
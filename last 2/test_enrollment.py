@@ -0,0 +1,126 @@
+import io, os, zipfile
+import numpy as np
+import pytest
+from PIL import Image
+
+import enrollment
+from encoding_store import EncodingStore
+from quality import NO_GATE
+
+# Stands in for face_recognition so batches can be enrolled without dlib:
+# a black photo has no face, a photo more than twice as wide as it is tall
+# has two, anything else one. A face's encoding is its photo's mean colour.
+class FakeFaceApi:
+    def face_locations(self, image, upsample=1):
+        h, w = image.shape[:2]
+        if image.mean() < 1:
+            return []
+        if w > 2 * h:
+            return [(0, w // 2, h, 0), (0, w, h, w // 2)]
+        return [(0, w, h, 0)]
+
+    def face_encodings(self, image, locations):
+        return [np.full(128, image.mean() / 255.0) for _ in locations]
+
+@pytest.fixture
+def fake_faces(monkeypatch):
+    monkeypatch.setattr(enrollment, "face_api", lambda: FakeFaceApi())
+
+def photo(colour=(120, 80, 60), size=(100, 120), fmt="JPEG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, colour).save(buffer, fmt)
+    return buffer.getvalue()
+
+def make_zip(path, files):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return str(path)
+
+def enroll(source, students, store, **kwargs):
+    return enrollment.enroll(source, str(students), store, gate=NO_GATE, **kwargs)
+
+
+# -------------------------------
+# Names and manifests
+# -------------------------------
+@pytest.mark.parametrize("name, problem", [
+    ("asha", None),
+    ("asha khan", None),
+    ("", "missing name"),
+    (".hidden", "invalid name"),
+    ("..", "invalid name"),
+    ("../teachers", "invalid name"),
+    ("a/b", "invalid name"),
+    ("a\\b", "invalid name"),
+])
+def test_name_problem(name, problem):
+    assert enrollment.name_problem(name) == problem
+
+def test_read_manifest_normalises_fields():
+    manifest = io.StringIO("name,photo,phone,section\n  Asha Khan ,asha.jpg, +1555 ,7A\nbilal,b.png,,\n")
+    assert enrollment.read_manifest(manifest) == [
+        {"name": "asha khan", "photo": "asha.jpg", "parent_phone": "+1555", "section": "7A"},
+        {"name": "bilal", "photo": "b.png", "parent_phone": "", "section": ""},
+    ]
+
+def test_photos_without_a_manifest_are_named_after_their_files(tmp_path):
+    source = make_zip(tmp_path / "batch.zip", {"Asha.jpg": b"", "class/bilal.PNG": b"", "notes.txt": b"",
+                                              "__MACOSX/._asha.jpg": b"", ".DS_Store": b""})
+    entries, _, close = enrollment.open_batch(source)
+    close()
+    assert [(e["name"], e["photo"]) for e in entries] == [("asha", "Asha.jpg"), ("bilal", "class/bilal.PNG")]
+
+
+# -------------------------------
+# Batches
+# -------------------------------
+def test_batch_enrolls_good_photos_and_reports_the_rest(db, fake_faces, tmp_path):
+    students, store = tmp_path / "students_db", EncodingStore(str(tmp_path / "cache"))
+    source = make_zip(tmp_path / "batch.zip", {
+        "manifest.csv": "name,photo,parent_phone,section\n"
+                        "asha,asha.jpg,+1555,7A\n"
+                        "asha,asha2.jpg,,\n"
+                        "bilal,bilal.jpg,,7B\n"
+                        "chen,chen.jpg,,\n"
+                        "dara,dara.jpg,,\n"
+                        "../evil,evil.jpg,,\n"
+                        "femi,missing.jpg,,\n"
+                        "gita,gita.gif,,\n",
+        "asha.jpg": photo(), "asha2.jpg": photo((90, 90, 90)),
+        "bilal.jpg": photo((0, 0, 0)), "chen.jpg": photo(size=(300, 100)), "dara.jpg": b"not a photo",
+        "evil.jpg": photo(),
+    })
+    accepted, failures, _ = enroll(source, students, store, default_section="General")
+    assert sorted(e["file"] for e in accepted if not e["extra"]) == ["asha.jpg"]
+    assert {f["name"]: f["reason"] for f in failures} == {
+        "bilal": "no face detected",
+        "chen": "2 faces detected",
+        "dara": "corrupt or unreadable image (UnidentifiedImageError)",
+        "../evil": "invalid name",
+        "femi": "photo not found in batch",
+        "gita": "unsupported file type",
+    }
+    extra = [e["file"] for e in accepted if e["extra"]]
+    assert len(extra) == 1 and extra[0].startswith("asha/")
+    assert os.path.exists(students / "asha.jpg") and os.path.exists(students / extra[0])
+    assert sorted(store.files_for("asha")) == sorted(["asha.jpg"] + extra)
+    assert db.student_sections() == {"asha": "7A"}
+    assert db.student_parents() == {"asha": "+1555"}
+    assert not [f for f in os.listdir(students) if f.startswith(".staging")]
+
+def test_a_new_main_photo_retires_the_old_one_in_another_format(db, fake_faces, tmp_path):
+    students, store = tmp_path / "students_db", EncodingStore(str(tmp_path / "cache"))
+    enroll(make_zip(tmp_path / "one.zip", {"asha.jpg": photo()}), students, store)
+    enroll(make_zip(tmp_path / "two.zip", {"asha.png": photo((10, 200, 10), fmt="PNG")}), students, store)
+    assert sorted(os.listdir(students)) == ["asha.png"]
+    assert store.files_for("asha") == ["asha.png"]
+
+def test_a_rejected_batch_leaves_enrolled_photos_alone(db, fake_faces, tmp_path):
+    students, store = tmp_path / "students_db", EncodingStore(str(tmp_path / "cache"))
+    enroll(make_zip(tmp_path / "one.zip", {"asha.jpg": photo()}), students, store)
+    accepted, failures, _ = enroll(make_zip(tmp_path / "two.zip", {"asha.png": photo((0, 0, 0), fmt="PNG")}),
+                                   students, store)
+    assert accepted == [] and failures[0]["reason"] == "no face detected"
+    assert sorted(os.listdir(students)) == ["asha.jpg"]
+    assert store.files_for("asha") == ["asha.jpg"]
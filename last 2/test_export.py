@@ -0,0 +1,58 @@
+import csv, gzip, io
+
+import pytest
+
+from export import EXPORT_FORMATS, csv_chunks, gzip_chunks, export_chunks
+
+HEADER = ["Name", "Date", "Section", "Status"]
+
+def rows(n):
+    for i in range(n):
+        yield (f"student {i}", "2025-09-15", "7A", "Present" if i % 3 else "Absent")
+
+def parse(data):
+    return list(csv.reader(io.StringIO(data.decode("utf-8"))))
+
+
+def test_csv_has_the_header_and_every_row():
+    table = parse(b"".join(csv_chunks(rows(5), HEADER)))
+    assert table[0] == HEADER
+    assert table[1:] == [list(row) for row in rows(5)]
+
+def test_csv_is_streamed_in_bounded_chunks():
+    chunks = list(csv_chunks(rows(5000), HEADER, chunk_size=4096))
+    assert len(chunks) > 10
+    # a chunk is cut after the row that crosses chunk_size
+    assert max(len(c) for c in chunks) < 4096 + 100
+    assert len(parse(b"".join(chunks))) == 5001
+
+def test_csv_reads_rows_lazily():
+    consumed = []
+
+    def tracked():
+        for row in rows(5000):
+            consumed.append(row)
+            yield row
+    first = next(csv_chunks(tracked(), HEADER, chunk_size=1024))
+    assert len(first) >= 1024
+    assert len(consumed) < 100
+
+def test_csv_quotes_fields_that_need_it():
+    data = b"".join(csv_chunks([('o"brien, k', "2025-09-15", "7A", "Present")], HEADER))
+    assert parse(data)[1][0] == 'o"brien, k'
+
+def test_empty_range_is_just_the_header():
+    assert parse(b"".join(csv_chunks(iter(()), HEADER))) == [HEADER]
+
+def test_gzip_stream_decompresses_to_the_csv():
+    plain = b"".join(csv_chunks(rows(3000), HEADER))
+    packed = b"".join(gzip_chunks(csv_chunks(rows(3000), HEADER)))
+    assert gzip.decompress(packed) == plain
+    assert len(packed) < len(plain)
+
+@pytest.mark.parametrize("fmt", list(EXPORT_FORMATS))
+def test_export_chunks_for_every_format(fmt):
+    data = b"".join(export_chunks(fmt, rows(10), HEADER))
+    if fmt == "csv.gz":
+        data = gzip.decompress(data)
+    assert len(parse(data)) == 11
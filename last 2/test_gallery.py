@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+import gallery as gallery_mod
+from gallery import Gallery
+
+# -------------------------------
+# Helpers
+# -------------------------------
+# Unit-length random encodings, far apart from each other (random 128-d
+# unit vectors sit ~1.4 apart), and faces a small step away from them.
+def encodings(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n, 128)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def near(encoding, step=0.1, seed=1):
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(size=128).astype(np.float32)
+    return encoding + step * noise / np.linalg.norm(noise)
+
+def roster(names, seed=0):
+    enc = encodings(len(names), seed)
+    return Gallery.from_encodings(names, enc), enc
+
+
+# -------------------------------
+# assign()
+# -------------------------------
+def test_assign_greedy_matches_each_face_to_its_student():
+    g, enc = roster(["asha", "bilal", "chen"])
+    reports = g.assign([near(enc[2]), near(enc[0])])
+    assert [r["name"] for r in reports] == ["chen", "asha"]
+    assert all(r["status"] == "matched" for r in reports)
+    assert all(0.0 < r["confidence"] <= 1.0 for r in reports)
+
+def test_assign_gives_a_student_to_one_face_only():
+    g, enc = roster(["asha", "bilal"])
+    closer, farther = near(enc[0], 0.05), near(enc[0], 0.2, seed=2)
+    reports = g.assign([farther, closer])
+    assert reports[1]["name"] == "asha"
+    assert reports[0]["name"] is None
+    assert reports[0]["status"] == "conflict"
+
+def test_assign_no_match_outside_tolerance():
+    g, enc = roster(["asha", "bilal"])
+    stranger = encodings(1, seed=9)[0]
+    [report] = g.assign([stranger])
+    assert report["status"] == "no_match"
+    assert report["name"] is None and report["confidence"] is None
+
+def test_assign_empty_roster_gives_every_face_its_own_report():
+    g = Gallery()
+    reports = g.assign(encodings(2))
+    assert [r["status"] for r in reports] == ["no_match", "no_match"]
+    assert reports[0] is not reports[1]
+    # process_upload_job writes each face's box into its report
+    for report, box in zip(reports, [(0, 10, 10, 0), (20, 30, 30, 20)]):
+        report["box"] = box
+    assert reports[0]["box"] == (0, 10, 10, 0)
+    assert reports[1]["box"] == (20, 30, 30, 20)
+
+# Two students on a line. Face 0 is a little closer to asha than face 1 is,
+# but face 1 is out of bilal's reach: greedy gives asha to face 0 and strands
+# face 1, hungarian gives face 0 bilal instead.
+def line_roster():
+    g = Gallery.from_encodings(["asha", "bilal"], [[0.0, 0.0], [1.0, 0.0]], dim=2)
+    return g, [[0.3, 0.0], [-0.35, 0.0]]
+
+def test_assign_greedy_takes_the_closest_pair_first():
+    g, faces = line_roster()
+    reports = g.assign(faces, tolerance=0.8)
+    assert [r["name"] for r in reports] == ["asha", None]
+    assert reports[1]["status"] == "conflict"
+
+def test_assign_hungarian_minimises_total_distance():
+    pytest.importorskip("scipy")
+    g, faces = line_roster()
+    reports = g.assign(faces, tolerance=0.8, method="hungarian")
+    assert [r["name"] for r in reports] == ["bilal", "asha"]
+
+def test_assign_hungarian_falls_back_to_greedy_without_scipy(monkeypatch):
+    monkeypatch.setattr(gallery_mod, "linear_sum_assignment", None)
+    g, faces = line_roster()
+    reports = g.assign(faces, tolerance=0.8, method="hungarian")
+    assert [r["name"] for r in reports] == ["asha", None]
+
+def test_assign_rejects_unknown_method_and_aggregation():
+    g, enc = roster(["asha"])
+    with pytest.raises(ValueError):
+        g.assign(enc, method="random")
+    with pytest.raises(ValueError):
+        g.assign(enc, aggregate="max")
+
+
+# -------------------------------
+# Several reference rows per student
+# -------------------------------
+def test_vote_prefers_the_student_with_more_close_rows():
+    base = encodings(2)
+    face = near(base[0], 0.05)
+    # bilal has the single closest row, asha has two rows almost as close
+    rows = [near(face, 0.2, seed=3), near(face, 0.2, seed=4), near(face, 0.15, seed=5), base[1]]
+    g = Gallery.from_encodings(["asha", "asha", "bilal", "bilal"], rows)
+    [by_min] = g.assign([face], aggregate="min")
+    [by_vote] = g.assign([face], aggregate="vote", k=3)
+    assert by_min["name"] == "bilal"
+    assert by_vote["name"] == "asha"
+    assert g.match([face], aggregate="vote", k=3)[0][0] == "asha"
+
+def test_centroid_scores_against_the_mean_row():
+    base = encodings(2)
+    rows = [near(base[0], 0.3, seed=3), near(base[0], 0.3, seed=4), base[1]]
+    g = Gallery.from_encodings(["asha", "asha", "bilal"], rows)
+    names, dist = g.student_distances([base[0]], aggregate="centroid")
+    centroid = (rows[0] + rows[1]) / 2
+    assert names == ["asha", "bilal"]
+    assert dist[0, 0] == pytest.approx(np.linalg.norm(base[0] - centroid), abs=1e-4)
+
+def test_remove_and_compact_keep_rows_grouped():
+    enc = encodings(40)
+    names = [f"s{i % 20}" for i in range(40)]
+    g = Gallery.from_encodings(names, enc)
+    for i in range(0, 20, 2):
+        g.remove(f"s{i}")
+    g.compact()
+    assert len(g) == 20
+    assert sorted(g.student_names()) == sorted(f"s{i}" for i in range(1, 20, 2))
+    [report] = g.assign([near(enc[23])])
+    assert report["name"] == "s3"
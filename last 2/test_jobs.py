@@ -0,0 +1,104 @@
+import json, sqlite3, threading, time
+from contextlib import closing
+
+from jobs import JobQueue
+
+def queue(tmp_path, handler=None, **kwargs):
+    kwargs.setdefault("poll_interval", 0.01)
+    return JobQueue(str(tmp_path / "jobs.db"), handler or (lambda params: params), **kwargs)
+
+# A row as another (possibly dead) process would have left it.
+def insert(q, job_id, status="queued", started=None, lease_until=None, attempts=0, created=None):
+    with closing(sqlite3.connect(q.db_path)) as conn, conn:
+        conn.execute("INSERT INTO jobs (id, status, params, created, started, lease_until, attempts) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (job_id, status, json.dumps({"id": job_id}), created or time.time(),
+                      started, lease_until, attempts))
+
+def wait_for_job(q, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while q.get(job_id)["status"] not in ("done", "failed"):
+        assert time.monotonic() < deadline, "job didn't finish"
+        time.sleep(0.01)
+    return q.get(job_id)
+
+
+def test_submitted_job_runs_and_stores_its_result(tmp_path):
+    q = queue(tmp_path, lambda params: {"doubled": params["n"] * 2})
+    job = wait_for_job(q, q.submit({"n": 21}))
+    assert job["status"] == "done"
+    assert job["result"] == {"doubled": 42}
+    assert job["params"] == {"n": 21}
+
+def test_handler_error_fails_the_job(tmp_path):
+    def handler(params):
+        raise ValueError("bad photo")
+    q = queue(tmp_path, handler)
+    job = wait_for_job(q, q.submit({}))
+    assert job["status"] == "failed"
+    assert job["error"] == "bad photo"
+
+def test_claim_takes_queued_jobs_oldest_first(tmp_path):
+    q = queue(tmp_path)
+    insert(q, "b", created=2.0)
+    insert(q, "a", created=1.0)
+    assert q._claim()[0] == "a"
+    assert q._claim()[0] == "b"
+    assert q._claim() is None
+    assert q.get("a")["status"] == "running"
+
+def test_claim_reclaims_a_running_job_whose_lease_ran_out(tmp_path):
+    q = queue(tmp_path)
+    now = time.time()
+    insert(q, "alive", "running", started=now, lease_until=now + 30, attempts=1)
+    insert(q, "orphan", "running", started=now - 120, lease_until=now - 1, attempts=1)
+    row = q._claim()
+    assert row[0] == "orphan"
+    assert q._claim() is None
+    with closing(sqlite3.connect(q.db_path)) as conn:
+        attempts, lease_until = conn.execute("SELECT attempts, lease_until FROM jobs WHERE id = 'orphan'").fetchone()
+    assert attempts == 2
+    assert lease_until > now
+
+def test_claim_counts_leaseless_rows_from_their_start(tmp_path):
+    q = queue(tmp_path)
+    now = time.time()
+    insert(q, "recent", "running", started=now)
+    insert(q, "stale", "running", started=now - q.LEASE - 5)
+    assert q._claim()[0] == "stale"
+    assert q._claim() is None
+
+def test_claim_fails_jobs_out_of_attempts(tmp_path):
+    q = queue(tmp_path)
+    now = time.time()
+    insert(q, "dead", "running", started=now - 120, lease_until=now - 1, attempts=q.MAX_ATTEMPTS, created=1.0)
+    insert(q, "next", created=2.0)
+    assert q._claim()[0] == "next"
+    job = q.get("dead")
+    assert job["status"] == "failed"
+    assert "stopped" in job["error"]
+
+def test_heartbeat_keeps_a_long_job_leased(tmp_path):
+    class ShortLease(JobQueue):
+        LEASE = 0.3
+    release = threading.Event()
+    q = ShortLease(str(tmp_path / "jobs.db"), lambda params: release.wait(5) and "ok", poll_interval=0.01)
+    other = ShortLease(q.db_path, lambda params: None)  # another worker, never started
+    job_id = q.submit({})
+    try:
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            assert other._claim() is None
+            time.sleep(0.05)
+    finally:
+        release.set()
+    assert wait_for_job(q, job_id)["result"] == "ok"
+
+def test_old_jobs_db_gains_lease_columns(tmp_path):
+    db = str(tmp_path / "jobs.db")
+    with closing(sqlite3.connect(db)) as conn, conn:
+        conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+                     "result TEXT, error TEXT, created REAL NOT NULL, started REAL, finished REAL)")
+        conn.execute("INSERT INTO jobs (id, status, params, created) VALUES ('old', 'queued', '{}', 1.0)")
+    q = JobQueue(db, lambda params: None)
+    assert q._claim()[0] == "old"
@@ -0,0 +1,96 @@
+import threading, time
+from contextlib import closing
+
+from notifications import RateLimiter, SmsDispatcher, FakeSmsClient
+
+def dispatcher(tmp_path, client=None, **kwargs):
+    kwargs.setdefault("poll_interval", 0.01)
+    return SmsDispatcher(str(tmp_path / "attendance.db"), client, "+10000000000", verbose=False, **kwargs)
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+# -------------------------------
+# RateLimiter
+# -------------------------------
+def test_rate_limiter_allows_a_burst_then_paces():
+    limiter = RateLimiter(rate_per_sec=50, burst=5)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.05
+    for _ in range(10):
+        limiter.acquire()
+    # 10 more tokens at 50/s take ~0.2s
+    assert time.monotonic() - start >= 0.18
+
+def test_rate_limiter_is_shared_between_threads():
+    limiter = RateLimiter(rate_per_sec=100, burst=1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(5)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 20 acquisitions, the first one free
+    assert time.monotonic() - start >= 0.18
+
+
+# -------------------------------
+# SmsDispatcher
+# -------------------------------
+def test_enqueue_texts_a_student_once_per_date(tmp_path):
+    sms = dispatcher(tmp_path)
+    assert sms.enqueue("asha", "2025-09-15", "+1555", "absent") is True
+    assert sms.enqueue("asha", "2025-09-15", "+1555", "absent again") is False
+    assert sms.enqueue("asha", "2025-09-16", "+1555", "absent") is True
+    assert sms.students_for_date("2025-09-15") == ["asha"]
+    assert sms.pending_count() == 2
+
+def test_messages_wait_in_the_outbox_until_there_is_a_client(tmp_path):
+    sms = dispatcher(tmp_path)
+    sms.enqueue("asha", "2025-09-15", "+1555", "absent")
+    assert sms._thread is None
+    sms.client = FakeSmsClient()
+    sms.start()
+    try:
+        assert wait_for(lambda: sms.pending_count() == 0)
+        assert sms.client.sent == [("+1555", "absent")]
+    finally:
+        sms.stop()
+
+def test_concurrent_starts_run_one_send_loop(tmp_path):
+    sms = dispatcher(tmp_path, FakeSmsClient())
+    barrier = threading.Barrier(8)
+
+    def start():
+        barrier.wait()
+        sms.start()
+    threads = [threading.Thread(target=start) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    try:
+        loops = [t for t in threading.enumerate() if t.name == "sms-dispatcher"]
+        assert loops == [sms._thread]
+    finally:
+        sms.stop()
+
+def test_failed_sends_are_retried_then_given_up(tmp_path):
+    sms = dispatcher(tmp_path, FakeSmsClient(failure_rate=1.0), max_attempts=2, backoff_base=0.01)
+    sms.enqueue("asha", "2025-09-15", "+1555", "absent")
+    try:
+        assert wait_for(lambda: sms.pending_count() == 0)
+    finally:
+        sms.stop()
+    with closing(sms._connect()) as conn:
+        status, attempts = conn.execute("SELECT status, attempts FROM sms_outbox").fetchone()
+    assert (status, attempts) == ("failed", 2)
+    assert sms.students_for_date("2025-09-15") == []
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+
+from ann_index import IVFIndex
+from gallery import Gallery
+from shared_roster import SharedRoster
+
+def encodings(n, seed):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, 0.1, (n, 128)).astype(np.float32)
+
+# {name: (section, encodings)}, as roster_students() returns it
+def students(**rows):
+    return {name: (section, encodings(n, seed=[n, *name.encode()])) for name, (section, n) in rows.items()}
+
+def segment_files(root):
+    return sorted(f for f in os.listdir(root) if f.startswith("roster-"))
+
+
+def test_nothing_published_is_version_zero(tmp_path):
+    roster = SharedRoster(str(tmp_path))
+    version, names, sections, matrix, sq_norms = roster.load()
+    assert version == 0 and names == [] and matrix.shape == (0, 128)
+
+def test_publish_orders_rows_by_section_then_student(tmp_path):
+    roster = SharedRoster(str(tmp_path))
+    everyone = students(zoya=("7A", 1), bilal=("7B", 2), asha=("7B", 1))
+    assert roster._publish(everyone)
+    version, names, sections, matrix, sq_norms = roster.load()
+    assert version == 1
+    assert names == ["zoya", "asha", "bilal", "bilal"]
+    assert sections == ["7A", "7B", "7B", "7B"]
+    np.testing.assert_array_equal(matrix[2:4], everyone["bilal"][1])
+    np.testing.assert_allclose(sq_norms, (matrix * matrix).sum(axis=1), rtol=1e-5)
+
+def test_publishing_the_same_roster_again_is_a_no_op(tmp_path):
+    roster = SharedRoster(str(tmp_path))
+    everyone = students(asha=("7A", 1))
+    roster.publish(lambda: everyone)
+    roster.publish(lambda: everyone)
+    assert roster.version() == 1
+
+def test_other_processes_see_a_publish_through_the_counter(tmp_path):
+    writer, reader = SharedRoster(str(tmp_path)), SharedRoster(str(tmp_path))
+    writer.publish(lambda: students(asha=("7A", 1)))
+    assert reader.version() == 1
+    writer.publish(lambda: students(asha=("7A", 1), bilal=("7A", 1)))
+    assert reader.version() == 2
+    assert reader.load()[1] == ["asha", "bilal"]
+
+def test_update_appends_new_students_in_place(tmp_path):
+    roster = SharedRoster(str(tmp_path))
+    everyone = students(asha=("7A", 1))
+    roster.publish(lambda: everyone)
+    files = segment_files(str(tmp_path))
+    everyone.update(students(chen=("7B", 2)))
+    roster.update(["chen"], lambda names=None: {n: everyone[n] for n in (names or everyone)})
+    version, names, _, matrix, _ = roster.load()
+    assert version == 2
+    assert names == ["asha", "chen", "chen"]
+    assert segment_files(str(tmp_path)) == files
+    np.testing.assert_array_equal(matrix[1:], everyone["chen"][1])
+
+def test_update_of_an_enrolled_student_writes_a_new_segment(tmp_path):
+    roster = SharedRoster(str(tmp_path))
+    everyone = students(asha=("7A", 1), bilal=("7A", 1))
+    roster.publish(lambda: everyone)
+    everyone["asha"] = ("7B", encodings(2, seed=99))
+    roster.update(["asha"], lambda names=None: {n: everyone[n] for n in (names or everyone)})
+    version, names, sections, _, _ = roster.load()
+    assert version == 2
+    assert (names, sections) == (["bilal", "asha", "asha"], ["7A", "7B", "7B"])
+    assert any(f.startswith("roster-2.") for f in segment_files(str(tmp_path)))
+
+def test_old_segments_are_dropped_two_generations_behind(tmp_path):
+    roster = SharedRoster(str(tmp_path))
+    for n in range(1, 4):
+        roster.publish(lambda: students(asha=("7A", n)))
+    segments = {f.split(".")[0] for f in segment_files(str(tmp_path))}
+    assert segments == {"roster-2", "roster-3"}
+
+def test_galleries_over_the_segment_do_not_copy_it(tmp_path):
+    roster = SharedRoster(str(tmp_path))
+    roster.publish(lambda: students(**{f"s{i}": ("7A", 2) for i in range(100)}))
+    _, names, _, matrix, sq_norms = roster.load()
+    gallery = Gallery.from_shared(matrix, sq_norms, names)
+    gallery.attach_index(IVFIndex(nlist=8, nprobe=8))
+    assert gallery.shared
+    assert np.shares_memory(gallery._matrix, matrix)
+    [report] = gallery.assign(matrix[10:11])
+    assert report["name"] == names[10]
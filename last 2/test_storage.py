@@ -0,0 +1,103 @@
+import pytest
+
+import storage
+
+def counts(period):
+    return storage.get_connection(storage.ATTENDANCE_DB).execute(
+        "SELECT start, section, present, absent FROM attendance_counts "
+        "WHERE period = ? AND present + absent > 0 ORDER BY start, section", (period,)).fetchall()
+
+# The counters as they'd be aggregated from the attendance rows themselves.
+def recount():
+    conn = storage.get_connection(storage.ATTENDANCE_DB)
+    return conn.execute("SELECT date, section, SUM(status = 'Present'), SUM(status != 'Present') "
+                        "FROM attendance GROUP BY date, section ORDER BY date, section").fetchall()
+
+
+def test_record_and_read_back_a_day(db):
+    db.record_attendance("2025-09-15", {"asha": "Present", "bilal": "Absent"}, "7A")
+    assert db.attendance_for_day("2025-09-15") == {"asha": "Present", "bilal": "Absent"}
+    assert db.attendance_for_day("2025-09-15", section="7B") == {}
+    assert db.day_counts("2025-09-15") == (1, 1)
+
+def test_recording_a_day_again_replaces_it(db):
+    db.record_attendance("2025-09-15", {"asha": "Absent"}, "7A")
+    db.record_attendance("2025-09-15", {"asha": "Present"}, "7A")
+    assert db.attendance_for_day("2025-09-15") == {"asha": "Present"}
+    assert db.day_counts("2025-09-15") == (1, 0)
+    assert db.student_history("asha") == [("2025-09-15", "7A", "Present")]
+
+def test_sections_per_student(db):
+    db.record_attendance("2025-09-15", {"asha": "Present", "bilal": "Absent"}, {"asha": "7A"})
+    assert counts("day") == [("2025-09-15", "7A", 1, 0), ("2025-09-15", db.DEFAULT_SECTION, 0, 1)]
+    assert db.day_counts("2025-09-15", section="7A") == (1, 0)
+
+@pytest.mark.parametrize("date, monday", [
+    ("2025-09-15", "2025-09-15"),  # Monday
+    ("2025-09-17", "2025-09-15"),
+    ("2025-09-21", "2025-09-15"),  # Sunday ends the week
+    ("2025-09-14", "2025-09-08"),
+    ("2026-01-01", "2025-12-29"),  # week across a year boundary
+])
+def test_week_bucket_starts_on_monday(db, date, monday):
+    db.record_attendance(date, {"asha": "Present"}, "7A")
+    assert counts("week") == [(monday, "7A", 1, 0)]
+
+def test_month_bucket_starts_on_the_first(db):
+    db.record_attendance_many([("2025-09-01", {"asha": "Present"}, "7A"),
+                               ("2025-09-30", {"asha": "Absent"}, "7A"),
+                               ("2025-10-01", {"asha": "Present"}, "7A")])
+    assert counts("month") == [("2025-09-01", "7A", 1, 1), ("2025-10-01", "7A", 1, 0)]
+
+def test_triggers_follow_updates_and_deletes(db):
+    db.record_attendance("2025-09-15", {"asha": "Present", "bilal": "Present"}, "7A")
+    conn = db.get_connection(db.ATTENDANCE_DB)
+    with conn:
+        conn.execute("UPDATE attendance SET section = '7B' WHERE student_id = "
+                     "(SELECT id FROM student WHERE name = 'bilal')")
+        conn.execute("UPDATE attendance SET status = 'Absent' WHERE student_id = "
+                     "(SELECT id FROM student WHERE name = 'asha')")
+    assert counts("day") == [("2025-09-15", "7A", 0, 1), ("2025-09-15", "7B", 1, 0)]
+    with conn:
+        conn.execute("DELETE FROM attendance WHERE section = '7A'")
+    assert counts("day") == [("2025-09-15", "7B", 1, 0)]
+    assert counts("day") == recount()
+
+def test_counters_are_backfilled_for_existing_rows(db):
+    db.record_attendance_many([("2025-09-15", {"asha": "Present", "bilal": "Absent"}, "7A"),
+                               ("2025-09-16", {"asha": "Absent"}, "7A")])
+    conn = db.get_connection(db.ATTENDANCE_DB)
+    with conn:
+        for trigger in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER trg_attendance_counts_{trigger}")
+        conn.execute("DROP TABLE attendance_counts")
+    db.init_db()
+    assert counts("day") == recount()
+    assert counts("week") == [("2025-09-15", "7A", 1, 2)]
+
+def test_trend_sums_sections_and_filters_on_period_start(db):
+    db.record_attendance_many([("2025-09-15", {"asha": "Present"}, "7A"),
+                               ("2025-09-15", {"bilal": "Absent"}, "7B"),
+                               ("2025-09-22", {"asha": "Present", "bilal": "Present"}, "7A")])
+    assert db.attendance_trend("week") == [("2025-09-15", 1, 1), ("2025-09-22", 2, 0)]
+    assert db.attendance_trend("week", section="7B") == [("2025-09-15", 0, 1)]
+    assert db.attendance_trend("day", start="2025-09-16") == [("2025-09-22", 2, 0)]
+    with pytest.raises(ValueError):
+        db.attendance_trend("year")
+
+def test_summary_counts_days_per_student(db):
+    db.record_attendance_many([(f"2025-09-{d:02d}", {"asha": "Absent", "bilal": "Present"}, "7A")
+                               for d in range(15, 20)])
+    assert db.attendance_summary(min_absent=4) == [("asha", 0, 5)]
+    assert db.attendance_summary("2025-09-18", "2025-09-19") == [("asha", 0, 2), ("bilal", 2, 0)]
+
+def test_iter_attendance_walks_the_range_in_order(db):
+    db.record_attendance_many([("2025-09-16", {"asha": "Present"}, "7A"),
+                               ("2025-09-15", {"bilal": "Absent"}, "7B"),
+                               ("2025-09-15", {"asha": "Present"}, "7A"),
+                               ("2025-09-20", {"asha": "Present"}, "7A")])
+    rows = list(db.iter_attendance("2025-09-15", "2025-09-16", batch=1))
+    assert rows == [("asha", "2025-09-15", "7A", "Present"),
+                    ("bilal", "2025-09-15", "7B", "Absent"),
+                    ("asha", "2025-09-16", "7A", "Present")]
+    assert list(db.iter_attendance(section="7B")) == [("bilal", "2025-09-15", "7B", "Absent")]
@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import Future
+from PIL import Image, ImageOps, features
+
+# -------------------------------
+# Roster thumbnails
+# -------------------------------
+# One small square derivative per student in thumbs_cache/, named after the
+# sha1 of the photo it was made from (the encoding store already has it).
+# A name never changes meaning, so /thumbs/<name> can be cached for a year;
+# a new photo simply gets a new name. Thumbnails are made when students are
+# loaded or enrolled, and the roster page only reads the in-memory index.
+THUMB_SIZE = 160  # twice the 80px roster cell
+THUMB_MAX_AGE = 365 * 24 * 3600
+THUMB_FORMAT, THUMB_EXT = ("WEBP", ".webp") if features.check("webp") else ("JPEG", ".jpg")
+
+def thumb_name(sha1):
+    return sha1[:20] + THUMB_EXT
+
+# Runs in a pool worker. JPEGs are decoded at the smallest draft scale that
+# still covers the thumbnail.
+def make_thumbnail(src, dest, size=THUMB_SIZE):
+    with Image.open(src) as img:
+        img.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    thumb = ImageOps.fit(img, (size, size), Image.LANCZOS)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    thumb.save(tmp, THUMB_FORMAT, quality=80)
+    os.replace(tmp, dest)
+
+class ThumbnailCache:
+    def __init__(self, root="thumbs_cache", size=THUMB_SIZE):
+        self.root = root
+        self.size = size
+        self.index = {}  # student -> thumbnail file name
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    # Makes the missing thumbnails for {student: (photo file, sha1)}; returns
+    # {student: thumbnail name} for the ones that exist afterwards.
+    def _ensure(self, photos, folder, pool=None):
+        existing = set(os.listdir(self.root))
+        wanted = {student: thumb_name(sha1) for student, (_, sha1) in photos.items()}
+        jobs = {}
+        for student, (file, _) in photos.items():
+            if wanted[student] not in existing and wanted[student] not in jobs:
+                jobs[wanted[student]] = os.path.join(folder, file)
+        futures = {}
+        for name, src in jobs.items():
+            if pool is None:
+                futures[name] = _inline(make_thumbnail, src, self.path(name), self.size)
+            else:
+                futures[name] = pool.submit(make_thumbnail, src, self.path(name), self.size)
+        failed = set()
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Thumbnail for {jobs[name]} failed: {e}")
+                failed.add(name)
+        if jobs:
+            print(f"Thumbnails: {len(jobs) - len(failed)} made, {len(failed)} failed.")
+        return {student: name for student, name in wanted.items() if name not in failed}
+
+    # Index every student and delete thumbnails nobody uses any more.
+    def build(self, photos, folder, pool=None):
+        self.index = self._ensure(photos, folder, pool)
+        in_use = set(self.index.values())
+        for name in os.listdir(self.root):
+            if name not in in_use and not name.startswith("."):
+                os.remove(self.path(name))
+
+    # After (re-)enrolling some students.
+    def update(self, photos, folder, pool=None):
+        old = {student: self.index.get(student) for student in photos}
+        self.index.update(self._ensure(photos, folder, pool))
+        self._evict(name for student, name in old.items() if name and name != self.index.get(student))
+
+    def remove(self, student):
+        name = self.index.pop(student, None)
+        if name:
+            self._evict([name])
+
+    def _evict(self, names):
+        names = set(names)
+        if not names:
+            return
+        in_use = set(self.index.values())
+        for name in names - in_use:
+            if os.path.exists(self.path(name)):
+                os.remove(self.path(name))
+
+def _inline(fn, *args):
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
@@ -0,0 +1,144 @@
+import time
+from collections import deque
+import numpy as np
+from PIL import Image
+
+import metrics
+from recognition import load_image_for_face_recognition, detect_frame
+
+# -------------------------------
+# Video / burst attendance
+# -------------------------------
+# A short classroom video (or a burst of photos) is read frame by frame:
+# frames are sampled at VIDEO_SAMPLE_FPS, near-duplicates of the last kept
+# frame are dropped by difference hash, and the rest are detected on the
+# process pool with at most a few frames in flight, so the video is never
+# decoded into memory as a whole. Each frame is assigned one-to-one to the
+# roster; a student's per-frame confidences add up and they're marked
+# present once the total reaches MIN_EVIDENCE (one clear sighting, or a few
+# weak ones).
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm', '.3gp')
+VIDEO_SAMPLE_FPS = 2.0
+VIDEO_RESIZE_MAX = 1280
+DHASH_THRESHOLD = 6  # differing bits (of 64) below which a frame is a duplicate
+MIN_EVIDENCE = 0.6
+
+def _resize(image, resize_max):
+    h, w = image.shape[:2]
+    if max(h, w) <= resize_max:
+        return image
+    scale = resize_max / float(max(h, w))
+    return np.asarray(Image.fromarray(image).resize((int(w * scale), int(h * scale)), Image.BILINEAR))
+
+# Needs OpenCV, which is only imported when a video is actually uploaded.
+# grab() advances past frames we don't sample without converting them.
+def iter_video_frames(video_path, stats, sample_fps=VIDEO_SAMPLE_FPS, resize_max=VIDEO_RESIZE_MAX):
+    try:
+        import cv2
+    except ImportError:
+        raise ValueError("Video uploads need OpenCV (pip install opencv-python-headless). "
+                         "Upload a burst of photos instead.")
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError("Cannot open this video.")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0
+        step = max(int(round(fps / sample_fps)), 1) if fps > 0 and sample_fps > 0 else 1
+        stats["read"] = 0
+        while capture.grab():
+            stats["read"] += 1
+            if (stats["read"] - 1) % step:
+                continue
+            ok, frame = capture.retrieve()
+            if ok:
+                yield _resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), resize_max)
+    finally:
+        capture.release()
+
+def iter_burst_frames(paths, stats, resize_max=VIDEO_RESIZE_MAX):
+    stats["read"] = stats["unreadable"] = 0
+    for photo in paths:
+        stats["read"] += 1
+        try:
+            image = load_image_for_face_recognition(photo, resize_max=resize_max)
+        except Exception as e:
+            print(f"Skipping unreadable frame {photo}: {e}")
+            stats["unreadable"] += 1
+            continue
+        yield image
+
+# 64-bit difference hash of a 9x8 grayscale thumbnail: cheap, and robust to
+# the small shifts and noise between consecutive frames.
+def dhash(image):
+    thumb = np.asarray(Image.fromarray(image).convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    return int.from_bytes(np.packbits(thumb[:, 1:] > thumb[:, :-1]).tobytes(), "big")
+
+def distinct_frames(frames, stats, threshold=DHASH_THRESHOLD):
+    stats["sampled"] = stats["skipped"] = 0
+    last = None
+    for frame in frames:
+        stats["sampled"] += 1
+        h = dhash(frame)
+        if last is not None and bin(h ^ last).count("1") < threshold:
+            stats["skipped"] += 1
+            continue
+        last = h
+        yield frame
+
+# Running per-student evidence across frames. update() takes one frame's
+# assignment reports and returns the students it made present.
+class PresenceTally:
+    def __init__(self, min_evidence=MIN_EVIDENCE):
+        self.min_evidence = min_evidence
+        self.seen = {}  # name -> {"frames", "evidence", "confidence"}
+        self.present = set()
+
+    def update(self, reports):
+        new = []
+        for face in reports:
+            name = face["name"]
+            if name is None:
+                continue
+            student = self.seen.setdefault(name, {"frames": 0, "evidence": 0.0, "confidence": 0.0})
+            student["frames"] += 1
+            student["evidence"] = round(student["evidence"] + face["confidence"], 4)
+            student["confidence"] = max(student["confidence"], face["confidence"])
+            if name not in self.present and student["evidence"] >= self.min_evidence:
+                self.present.add(name)
+                new.append(name)
+        return new
+
+def _detect_all(pool, frames, window):
+    pending = deque()
+    for frame in frames:
+        if pool is None:
+            yield detect_frame(frame)
+            continue
+        pending.append(pool.submit(detect_frame, frame))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+# Returns (present, seen, stats): the set of students marked present,
+# {name: {"frames", "evidence", "confidence"}} for every student matched in
+# at least one frame, and frame counts plus processing speed.
+def video_attendance(frames, roster, stats, pool=None, tolerance=0.6, aggregate="min", method="greedy",
+                     min_evidence=MIN_EVIDENCE, dedupe_threshold=DHASH_THRESHOLD, k=3):
+    start = time.perf_counter()
+    tally = PresenceTally(min_evidence)
+    stats["processed"] = stats["faces"] = 0
+    window = 2 * (getattr(pool, "_max_workers", 1) or 1)
+    for locations, encodings, (detect_s, encode_s) in _detect_all(
+            pool, distinct_frames(frames, stats, dedupe_threshold), window):
+        metrics.record("detect", detect_s)
+        metrics.record("encode", encode_s)
+        stats["processed"] += 1
+        stats["faces"] += len(locations)
+        if encodings:
+            with metrics.span("match"):
+                tally.update(roster.assign(encodings, tolerance, aggregate, method, k))
+    seconds = time.perf_counter() - start
+    stats["seconds"] = round(seconds, 2)
+    stats["fps"] = round(stats["sampled"] / seconds, 1) if seconds > 0 else 0.0
+    return tally.present, tally.seen, stats